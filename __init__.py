@@ -13,11 +13,33 @@ import subprocess
 import time
 import logging
 import json
+import asyncio
+import hashlib
+import functools
+import tempfile
+import email.utils
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
 import folder_paths
 from aiohttp import web
 from server import PromptServer
 
-from .nodes.flowpath import FlowPath
+from .nodes.flowpath import FlowPath, FlowPathBatch, get_presets, get_resolver
+from .flowpath.browse import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, BrowseError, browse_folder
+from .flowpath.metrics import observe_route, render_prometheus
+from .flowpath.migration import DEFAULT_WORKERS, MigrationError, create_job, get_job
+from .flowpath.output_stats import OutputTreeStats
+from .flowpath.provenance import MAX_QUERY_LIMIT, get_provenance_log
+from .flowpath.recent import RECENT_INDEX_FILES, recent_index
+from .flowpath.thumbnails import (
+    DEFAULT_THUMBNAIL_SIZE,
+    THUMBNAIL_EXTENSIONS,
+    THUMBNAILS_AVAILABLE,
+    ThumbnailCache,
+    snap_thumbnail_size,
+    thumbnail_etag,
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -25,10 +47,12 @@ logger = logging.getLogger(__name__)
 # Register FlowPath node
 NODE_CLASS_MAPPINGS = {
     "FlowPath": FlowPath,
+    "FlowPathBatch": FlowPathBatch,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "FlowPath": "FlowPath",
+    "FlowPathBatch": "FlowPath (Batch)",
 }
 
 WEB_DIRECTORY = "./web/comfyui"
@@ -121,13 +145,117 @@ def _open_folder_safe(folder_path):
         return False
 
 
-# API Routes for folder operations
-@PromptServer.instance.routes.post("/flowpath/open_folder")
-async def open_folder(request):
-    """Open a folder in the system file explorer"""
+# Blocking route work (realpath/exists/makedirs on possibly slow network
+# volumes, launching the file explorer) runs in this bounded pool so it never
+# stalls the shared PromptServer event loop
+ROUTE_IO_WORKERS = 4
+ROUTE_IO_TIMEOUT = 10.0  # Seconds before a route gives up waiting (504)
+MAX_BATCH_FOLDERS = 256  # Maximum folders per create_folders request
+
+_route_executor = ThreadPoolExecutor(
+    max_workers=ROUTE_IO_WORKERS, thread_name_prefix="flowpath-io"
+)
+
+
+async def _run_io(func, *args, timeout=ROUTE_IO_TIMEOUT):
+    """
+    Run blocking work in the FlowPath I/O pool.
+    Raises asyncio.TimeoutError if it takes longer than timeout
+    (the worker thread still finishes in the background).
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_route_executor, func, *args), timeout
+    )
+
+
+def _timed_route(name):
+    """Record a route handler's latency and status in the FlowPath metrics"""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+            finally:
+                observe_route(name, status, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def _get_base_dir():
+    """Routes take paths like "output/..." - relative to the output dir's parent"""
+    output_dir = folder_paths.get_output_directory()
+    return os.path.dirname(output_dir)  # Go up one level from output
+
+
+def _open_folder_job(relative_path, create):
+    """
+    Validate, optionally create, and open a folder (runs in the I/O pool).
+
+    Returns:
+        tuple: (response_dict, http_status)
+    """
+    # Security check: validate path is within allowed directory
+    is_valid, full_path = _validate_path_security(relative_path, _get_base_dir())
+    if not is_valid or full_path is None:
+        logger.warning("Path traversal attempt blocked: %s", relative_path)
+        return {"error": "Invalid path"}, 400
+
+    if create:
+        # Create the directory
+        os.makedirs(full_path, exist_ok=True)
+    elif not os.path.exists(full_path):
+        # Check if path exists
+        return {"error": "not_found"}, 200
+
+    # Open folder safely
+    if _open_folder_safe(full_path):
+        return {"success": True}, 200
+    return {"error": "Failed to open folder"}, 500
+
+
+def _create_folders_job(relative_paths):
+    """
+    Validate and create many folders in one pass (runs in the I/O pool).
+
+    Returns:
+        list: One result dict per requested path, in request order
+    """
+    base_dir = _get_base_dir()
+    results = []
+    for relative_path in relative_paths:
+        if not isinstance(relative_path, str):
+            results.append({"path": relative_path, "error": "Invalid path format"})
+            continue
+
+        is_valid, full_path = _validate_path_security(relative_path, base_dir)
+        if not is_valid or full_path is None:
+            logger.warning("Path traversal attempt blocked: %s", relative_path)
+            results.append({"path": relative_path, "error": "Invalid path"})
+            continue
+
+        try:
+            existed = os.path.isdir(full_path)
+            os.makedirs(full_path, exist_ok=True)
+            results.append({"path": relative_path, "success": True, "created": not existed})
+        except OSError:
+            logger.exception("Failed to create folder: %s", full_path)
+            results.append({"path": relative_path, "error": "Failed to create folder"})
+    return results
+
+
+async def _handle_open_folder(request, endpoint_key, create):
+    """Shared handler for open_folder and create_and_open_folder"""
     try:
         # Rate limiting
-        if not _check_rate_limit("open_folder"):
+        if not _check_rate_limit(endpoint_key):
             return web.json_response(
                 {"error": "Rate limited. Please wait."}, status=429
             )
@@ -139,75 +267,699 @@ async def open_folder(request):
         if not isinstance(relative_path, str):
             return web.json_response({"error": "Invalid path format"}, status=400)
 
-        # Get the ComfyUI output directory as base
-        output_dir = folder_paths.get_output_directory()
-        base_dir = os.path.dirname(output_dir)  # Go up one level from output
-
-        # Security check: validate path is within allowed directory
-        is_valid, full_path = _validate_path_security(relative_path, base_dir)
-        if not is_valid or full_path is None:
-            logger.warning("Path traversal attempt blocked: %s", relative_path)
-            return web.json_response({"error": "Invalid path"}, status=400)
-
-        # Check if path exists
-        if not os.path.exists(full_path):
-            return web.json_response({"error": "not_found"})
-
-        # Open folder safely
-        if _open_folder_safe(full_path):
-            return web.json_response({"success": True})
-        else:
-            return web.json_response({"error": "Failed to open folder"}, status=500)
+        result, status = await _run_io(_open_folder_job, relative_path, create)
+        return web.json_response(result, status=status)
 
     except json.JSONDecodeError:
         return web.json_response({"error": "Invalid JSON"}, status=400)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in %s endpoint", endpoint_key)
+        return web.json_response({"error": "Timed out"}, status=504)
     except Exception as e:
         # Log the full error for debugging, but return generic message to client
-        logger.exception("Error in open_folder endpoint")
+        logger.exception("Error in %s endpoint", endpoint_key)
         return web.json_response({"error": "Internal server error"}, status=500)
 
 
+# API Routes for folder operations
+@PromptServer.instance.routes.post("/flowpath/open_folder")
+@_timed_route("open_folder")
+async def open_folder(request):
+    """Open a folder in the system file explorer"""
+    return await _handle_open_folder(request, "open_folder", create=False)
+
+
 @PromptServer.instance.routes.post("/flowpath/create_and_open_folder")
+@_timed_route("create_and_open_folder")
 async def create_and_open_folder(request):
     """Create a folder and open it in the system file explorer"""
+    return await _handle_open_folder(request, "create_and_open_folder", create=True)
+
+
+@PromptServer.instance.routes.post("/flowpath/create_folders")
+@_timed_route("create_folders")
+async def create_folders(request):
+    """Validate and create many folders in one request (no file explorer)"""
     try:
-        # Rate limiting
-        if not _check_rate_limit("create_and_open_folder"):
+        data = await request.json()
+        relative_paths = data.get("paths")
+
+        # Validate input type
+        if not isinstance(relative_paths, list):
+            return web.json_response({"error": "Invalid paths format"}, status=400)
+        if len(relative_paths) > MAX_BATCH_FOLDERS:
             return web.json_response(
-                {"error": "Rate limited. Please wait."}, status=429
+                {"error": f"Too many paths (max {MAX_BATCH_FOLDERS})"}, status=400
             )
 
+        results = await _run_io(_create_folders_job, relative_paths)
+        return web.json_response({"results": results})
+
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in create_folders endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in create_folders endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+# Shared resolver for live previews (stateless apart from the shared caches)
+_preview_node = FlowPath()
+
+# Nodes resolved by one batched preview request
+MAX_PREVIEW_NODES = 64
+
+
+def _preview_job(widget_data, prompt, node_id):
+    """
+    Resolve a preview and check its folder stays in the output dir (runs in the I/O pool).
+
+    Returns:
+        tuple: (response_dict, http_status)
+    """
+    path, filename = _preview_node.preview_path(widget_data, prompt, node_id)
+    output_dir = folder_paths.get_output_directory()
+    is_valid, full_path = _validate_path_security(path, output_dir)
+    if not is_valid or full_path is None:
+        logger.warning("Path traversal attempt blocked: %s", path)
+        return {"error": "Invalid path"}, 403
+    return {"path": path, "filename": filename}, 200
+
+
+def _preview_batch_job(nodes, prompt):
+    """
+    Resolve the previews of several nodes against one prompt (runs in the I/O pool).
+    The prompt is parsed and analyzed once for all of them.
+
+    Args:
+        nodes: List of (node_id, widget_data) pairs
+        prompt: Workflow prompt shared by the nodes
+
+    Returns:
+        tuple: (response_dict, http_status) - results keyed by node id
+    """
+    results = {}
+    for node_id, widget_data in nodes:
+        try:
+            results[node_id], _ = _preview_job(widget_data, prompt, node_id)
+        except Exception:
+            logger.exception("Error resolving preview of node %s", node_id)
+            results[node_id] = {"error": "Internal server error"}
+    return {"results": results}, 200
+
+
+# In-flight preview computations keyed by request body hash.
+# Identical requests (e.g. several clients, or bursts while typing) share one result.
+_preview_inflight = {}
+
+
+@PromptServer.instance.routes.post("/flowpath/preview")
+@_timed_route("preview")
+async def preview_path(request):
+    """
+    Resolve a node's path and filename server-side without consuming a counter.
+
+    Takes {"widget_data", "prompt", "node_id"} for one node, or
+    {"prompt", "nodes": [{"node_id", "widget_data"}, ...]} for every node of
+    a canvas against one prompt snapshot (answered as {"results": {node_id: ...}}).
+    """
+    try:
+        body = await request.read()
+        data = json.loads(body)
+        if not isinstance(data, dict):
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+
+        prompt = data.get("prompt")
+        if prompt is not None and not isinstance(prompt, dict):
+            return web.json_response({"error": "Invalid prompt"}, status=400)
+
+        if "nodes" in data:
+            nodes = data["nodes"]
+            if not isinstance(nodes, list) or len(nodes) > MAX_PREVIEW_NODES:
+                return web.json_response({"error": "Invalid nodes"}, status=400)
+            pairs = []
+            for item in nodes:
+                if not isinstance(item, dict) or not isinstance(item.get("widget_data"), str):
+                    return web.json_response({"error": "Invalid nodes"}, status=400)
+                pairs.append((str(item.get("node_id")), item["widget_data"]))
+            job = (_preview_batch_job, pairs, prompt)
+        else:
+            widget_data = data.get("widget_data", "{}")
+            node_id = data.get("node_id")
+
+            # Validate input types
+            if not isinstance(widget_data, str):
+                return web.json_response({"error": "Invalid widget_data"}, status=400)
+            if node_id is not None:
+                node_id = str(node_id)
+            job = (_preview_job, widget_data, prompt, node_id)
+
+        key = hashlib.sha1(body).hexdigest()
+        future = _preview_inflight.get(key)
+        if future is None:
+            # Plans and counters are cached, but a cold counter index scans the
+            # folder - keep that off the event loop
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(_route_executor, *job)
+            _preview_inflight[key] = future
+            future.add_done_callback(lambda _: _preview_inflight.pop(key, None))
+
+        result, status = await asyncio.wait_for(
+            asyncio.shield(future), ROUTE_IO_TIMEOUT
+        )
+        return web.json_response(result, status=status)
+
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in preview endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in preview endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+def _counter_gaps_job(widget_data, prompt, node_id, limit):
+    """
+    Free counters of a node's folder, inside the output dir only (runs in the I/O pool).
+
+    Returns:
+        tuple: (response_dict, http_status)
+    """
+    try:
+        result = get_resolver().counter_gaps(widget_data, prompt, node_id, limit)
+    except ValueError:
+        logger.warning("Path traversal attempt blocked in counter_gaps")
+        return {"error": "Invalid path"}, 403
+    if result is None:
+        return {"error": "Node has no {counter} folder"}, 400
+    return result, 200
+
+
+@PromptServer.instance.routes.post("/flowpath/counter_gaps")
+@_timed_route("counter_gaps")
+async def counter_gaps(request):
+    """Free {counter} values (deleted files) below the highest one in a node's folder"""
+    try:
         data = await request.json()
-        relative_path = data.get("path", "output")
+        if not isinstance(data, dict):
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+
+        widget_data = data.get("widget_data", "{}")
+        prompt = data.get("prompt")
+        node_id = data.get("node_id")
+        limit = data.get("limit", 100)
+
+        # Validate input types
+        if not isinstance(widget_data, str):
+            return web.json_response({"error": "Invalid widget_data"}, status=400)
+        if prompt is not None and not isinstance(prompt, dict):
+            return web.json_response({"error": "Invalid prompt"}, status=400)
+        if not isinstance(limit, int) or not 0 <= limit <= MAX_QUERY_LIMIT:
+            return web.json_response({"error": "Invalid limit"}, status=400)
+        if node_id is not None:
+            node_id = str(node_id)
+
+        result, status = await _run_io(_counter_gaps_job, widget_data, prompt, node_id, limit)
+        return web.json_response(result, status=status)
 
-        # Validate input type
-        if not isinstance(relative_path, str):
-            return web.json_response({"error": "Invalid path format"}, status=400)
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in counter_gaps endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in counter_gaps endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
 
-        # Get the ComfyUI output directory as base
-        output_dir = folder_paths.get_output_directory()
-        base_dir = os.path.dirname(output_dir)  # Go up one level from output
 
-        # Security check: validate path is within allowed directory
-        is_valid, full_path = _validate_path_security(relative_path, base_dir)
-        if not is_valid or full_path is None:
-            logger.warning("Path traversal attempt blocked: %s", relative_path)
-            return web.json_response({"error": "Invalid path"}, status=400)
+# Output tree statistics - the background walker starts on the first request
+_output_stats = None
 
-        # Create the directory
-        os.makedirs(full_path, exist_ok=True)
 
-        # Open folder safely
-        if _open_folder_safe(full_path):
-            return web.json_response({"success": True})
+@PromptServer.instance.routes.get("/flowpath/stats")
+@_timed_route("stats")
+async def output_stats(request):
+    """Per-folder file counts and sizes under the output directory (served from cache)"""
+    global _output_stats
+    try:
+        if _output_stats is None:
+            _output_stats = OutputTreeStats(folder_paths.get_output_directory())
+        _output_stats.start()
+
+        prefix = request.query.get("path", "")
+        sort = request.query.get("sort", "growth")
+        try:
+            limit = max(1, min(int(request.query.get("limit", "100")), 10000))
+        except ValueError:
+            return web.json_response({"error": "Invalid limit"}, status=400)
+
+        folders = _output_stats.snapshot(prefix=prefix, sort=sort, limit=limit)
+        return web.json_response(
+            {
+                "updated_at": _output_stats.updated_at,
+                "refresh_seconds": _output_stats.last_refresh_seconds,
+                "dirs_rescanned": _output_stats.dirs_rescanned,
+                "scanning": _output_stats.updated_at is None,
+                "folders": folders,
+            }
+        )
+
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in stats endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+def _browse_job(relative_path, sort, order, cursor, limit):
+    """
+    Validate a path under the output directory and list one page of it
+    (runs in the I/O pool).
+
+    Returns:
+        tuple: (response_dict, http_status)
+    """
+    output_dir = folder_paths.get_output_directory()
+    is_valid, full_path = _validate_path_security(relative_path, output_dir)
+    if not is_valid or full_path is None:
+        logger.warning("Path traversal attempt blocked: %s", relative_path)
+        return {"error": "Invalid path"}, 400
+    if not os.path.isdir(full_path):
+        return {"error": "not_found"}, 404
+
+    try:
+        page = browse_folder(full_path, sort=sort, order=order, cursor=cursor, limit=limit)
+    except BrowseError as e:
+        return {"error": str(e)}, 400
+    page.update({"path": relative_path, "sort": sort, "order": order})
+    return page, 200
+
+
+@PromptServer.instance.routes.get("/flowpath/browse")
+@_timed_route("browse")
+async def browse(request):
+    """One page of a folder under the output directory (cursor pagination)"""
+    try:
+        relative_path = request.query.get("path", "")
+        sort = request.query.get("sort", "name")
+        order = request.query.get("order", "asc")
+        cursor = request.query.get("cursor") or None
+        try:
+            limit = max(1, min(int(request.query.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        except ValueError:
+            return web.json_response({"error": "Invalid limit"}, status=400)
+
+        result, status = await _run_io(_browse_job, relative_path, sort, order, cursor, limit)
+        return web.json_response(result, status=status)
+
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in browse endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in browse endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+def _recent_job(relative_path, widget_data, limit):
+    """
+    Newest files of a folder given directly or as resolved by build_path
+    (runs in the I/O pool).
+
+    Returns:
+        tuple: (response_dict, http_status, version or None)
+    """
+    output_dir = folder_paths.get_output_directory()
+    prefix = None
+    if widget_data is not None:
+        relative_path, prefix = get_resolver().output_location(widget_data)
+
+    is_valid, full_path = _validate_path_security(relative_path, output_dir)
+    if not is_valid or full_path is None:
+        logger.warning("Path traversal attempt blocked: %s", relative_path)
+        return {"error": "Invalid path"}, 400, None
+    if not os.path.isdir(full_path):
+        return {"path": relative_path, "files": []}, 200, None
+
+    files, version = recent_index.recent(full_path, limit=limit, prefix=prefix)
+    results = []
+    for file in files:
+        file_path = os.path.join(relative_path, file["name"]) if relative_path else file["name"]
+        entry = dict(file, path=file_path.replace(os.sep, "/"))
+        if THUMBNAILS_AVAILABLE and os.path.splitext(file["name"])[1].lower() in THUMBNAIL_EXTENSIONS:
+            entry["thumbnail"] = "/flowpath/thumbnail?path=" + quote(entry["path"])
+        results.append(entry)
+    return {"path": relative_path, "prefix": prefix, "files": results}, 200, version
+
+
+@PromptServer.instance.routes.get("/flowpath/recent")
+@_timed_route("recent")
+async def recent_outputs(request):
+    """Newest files in a FlowPath folder (by path, or by the node's widget_data)"""
+    try:
+        relative_path = request.query.get("path", "")
+        widget_data = request.query.get("widget_data")
+        try:
+            limit = max(1, min(int(request.query.get("limit", "20")), RECENT_INDEX_FILES))
+        except ValueError:
+            return web.json_response({"error": "Invalid limit"}, status=400)
+
+        result, status, version = await _run_io(_recent_job, relative_path, widget_data, limit)
+        if version is None:
+            return web.json_response(result, status=status)
+
+        # Polling clients get a 304 until the folder changes
+        source = hashlib.sha1((widget_data or relative_path).encode("utf-8")).hexdigest()[:8]
+        etag = f'"{version}-{limit}-{source}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(
+            result, status=status, headers={"ETag": etag, "Cache-Control": "no-cache"}
+        )
+
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in recent endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in recent endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+# Thumbnails are cached outside the output folder
+_thumbnail_cache = ThumbnailCache(
+    os.environ.get("FLOWPATH_THUMBNAIL_DIR")
+    or os.path.join(
+        folder_paths.get_temp_directory()
+        if hasattr(folder_paths, "get_temp_directory")
+        else tempfile.gettempdir(),
+        "flowpath_thumbnails",
+    )
+)
+
+
+def _not_modified(request, etag, mtime):
+    """Check If-None-Match / If-Modified-Since against a file's ETag and mtime"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")]
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def _thumbnail_job(relative_path, size, request):
+    """
+    Validate an output image and return its thumbnail (runs in the I/O pool).
+
+    Returns:
+        web.Response
+    """
+    output_dir = folder_paths.get_output_directory()
+    is_valid, full_path = _validate_path_security(relative_path, output_dir)
+    if not is_valid or full_path is None:
+        logger.warning("Path traversal attempt blocked: %s", relative_path)
+        return web.json_response({"error": "Invalid path"}, status=400)
+    if os.path.splitext(full_path)[1].lower() not in THUMBNAIL_EXTENSIONS:
+        return web.json_response({"error": "Not an image"}, status=415)
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return web.json_response({"error": "not_found"}, status=404)
+
+    etag = thumbnail_etag(stat, size)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": email.utils.formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        return web.Response(status=304, headers=headers)
+
+    try:
+        data, _ = _thumbnail_cache.get(full_path, size, stat=stat)
+    except OSError:
+        logger.warning("Failed to create thumbnail: %s", full_path)
+        return web.json_response({"error": "Unreadable image"}, status=415)
+    return web.Response(body=data, content_type="image/jpeg", headers=headers)
+
+
+@PromptServer.instance.routes.get("/flowpath/thumbnail")
+@_timed_route("thumbnail")
+async def thumbnail(request):
+    """Downscaled JPEG of an output image, cached on disk, with conditional GET"""
+    try:
+        if not THUMBNAILS_AVAILABLE:
+            return web.json_response({"error": "Thumbnails need Pillow"}, status=501)
+        relative_path = request.query.get("path", "")
+        try:
+            size = int(request.query.get("size", DEFAULT_THUMBNAIL_SIZE))
+        except ValueError:
+            return web.json_response({"error": "Invalid size"}, status=400)
+        size = snap_thumbnail_size(size)
+
+        return await _run_io(_thumbnail_job, relative_path, size, request)
+
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in thumbnail endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in thumbnail endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+def _provenance_job(filters, limit):
+    """
+    Query the provenance log (runs in the I/O pool).
+
+    Returns:
+        tuple: (response_dict, http_status)
+    """
+    output_dir = folder_paths.get_output_directory()
+    for key in ("file", "path"):
+        if filters.get(key) is not None:
+            is_valid, full_path = _validate_path_security(filters[key], output_dir)
+            if not is_valid or full_path is None:
+                logger.warning("Path traversal attempt blocked: %s", filters[key])
+                return {"error": "Invalid path"}, 400
+
+    log = get_provenance_log(output_dir, force=True)
+    if log is None:
+        return {"records": [], "enabled": False}, 200
+    return {"records": log.query(limit=limit, **filters), "enabled": True}, 200
+
+
+@PromptServer.instance.routes.get("/flowpath/provenance")
+@_timed_route("provenance")
+async def provenance(request):
+    """Seed/model/LoRAs behind output paths (by file, folder, seed, model or LoRA)"""
+    try:
+        filters = {
+            key: request.query[key]
+            for key in ("file", "path", "seed", "model", "lora")
+            if request.query.get(key)
+        }
+        if not filters:
+            return web.json_response(
+                {"error": "Give at least one of file, path, seed, model, lora"}, status=400
+            )
+        try:
+            limit = max(1, min(int(request.query.get("limit", "100")), MAX_QUERY_LIMIT))
+        except ValueError:
+            return web.json_response({"error": "Invalid limit"}, status=400)
+
+        result, status = await _run_io(_provenance_job, filters, limit)
+        return web.json_response(result, status=status)
+
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in provenance endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in provenance endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+def _migration_job(data):
+    """
+    Create, run or cancel a migration job (runs in the I/O pool).
+
+    Returns:
+        tuple: (response_dict, http_status)
+    """
+    resolver = get_resolver()
+    job_id = data.get("job")
+    if job_id is not None:
+        job = get_job(resolver, str(job_id))
+        action = data.get("action", "run")
+        if action == "cancel":
+            job.cancel()
+        elif action == "run":
+            # Resumes the stored plan after the last checkpoint
+            job.start(execute=True, workers=data.get("workers", DEFAULT_WORKERS), replan=False)
+        elif action == "plan":
+            job.start(execute=False)
         else:
-            return web.json_response({"error": "Failed to open folder"}, status=500)
+            return {"error": "Invalid action (use run, plan or cancel)"}, 400
+        return job.progress(), 202
+
+    layouts = []
+    for key in ("old_widget_data", "new_widget_data"):
+        widget_data = data.get(key)
+        if isinstance(widget_data, dict):
+            widget_data = json.dumps(widget_data)
+        if not isinstance(widget_data, str):
+            return {"error": f"Missing {key}"}, 400
+        layouts.append(widget_data)
+
+    source = data.get("source")
+    if source is not None:
+        if not isinstance(source, str):
+            return {"error": "Invalid source format"}, 400
+        is_valid, full_path = _validate_path_security(source, folder_paths.get_output_directory())
+        if not is_valid or full_path is None:
+            logger.warning("Path traversal attempt blocked: %s", source)
+            return {"error": "Invalid path"}, 400
+
+    job = create_job(resolver, layouts[0], layouts[1], source)
+    job.start(execute=bool(data.get("execute")), workers=data.get("workers", DEFAULT_WORKERS))
+    return job.progress(), 202
+
+
+@PromptServer.instance.routes.post("/flowpath/migration")
+@_timed_route("migration")
+async def migration(request):
+    """
+    Start a migration of existing outputs to a new segment layout.
+    Dry run unless "execute" is true; {"job": id, "action": "run"} executes
+    or resumes a planned job, "cancel" stops it.
+    """
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        if not isinstance(data.get("workers", DEFAULT_WORKERS), int):
+            return web.json_response({"error": "Invalid workers"}, status=400)
+
+        try:
+            result, status = await _run_io(_migration_job, data)
+        except MigrationError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(result, status=status)
 
     except json.JSONDecodeError:
         return web.json_response({"error": "Invalid JSON"}, status=400)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in migration endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in migration endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+@PromptServer.instance.routes.get("/flowpath/migration")
+@_timed_route("migration_progress")
+async def migration_progress(request):
+    """Progress of a migration job (status, counts, rate, sample of planned moves)"""
+    try:
+        job_id = request.query.get("job", "")
+        try:
+            job = await _run_io(get_job, get_resolver(), job_id)
+        except MigrationError as e:
+            return web.json_response({"error": str(e)}, status=404)
+        return web.json_response(job.progress())
+
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in migration_progress endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in migration_progress endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+@PromptServer.instance.routes.get("/flowpath/presets")
+@_timed_route("presets")
+async def list_presets(request):
+    """The whole preset library; answers 304 if the client's ETag is current"""
+    try:
+        etag, body = get_presets().snapshot()
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=body,
+            content_type="application/json",
+            headers={"ETag": etag, "Cache-Control": "no-cache"},
+        )
+
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in presets endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+@PromptServer.instance.routes.post("/flowpath/presets")
+@_timed_route("save_presets")
+async def save_presets(request):
+    """
+    Save ({"upsert": {name: preset}}) and delete ({"delete": [names]}) presets.
+    With "sync": true, upserts of deleted presets are ignored.
+    """
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        upsert = data.get("upsert") or {}
+        delete = data.get("delete") or []
+
+        # Validate input types
+        if not isinstance(upsert, dict):
+            return web.json_response({"error": "Invalid upsert format"}, status=400)
+        if not isinstance(delete, list) or not all(isinstance(n, str) for n in delete):
+            return web.json_response({"error": "Invalid delete format"}, status=400)
+
+        store = get_presets()
+        try:
+            versions = await _run_io(store.apply, upsert, delete, data.get("sync") is True)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        etag, _ = store.snapshot()
+        return web.json_response({"versions": versions}, headers={"ETag": etag})
+
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out in save_presets endpoint")
+        return web.json_response({"error": "Timed out"}, status=504)
+    except Exception as e:
+        # Log the full error for debugging, but return generic message to client
+        logger.exception("Error in save_presets endpoint")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+@PromptServer.instance.routes.get("/flowpath/metrics")
+async def metrics(request):
+    """Path resolution stage timings, route latency and counter stats (Prometheus text format)"""
+    try:
+        return web.Response(
+            body=render_prometheus().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
     except Exception as e:
         # Log the full error for debugging, but return generic message to client
-        logger.exception("Error in create_and_open_folder endpoint")
+        logger.exception("Error in metrics endpoint")
         return web.json_response({"error": "Internal server error"}, status=500)
 
 
@@ -0,0 +1,524 @@
+"""
+FlowPath Benchmarks
+Times FlowPath's hot paths without a ComfyUI install (uses the flowpath core)
+
+Usage:
+    python benchmarks/bench_flowpath.py                  # full run
+    python benchmarks/bench_flowpath.py --quick          # small folders/graphs
+    python benchmarks/bench_flowpath.py --only counter,seed
+    python benchmarks/bench_flowpath.py --output results.json
+    python benchmarks/bench_flowpath.py --compare results.json
+
+Results are written as JSON (see --output) so runs from different versions
+can be compared with --compare.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES_DIR = os.path.join(REPO_ROOT, "examples")
+
+RESULTS_SCHEMA_VERSION = 1
+
+# Synthetic folder sizes for the counter benchmark (files per folder)
+COUNTER_FOLDER_SIZES = (1_000, 100_000, 1_000_000)
+QUICK_COUNTER_FOLDER_SIZES = (1_000, 10_000)
+
+# Synthetic prompt sizes for the seed detection benchmark (nodes per graph)
+GRAPH_SIZES = (100, 1_000, 10_000)
+QUICK_GRAPH_SIZES = (100, 1_000)
+
+# Values the frontend stores after a seed widget ("control_after_generate")
+SEED_CONTROL_VALUES = frozenset({"fixed", "increment", "decrement", "randomize"})
+
+SUITES = ("build_path", "counter", "seed", "template")
+
+
+# --- Setup -------------------------------------------------------------------
+
+
+def load_resolver(output_dir):
+    """
+    Import the flowpath core from this checkout.
+
+    Args:
+        output_dir: Output directory for the resolver (synthetic folders live here)
+
+    Returns:
+        PathResolver: Resolver for output_dir
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from flowpath.core import PathResolver
+
+    return PathResolver(output_dir)
+
+
+# --- Timing ------------------------------------------------------------------
+
+
+class Recorder:
+    """Collects timing results in the JSON results format"""
+
+    def __init__(self, min_time=0.2, max_repeats=50):
+        self.min_time = min_time
+        self.max_repeats = max_repeats
+        self.results = []
+
+    def measure(self, name, func, params=None, setup=None, repeats=None, number=1):
+        """
+        Time func() and record per-call statistics.
+
+        Args:
+            name: Benchmark name (e.g. "counter.cold")
+            func: Callable to time
+            params: Dict describing the case (folder size, graph size, ...)
+            setup: Optional callable run before every repeat, not timed
+            repeats: Fixed number of repeats (default: until min_time is spent)
+            number: Calls to func per repeat
+
+        Returns:
+            dict: The recorded result
+        """
+        samples = []
+        spent = 0.0
+        while True:
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            elapsed = time.perf_counter() - started
+            samples.append(elapsed / number)
+            spent += elapsed
+            if repeats is not None:
+                if len(samples) >= repeats:
+                    break
+            elif len(samples) >= self.max_repeats or (
+                spent >= self.min_time and len(samples) >= 3
+            ):
+                break
+
+        samples.sort()
+        result = {
+            "name": name,
+            "params": params or {},
+            "unit": "s",
+            "repeats": len(samples),
+            "number": number,
+            "min": samples[0],
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        }
+        self.results.append(result)
+        _log(f"  {_label(result):<58} {_format_seconds(result['median']):>10}")
+        return result
+
+
+def _log(message):
+    """Progress output goes to stderr so --output - stays valid JSON"""
+    print(message, file=sys.stderr, flush=True)
+
+
+def _label(result):
+    params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+    return f"{result['name']} [{params}]" if params else result["name"]
+
+
+def _format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+# --- Inputs ------------------------------------------------------------------
+
+
+def workflow_to_prompt(workflow):
+    """
+    Convert a saved UI workflow into the API prompt format FlowPath receives.
+
+    Linked inputs become [node_id, output_index]. Widget values are matched
+    to the node's widget inputs in order, skipping the "control after
+    generate" value stored after seed widgets. Good enough for seed, model
+    and LoRA detection; not a general converter.
+
+    Args:
+        workflow: Workflow dict as saved by the ComfyUI frontend
+
+    Returns:
+        dict: node_id -> {"class_type", "inputs"}
+    """
+    links = {link[0]: link for link in workflow.get("links", [])}
+    prompt = {}
+    for node in workflow.get("nodes", []):
+        if node.get("mode", 0) != 0 or node.get("type") in ("Note", "MarkdownNote"):
+            continue
+        inputs = {}
+        widget_names = []
+        for node_input in node.get("inputs", []):
+            link = links.get(node_input.get("link"))
+            if link is not None:
+                inputs[node_input["name"]] = [str(link[1]), link[2]]
+            # Linked widgets still keep their slot in widgets_values
+            if node_input.get("widget"):
+                widget_names.append(node_input["widget"]["name"])
+
+        values = node.get("widgets_values")
+        if isinstance(values, list):
+            values = [
+                v
+                for i, v in enumerate(values)
+                if not (
+                    i > 0
+                    and isinstance(v, str)
+                    and v in SEED_CONTROL_VALUES
+                    and isinstance(values[i - 1], int)
+                )
+            ]
+            for name, value in zip(widget_names, values):
+                inputs.setdefault(name, value)
+
+        prompt[str(node["id"])] = {"class_type": node["type"], "inputs": inputs}
+    return prompt
+
+
+def load_examples():
+    """
+    Load the example workflows.
+
+    Returns:
+        list: (name, prompt, [(flowpath_node_id, widget_data), ...])
+    """
+    examples = []
+    for filename in sorted(os.listdir(EXAMPLES_DIR)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(EXAMPLES_DIR, filename), encoding="utf-8") as f:
+            workflow = json.load(f)
+        nodes = [
+            (str(node["id"]), node["widgets_values"][0])
+            for node in workflow.get("nodes", [])
+            if node.get("type") == "FlowPath" and node.get("widgets_values")
+        ]
+        # "FlowPath Example T2I Workflow (Image Saver).json" -> "image_saver"
+        stem = os.path.splitext(filename)[0]
+        name = stem[stem.find("(") + 1 : -1] if stem.endswith(")") else "basic"
+        name = name.lower().replace(" ", "_")
+        examples.append((name, workflow_to_prompt(workflow), nodes))
+    return examples
+
+
+def synthetic_widget_data(segments=12):
+    """Widget data using every template feature: many segments, dates, counter"""
+    segment_types = ["file_type", "category", "name", "model", "lora", "resolution"]
+    data = {
+        "segments": [{"type": t, "enabled": True} for t in segment_types]
+        + [{"type": "date", "enabled": True}]
+        + [
+            {"type": "custom", "enabled": True, "value": f"{{model}}_{{seed}}_part{i}"}
+            for i in range(max(0, segments - len(segment_types) - 1))
+        ],
+        "config": {
+            "file_type": "Image",
+            "category": "Characters",
+            "name": "Hero Shot",
+            "model_name": "sd_xl_base_1.0",
+            "lora_name": "+".join(f"detail_lora_v{i}" for i in range(8)),
+            "resolution": "1024x1024",
+            "seed": "123456789",
+            "date_format": "%Y-%m-%d",
+            "filename_template": "{name}_{model}_{seed}_{date}_{counter}",
+            "counter_padding": 5,
+        },
+    }
+    return json.dumps(data)
+
+
+def synthetic_prompt(node_count, seed=42):
+    """
+    Build a large workflow prompt: many sampler chains with a FlowPath node
+    feeding one SaveImage near the end.
+
+    Returns:
+        tuple: (prompt dict, flowpath node id)
+    """
+    rng = random.Random(seed)
+    prompt = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "model.safetensors"}},
+        "2": {"class_type": "EmptyLatentImage", "inputs": {"width": 1024, "height": 1024, "batch_size": 1}},
+    }
+    next_id = 3
+    last_decode = None
+    while next_id + 4 < node_count:
+        sampler, decode, lora = str(next_id), str(next_id + 1), str(next_id + 2)
+        prompt[lora] = {
+            "class_type": "LoraLoader",
+            "inputs": {"model": ["1", 0], "clip": ["1", 1], "lora_name": f"lora_{next_id}.safetensors"},
+        }
+        prompt[sampler] = {
+            "class_type": "KSampler",
+            "inputs": {"seed": rng.randrange(2**48), "model": [lora, 0], "latent_image": ["2", 0]},
+        }
+        prompt[decode] = {"class_type": "VAEDecode", "inputs": {"samples": [sampler, 0], "vae": ["1", 2]}}
+        last_decode = decode
+        next_id += 3
+
+    flowpath_id = str(next_id)
+    prompt[flowpath_id] = {"class_type": "FlowPath", "inputs": {"widget_data": "{}"}}
+    prompt[str(next_id + 1)] = {
+        "class_type": "SaveImage",
+        "inputs": {"images": [last_decode or "1", 0], "filename_prefix": [flowpath_id, 0]},
+    }
+    return prompt, flowpath_id
+
+
+def ensure_counter_folder(root, size):
+    """
+    Create (once) a folder with `size` files matching "bench_{counter}".
+    A marker file records completed folders so reruns reuse them.
+
+    Returns:
+        str: Folder name relative to root
+    """
+    name = f"counter_{size}"
+    folder = os.path.join(root, name)
+    marker = os.path.join(root, f".{name}.done")
+    if os.path.exists(marker):
+        return name
+
+    os.makedirs(folder, exist_ok=True)
+    _log(f"  creating {size:,} files in {folder} ...")
+    flags = os.O_CREAT | os.O_WRONLY
+    for i in range(1, size + 1):
+        # Mix in files that don't match the pattern, like a real output folder
+        filename = f"bench_{i:07d}.png" if i % 10 else f"other_{i:07d}.txt"
+        os.close(os.open(os.path.join(folder, filename), flags))
+    with open(marker, "w") as f:
+        f.write(str(size))
+    return name
+
+
+# --- Suites ------------------------------------------------------------------
+
+
+def bench_build_path(resolver, recorder, examples, args):
+    from flowpath import path_plan
+
+    cases = [(name, prompt, node_id, data) for name, prompt, nodes in examples for node_id, data in nodes]
+    cases.append(("synthetic", synthetic_prompt(200)[0], None, synthetic_widget_data()))
+
+    for name, prompt, node_id, widget_data in cases:
+        params = {"workflow": name, "node": node_id}
+        recorder.measure(
+            "build_path.warm",
+            lambda: resolver.preview_path(widget_data, prompt, node_id),
+            params,
+            number=200,
+        )
+        recorder.measure(
+            "build_path.cold_plan",
+            lambda: resolver.preview_path(widget_data, prompt, node_id),
+            params,
+            setup=path_plan._plan_cache.clear,
+        )
+
+
+def bench_counter(resolver, recorder, args):
+    from flowpath.counter_index import counter_index
+
+    sizes = QUICK_COUNTER_FOLDER_SIZES if args.quick else COUNTER_FOLDER_SIZES
+    pattern = "bench_{counter}"
+
+    for size in sizes:
+        folder = ensure_counter_folder(resolver.output_dir, size)
+        params = {"files": size}
+        # Full folder scan, as on the first run or after an external change
+        recorder.measure(
+            "counter.cold",
+            lambda: resolver.next_counter(folder, pattern, reserve=False),
+            params,
+            setup=counter_index.invalidate,
+            repeats=3 if size >= 1_000_000 else None,
+        )
+        # Cached index, revalidated with one stat() call
+        recorder.measure(
+            "counter.warm",
+            lambda: resolver.next_counter(folder, pattern, reserve=False),
+            params,
+            number=1000,
+        )
+
+
+def bench_seed(resolver, recorder, examples, args):
+    from flowpath import prompt_analyzer
+    from flowpath.core import detect_seed
+
+    cases = [(name, prompt, nodes[0][0] if nodes else None) for name, prompt, nodes in examples]
+    for size in QUICK_GRAPH_SIZES if args.quick else GRAPH_SIZES:
+        prompt, flowpath_id = synthetic_prompt(size)
+        cases.append((f"synthetic_{size}", prompt, flowpath_id))
+
+    for name, prompt, node_id in cases:
+        params = {"workflow": name, "nodes": len(prompt)}
+        # First FlowPath node in a run: the prompt gets indexed
+        recorder.measure(
+            "seed.cold",
+            lambda: detect_seed(prompt, node_id),
+            params,
+            setup=prompt_analyzer._analysis_cache.clear,
+        )
+        # Further FlowPath nodes in the same run share the analysis
+        recorder.measure(
+            "seed.warm",
+            lambda: detect_seed(prompt, node_id),
+            params,
+            number=1000,
+        )
+
+
+def bench_template(resolver, recorder, args):
+    from flowpath import templates
+    from flowpath.core import replace_template_vars
+
+    config = json.loads(synthetic_widget_data())["config"]
+    now = datetime.now()
+    cases = {
+        "simple": "{name}_{seed}",
+        "dates": "{year}/{month}/{day}/{name}_{date}",
+        "all": "_".join("{%s}" % v for v in templates.TEMPLATE_VARIABLES),
+    }
+
+    for name, template in cases.items():
+        params = {"template": name}
+        recorder.measure(
+            "template.warm",
+            lambda: replace_template_vars(template, config, now),
+            params,
+            number=1000,
+        )
+        recorder.measure(
+            "template.cold",
+            lambda: replace_template_vars(template, config, now),
+            params,
+            setup=templates.compile_template.cache_clear,
+        )
+
+
+# --- Reporting ---------------------------------------------------------------
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(baseline_path, results):
+    """Print median ratios against a previous results file"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {_result_key(r): r for r in baseline.get("results", [])}
+
+    _log(f"\nCompared with {baseline_path} ({baseline.get('meta', {}).get('git_revision')}):")
+    for result in results:
+        old = previous.get(_result_key(result))
+        if old is None or not old["median"]:
+            continue
+        ratio = result["median"] / old["median"]
+        marker = "slower" if ratio > 1.1 else "faster" if ratio < 0.9 else ""
+        _log(
+            f"  {_label(result):<58} {_format_seconds(old['median']):>10} -> "
+            f"{_format_seconds(result['median']):>10}  x{ratio:.2f} {marker}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FlowPath's hot paths")
+    parser.add_argument("--quick", action="store_true", help="Smaller folders and graphs")
+    parser.add_argument(
+        "--only", default=",".join(SUITES), help=f"Comma-separated suites ({', '.join(SUITES)})"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(tempfile.gettempdir(), "flowpath-bench"),
+        help="Stub output directory; synthetic folders are kept here between runs",
+    )
+    parser.add_argument("--output", help="Write JSON results to this file ('-' for stdout)")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per measurement")
+    args = parser.parse_args(argv)
+
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suite(s): {', '.join(sorted(unknown))}")
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    resolver = load_resolver(args.data_dir)
+    recorder = Recorder(min_time=args.min_time)
+    examples = load_examples() if {"build_path", "seed"} & set(suites) else []
+
+    for suite in suites:
+        _log(f"{suite}:")
+        if suite == "build_path":
+            bench_build_path(resolver, recorder, examples, args)
+        elif suite == "counter":
+            bench_counter(resolver, recorder, args)
+        elif suite == "seed":
+            bench_seed(resolver, recorder, examples, args)
+        elif suite == "template":
+            bench_template(resolver, recorder, args)
+
+    report = {
+        "schema": RESULTS_SCHEMA_VERSION,
+        "meta": {
+            "git_revision": _git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": recorder.results,
+    }
+
+    if args.compare:
+        compare(args.compare, recorder.results)
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        _log(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+FlowPath Load Test
+Drives the FlowPath HTTP routes and build_path concurrently, like a shared
+ComfyUI server with many users clicking "open folder" while jobs run
+
+Usage:
+    python benchmarks/load_flowpath.py                     # 10 s, 100k-file tree
+    python benchmarks/load_flowpath.py --quick
+    python benchmarks/load_flowpath.py --concurrency 64 --build-threads 4 --duration 30
+    python benchmarks/load_flowpath.py --launch-ms 50 --output load.json
+
+The routes from __init__.py are mounted on a local aiohttp test server with
+stub PromptServer and folder_paths modules (needs aiohttp, no ComfyUI).
+Launching the desktop file explorer is replaced by a sleep of --launch-ms.
+Reports throughput and p50/p99 latency per operation, and event loop lag
+(how late a timer on the server loop fires - stalls every route).
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import tempfile
+import asyncio
+import argparse
+import platform
+import threading
+import importlib.util
+from datetime import datetime
+
+from bench_flowpath import REPO_ROOT, _format_seconds, _git_revision, _log
+
+RESULTS_SCHEMA_VERSION = 1
+
+# Package name the repo root is imported under (its __init__.py registers the routes)
+PACKAGE_NAME = "comfyui_flowpath"
+
+OPERATIONS = ("open_folder", "create_and_open_folder", "build_path")
+
+# Synthetic output tree: folders x files matching "img_{counter}"
+TREE_SIZE = (50, 2_000)
+QUICK_TREE_SIZE = (10, 500)
+
+# Seconds between event loop lag probes
+LAG_PROBE_INTERVAL = 0.01
+
+
+# --- Setup -------------------------------------------------------------------
+
+
+def install_stubs(data_dir):
+    """
+    Register stand-ins for ComfyUI's server and folder_paths modules.
+
+    Returns:
+        str: Output directory of the stub folder_paths
+    """
+    from aiohttp import web
+
+    output_dir = os.path.join(data_dir, "output")
+    user_dir = os.path.join(data_dir, "user")
+    os.makedirs(output_dir, exist_ok=True)
+
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.get_output_directory = lambda: output_dir
+    folder_paths.get_user_directory = lambda: user_dir
+    sys.modules["folder_paths"] = folder_paths
+
+    class PromptServer:
+        instance = types.SimpleNamespace(routes=web.RouteTableDef())
+
+    server = types.ModuleType("server")
+    server.PromptServer = PromptServer
+    sys.modules["server"] = server
+    return output_dir
+
+
+def load_package(launch_seconds, rate_limit):
+    """
+    Import the FlowPath custom node package from this checkout.
+
+    Args:
+        launch_seconds: Time the stub file explorer launch takes
+        rate_limit: Keep the per-endpoint rate limit (most requests get 429)
+
+    Returns:
+        module: The package (routes are registered on the stub PromptServer)
+    """
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME,
+        os.path.join(REPO_ROOT, "__init__.py"),
+        submodule_search_locations=[REPO_ROOT],
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+
+    def open_folder_stub(folder_path):
+        # Same checks as _open_folder_safe, with a sleep instead of Popen
+        if not os.path.exists(folder_path):
+            return False
+        if launch_seconds:
+            time.sleep(launch_seconds)
+        return True
+
+    package._open_folder_safe = open_folder_stub
+    if not rate_limit:
+        package.RATE_LIMIT_INTERVAL = 0
+    return package
+
+
+def ensure_tree(output_dir, folders, files):
+    """
+    Create (once) folders x files outputs under output/Load.
+    A marker file records completed trees so reruns reuse them.
+
+    Returns:
+        list: Folder paths relative to the output dir
+    """
+    names = [f"Load/folder_{i:04d}" for i in range(folders)]
+    marker = os.path.join(output_dir, f".load_{folders}x{files}.done")
+    if os.path.exists(marker):
+        return names
+
+    _log(f"  creating {folders:,} x {files:,} files in {output_dir} ...")
+    flags = os.O_CREAT | os.O_WRONLY
+    for name in names:
+        folder = os.path.join(output_dir, name)
+        os.makedirs(folder, exist_ok=True)
+        for i in range(1, files + 1):
+            os.close(os.open(os.path.join(folder, f"img_{i:04d}.png"), flags))
+    with open(marker, "w") as f:
+        f.write(f"{folders}x{files}")
+    return names
+
+
+def widget_data_for(folder):
+    """Widget data saving "img_{counter}" files into one synthetic folder"""
+    return json.dumps(
+        {
+            "segments": [{"type": "custom", "enabled": True, "value": part} for part in folder.split("/")],
+            "config": {
+                "output_mode": "imageSaver",
+                "filename_template": "img_{counter}",
+            },
+        }
+    )
+
+
+# --- Load --------------------------------------------------------------------
+
+
+class Stats:
+    """Latencies and outcomes of one operation"""
+
+    def __init__(self):
+        self.samples = []
+        self.outcomes = {}
+
+    def add(self, seconds, outcome):
+        self.samples.append(seconds)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def summary(self, duration):
+        samples = sorted(self.samples)
+        return {
+            "count": len(samples),
+            "throughput": len(samples) / duration if duration else 0.0,
+            "p50": percentile(samples, 0.50),
+            "p99": percentile(samples, 0.99),
+            "max": samples[-1] if samples else None,
+            "outcomes": self.outcomes,
+        }
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of sorted samples (None if empty)"""
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def http_worker(client, index, operations, folders, deadline, stats):
+    """Send requests round-robin over the HTTP operations until the deadline"""
+    sent = 0
+    while time.perf_counter() < deadline:
+        operation = operations[(index + sent) % len(operations)]
+        folder = folders[(index * 7 + sent) % len(folders)]
+        if operation == "create_and_open_folder":
+            path = f"output/LoadNew/w{index}/{sent}"
+        else:
+            path = f"output/{folder}"
+        started = time.perf_counter()
+        try:
+            async with client.post(f"/flowpath/{operation}", json={"path": path}) as response:
+                await response.read()
+                outcome = str(response.status)
+        except Exception as e:
+            outcome = type(e).__name__
+        stats[operation].add(time.perf_counter() - started, outcome)
+        sent += 1
+
+
+def build_path_worker(package, index, folders, deadline, stats):
+    """Call FlowPath.build_path (as ComfyUI's executor would) until the deadline"""
+    node = package.FlowPath()
+    calls = 0
+    while time.perf_counter() < deadline:
+        widget_data = widget_data_for(folders[(index * 13 + calls) % len(folders)])
+        started = time.perf_counter()
+        try:
+            node.build_path(widget_data, None, None)
+            outcome = "ok"
+        except Exception as e:
+            outcome = type(e).__name__
+        stats.add(time.perf_counter() - started, outcome)
+        calls += 1
+
+
+async def lag_monitor(deadline, lags):
+    """Record how late a short sleep on the event loop wakes up"""
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - started - LAG_PROBE_INTERVAL))
+
+
+async def run_load(package, folders, args):
+    """
+    Serve the registered routes and run every load generator for args.duration.
+
+    Returns:
+        tuple: (stats per operation, event loop lags, measured duration)
+    """
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    app = web.Application()
+    app.add_routes(package.PromptServer.instance.routes)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+
+    operations = args.operations
+    http_operations = [op for op in operations if op != "build_path"]
+    stats = {op: Stats() for op in operations}
+    lags = []
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = []
+    if "build_path" in operations:
+        threads = [
+            threading.Thread(
+                target=build_path_worker,
+                args=(package, i, folders, deadline, stats["build_path"]),
+                daemon=True,
+            )
+            for i in range(args.build_threads)
+        ]
+        for thread in threads:
+            thread.start()
+
+    tasks = [lag_monitor(deadline, lags)]
+    if http_operations:
+        tasks += [
+            http_worker(client, i, http_operations, folders, deadline, stats)
+            for i in range(args.concurrency)
+        ]
+    try:
+        await asyncio.gather(*tasks)
+        # Joined off the loop so a slow last build_path doesn't block it
+        for thread in threads:
+            await asyncio.to_thread(thread.join)
+    finally:
+        await client.close()
+    return stats, lags, time.perf_counter() - started
+
+
+# --- Reporting ---------------------------------------------------------------
+
+
+def _format_latency(seconds):
+    return "-" if seconds is None else _format_seconds(seconds)
+
+
+def report(stats, lags, duration):
+    """Print the results table and return the JSON results"""
+    results = {op: s.summary(duration) for op, s in stats.items()}
+    lags.sort()
+    loop_lag = {
+        "probes": len(lags),
+        "p50": percentile(lags, 0.50),
+        "p99": percentile(lags, 0.99),
+        "max": lags[-1] if lags else None,
+    }
+
+    _log(f"\n  {'operation':<24} {'count':>8} {'req/s':>9} {'p50':>10} {'p99':>10} {'max':>10}  outcomes")
+    for operation, result in results.items():
+        outcomes = ", ".join(f"{k}: {v}" for k, v in sorted(result["outcomes"].items()))
+        _log(
+            f"  {operation:<24} {result['count']:>8} {result['throughput']:>9.1f} "
+            f"{_format_latency(result['p50']):>10} {_format_latency(result['p99']):>10} "
+            f"{_format_latency(result['max']):>10}  {outcomes}"
+        )
+    _log(
+        f"  {'event loop lag':<24} {loop_lag['probes']:>8} {'':>9} "
+        f"{_format_latency(loop_lag['p50']):>10} {_format_latency(loop_lag['p99']):>10} "
+        f"{_format_latency(loop_lag['max']):>10}"
+    )
+    return {"operations": results, "event_loop_lag": loop_lag}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test FlowPath's routes and build_path")
+    parser.add_argument("--quick", action="store_true", help="Small tree and a 3 s run")
+    parser.add_argument(
+        "--only", default=",".join(OPERATIONS), help=f"Comma-separated operations ({', '.join(OPERATIONS)})"
+    )
+    parser.add_argument("--duration", type=float, help="Seconds of load (default: 10, quick: 3)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent HTTP clients (default: 32)")
+    parser.add_argument("--build-threads", type=int, default=2, help="Threads calling build_path (default: 2)")
+    parser.add_argument("--folders", type=int, help="Synthetic folders (default: 50, quick: 10)")
+    parser.add_argument("--files", type=int, help="Files per synthetic folder (default: 2000, quick: 500)")
+    parser.add_argument(
+        "--launch-ms", type=float, default=5.0, help="Simulated file explorer launch time (default: 5)"
+    )
+    parser.add_argument(
+        "--rate-limit", action="store_true", help="Keep the per-endpoint rate limit (off by default)"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(tempfile.gettempdir(), "flowpath-load"),
+        help="Stub ComfyUI directory; the synthetic tree is kept here between runs",
+    )
+    parser.add_argument("--output", help="Write JSON results to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    args.operations = [op.strip() for op in args.only.split(",") if op.strip()]
+    unknown = set(args.operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"Unknown operation(s): {', '.join(sorted(unknown))}")
+    default_folders, default_files = QUICK_TREE_SIZE if args.quick else TREE_SIZE
+    folder_count = args.folders or default_folders
+    file_count = args.files or default_files
+    if args.duration is None:
+        args.duration = 3.0 if args.quick else 10.0
+
+    try:
+        output_dir = install_stubs(os.path.abspath(args.data_dir))
+    except ImportError:
+        parser.error("aiohttp is required (pip install aiohttp)")
+    folders = ensure_tree(output_dir, folder_count, file_count)
+    # Folders made by create_and_open_folder in earlier runs
+    shutil.rmtree(os.path.join(output_dir, "LoadNew"), ignore_errors=True)
+    package = load_package(args.launch_ms / 1000, args.rate_limit)
+
+    _log(
+        f"load: {', '.join(args.operations)} for {args.duration:g} s, "
+        f"{args.concurrency} HTTP clients, {args.build_threads} build_path threads, "
+        f"{folder_count} x {file_count} files"
+    )
+    stats, lags, duration = asyncio.run(run_load(package, folders, args))
+    results = report(stats, lags, duration)
+
+    output = {
+        "schema": RESULTS_SCHEMA_VERSION,
+        "meta": {
+            "git_revision": _git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "duration": duration,
+            "concurrency": args.concurrency,
+            "build_threads": args.build_threads,
+            "tree": {"folders": folder_count, "files": file_count},
+            "launch_ms": args.launch_ms,
+            "rate_limit": args.rate_limit,
+        },
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        _log(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
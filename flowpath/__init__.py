@@ -0,0 +1,20 @@
+"""
+FlowPath Core
+ComfyUI-independent path resolution engine
+
+    from flowpath import PathResolver
+    resolver = PathResolver("/path/to/output")
+    path, filename = resolver.build_path(widget_data, prompt)
+
+Submodules are imported on first use, so importing the package is cheap.
+"""
+
+__all__ = ["PathResolver", "detect_seed", "insert_counter", "replace_template_vars"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import core
+
+        return getattr(core, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
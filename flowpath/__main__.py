@@ -0,0 +1,7 @@
+"""Entry point for python -m flowpath"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+FlowPath Browse
+Paginated folder listings that never hold a whole directory in memory
+"""
+
+import os
+import re
+import json
+import heapq
+import base64
+import binascii
+
+SORT_KEYS = ("name", "mtime", "counter")
+ORDERS = ("asc", "desc")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Counter sort: last run of digits before the extension ("img_0042.png" -> 42)
+_COUNTER_RE = re.compile(r"(\d+)(?!.*\d)")
+
+
+class BrowseError(ValueError):
+    """Invalid browse request (bad sort, order or cursor)"""
+
+
+def _counter_of(name):
+    """Number used by the counter sort (-1 for names without digits)"""
+    stem = name.rsplit(".", 1)[0] if "." in name else name
+    match = _COUNTER_RE.search(stem)
+    return int(match.group(1)) if match else -1
+
+
+def _sort_key(entry, sort):
+    """
+    Total-order key for one directory entry. The name is always the final
+    tie-breaker, so keys are unique within a folder and usable as a cursor.
+    """
+    if sort == "mtime":
+        try:
+            mtime_ns = entry.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = 0
+        return (mtime_ns, entry.name)
+    if sort == "counter":
+        return (_counter_of(entry.name), entry.name)
+    return (entry.name,)
+
+
+def encode_cursor(sort, order, key):
+    """Opaque continuation token for the entry after key"""
+    raw = json.dumps([sort, order, list(key)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort, order):
+    """
+    Sort key stored in a cursor.
+
+    Raises:
+        BrowseError: If the cursor is malformed or was made for another sort
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, key = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        raise BrowseError("Invalid cursor")
+    if cursor_sort != sort or cursor_order != order:
+        raise BrowseError("Cursor does not match sort/order")
+    # Keys must compare against _sort_key() results
+    expected = (str,) if sort == "name" else (int, str)
+    if not isinstance(key, list) or len(key) != len(expected) or not all(
+        type(value) is kind for value, kind in zip(key, expected)
+    ):
+        raise BrowseError("Invalid cursor")
+    return tuple(key)
+
+
+def browse_folder(full_folder, sort="name", order="asc", cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    List one page of a folder.
+
+    The folder is streamed with os.scandir and only the best `limit`
+    entries after the cursor are kept (bounded heap), so memory stays
+    O(limit) even for folders with millions of entries. Only the returned
+    entries are stat()ed, except for the mtime sort, which needs every
+    entry's mtime.
+
+    Args:
+        full_folder: Absolute folder path
+        sort: "name", "mtime" or "counter"
+        order: "asc" or "desc"
+        cursor: next_cursor from the previous page, or None for the first
+        limit: Entries per page
+
+    Returns:
+        dict: entries (name, type, size, mtime), next_cursor (None on the
+        last page) and total (entries in the folder)
+
+    Raises:
+        BrowseError: Invalid sort, order or cursor
+        OSError: If the folder can't be read
+    """
+    if sort not in SORT_KEYS:
+        raise BrowseError(f"Invalid sort (use one of {', '.join(SORT_KEYS)})")
+    if order not in ORDERS:
+        raise BrowseError("Invalid order (use asc or desc)")
+    after = decode_cursor(cursor, sort, order) if cursor else None
+    descending = order == "desc"
+    select = heapq.nlargest if descending else heapq.nsmallest
+
+    total = 0
+
+    def candidates(entries):
+        nonlocal total
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            total += 1
+            key = _sort_key(entry, sort)
+            if after is not None and (key >= after if descending else key <= after):
+                continue
+            yield key, entry
+
+    with os.scandir(full_folder) as entries:
+        # Fetch one extra entry to know whether another page follows
+        page = select(limit + 1, candidates(entries), key=lambda item: item[0])
+
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    results = []
+    for key, entry in page:
+        try:
+            is_dir = entry.is_dir()
+            stat = entry.stat()
+            size = 0 if is_dir else stat.st_size
+            mtime = stat.st_mtime
+        except OSError:
+            # Removed while listing
+            continue
+        results.append(
+            {
+                "name": entry.name,
+                "type": "dir" if is_dir else "file",
+                "size": size,
+                "mtime": mtime,
+            }
+        )
+
+    return {
+        "entries": results,
+        "next_cursor": encode_cursor(sort, order, page[-1][0]) if has_more and page else None,
+        "total": total,
+    }
@@ -0,0 +1,264 @@
+"""
+FlowPath CLI
+Resolve paths outside ComfyUI, e.g. to precompute render farm destinations
+
+    python -m flowpath resolve --output-dir /renders/output -i jobs.jsonl -o paths.jsonl
+
+Each input line is a JSON object:
+    widget_data: FlowPath widget_data (JSON string or object)
+    prompt: Workflow prompt in API format (optional, for seed detection)
+    unique_id: FlowPath node id in the prompt (optional)
+    seeds / count: Resolve a batch like FlowPath (Batch) (optional)
+    id: Echoed back unchanged (optional)
+
+widget_data may reference a stored preset instead of carrying segments,
+e.g. {"preset": {"id": "Character Art"}, "config": {"name": "Hero"}}
+(needs --presets).
+
+Each output line has id, line, path, filename and full_folder, or
+paths/filenames for batches, or error if the line could not be resolved.
+
+Look up what produced an output (needs FLOWPATH_PROVENANCE=1 while generating):
+
+    python -m flowpath provenance --output-dir /renders/output --file Characters/Hero_0042.png
+    python -m flowpath provenance --output-dir /renders/output --seed 12345
+
+Each matching record is printed as one JSON line, newest first.
+
+Move existing outputs into a changed segment layout (dry run without --execute):
+
+    python -m flowpath migrate --output-dir /renders/output --old old.json --new new.json
+    python -m flowpath migrate --output-dir /renders/output --resume JOB_ID
+
+--old/--new take widget_data as a JSON file or string. The plan and
+checkpoints are kept in .flowpath_migrations/JOB_ID in the output directory.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+from .core import PathResolver
+from .migration import DEFAULT_WORKERS, MigrationError, create_job, get_job
+from .presets import PresetStore
+from .provenance import get_provenance_log
+
+
+def _resolve_entry(resolver, entry, preview):
+    """Resolve one input object into an output object"""
+    if not isinstance(entry, dict):
+        raise ValueError("line is not a JSON object")
+
+    widget_data = entry.get("widget_data", "{}")
+    if not isinstance(widget_data, str):
+        widget_data = json.dumps(widget_data)
+    prompt = entry.get("prompt")
+    unique_id = entry.get("unique_id")
+    if unique_id is not None:
+        unique_id = str(unique_id)
+
+    if "seeds" in entry or "count" in entry:
+        paths, filenames = resolver.build_paths(
+            widget_data,
+            count=int(entry.get("count", 1)),
+            seeds=entry.get("seeds"),
+            prompt=prompt,
+            unique_id=unique_id,
+        )
+        return {"paths": paths, "filenames": filenames}
+
+    if preview:
+        path, filename = resolver.preview_path(widget_data, prompt, unique_id)
+    else:
+        path, filename = resolver.build_path(widget_data, prompt, unique_id)
+    return {
+        "path": path,
+        "filename": filename,
+        "full_folder": resolver.full_folder(path),
+    }
+
+
+def resolve_command(args):
+    """Resolve every line of a JSONL file. Returns the exit code."""
+    presets = PresetStore(args.presets) if args.presets else None
+    resolver = PathResolver(os.path.abspath(args.output_dir), presets=presets)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    started = time.perf_counter()
+    resolved = 0
+    failed = 0
+    try:
+        for line_number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            result = {"line": line_number}
+            try:
+                entry = json.loads(line)
+                if isinstance(entry, dict) and "id" in entry:
+                    result["id"] = entry["id"]
+                result.update(_resolve_entry(resolver, entry, args.preview))
+                resolved += 1
+            except (ValueError, TypeError) as e:
+                result["error"] = str(e)
+                failed += 1
+                if args.fail_fast:
+                    target.write(json.dumps(result) + "\n")
+                    break
+            target.write(json.dumps(result) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Resolved {resolved} entries ({failed} failed) in {elapsed:.2f} s",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+def provenance_command(args):
+    """Print provenance records matching the filters. Returns the exit code."""
+    log = get_provenance_log(os.path.abspath(args.output_dir), force=True)
+    if log is None:
+        print(f"No provenance log in {args.output_dir}", file=sys.stderr)
+        return 1
+
+    records = log.query(
+        path=args.path,
+        file=args.file,
+        seed=args.seed,
+        model=args.model,
+        lora=args.lora,
+        limit=args.limit,
+    )
+    for record in records:
+        print(json.dumps(record))
+    return 0 if records else 1
+
+
+def _widget_data_arg(value):
+    """widget_data given inline or as a JSON file"""
+    if value.lstrip().startswith("{"):
+        return value
+    with open(value, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def migrate_command(args):
+    """Plan (and optionally execute) a migration. Returns the exit code."""
+    presets = PresetStore(args.presets) if args.presets else None
+    resolver = PathResolver(os.path.abspath(args.output_dir), presets=presets)
+    try:
+        if args.resume:
+            job = get_job(resolver, args.resume)
+        else:
+            if not (args.old and args.new):
+                print("--old and --new are required (or --resume)", file=sys.stderr)
+                return 2
+            job = create_job(
+                resolver, _widget_data_arg(args.old), _widget_data_arg(args.new), args.source
+            )
+            result = job.plan()
+            print(
+                f"Planned {result['total']} moves ({result['conflicts']} conflicts), job {job.id}",
+                file=sys.stderr,
+            )
+            if not args.execute:
+                print(json.dumps(result, indent=2))
+                return 0
+
+        # Progress on stderr while the moves run
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(2.0):
+                progress = job.progress()
+                print(
+                    f"{progress['moved'] + progress['skipped']}/{progress['total']} moved, "
+                    f"{progress['failed']} failed",
+                    file=sys.stderr,
+                )
+
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+        try:
+            result = job.run(args.workers)
+        finally:
+            stop.set()
+    except MigrationError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    print(json.dumps(result, indent=2))
+    return 1 if result["failed"] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m flowpath", description="FlowPath path resolution"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    resolve = subparsers.add_parser(
+        "resolve", help="Resolve paths for widget_data/prompt pairs in a JSONL file"
+    )
+    resolve.add_argument(
+        "--output-dir", required=True, help="Output directory paths are relative to"
+    )
+    resolve.add_argument("-i", "--input", default="-", help="Input JSONL file (default: stdin)")
+    resolve.add_argument("-o", "--output", default="-", help="Output JSONL file (default: stdout)")
+    resolve.add_argument(
+        "--preview",
+        action="store_true",
+        help="Don't reserve counters (every line sees the same next {counter})",
+    )
+    resolve.add_argument("--fail-fast", action="store_true", help="Stop at the first bad line")
+    resolve.add_argument(
+        "--presets",
+        help="Preset library (presets.json) for widget_data that references a preset by id",
+    )
+    resolve.set_defaults(handler=resolve_command)
+
+    provenance = subparsers.add_parser(
+        "provenance", help="Find the seed/model/LoRAs behind output paths"
+    )
+    provenance.add_argument(
+        "--output-dir", required=True, help="Output directory holding the provenance log"
+    )
+    provenance.add_argument("--file", help="Saved file (relative to the output dir)")
+    provenance.add_argument("--path", help="Folder (relative to the output dir, with subfolders)")
+    provenance.add_argument("--seed", help="Exact seed")
+    provenance.add_argument("--model", help="Exact model name")
+    provenance.add_argument("--lora", help="LoRA name (substring)")
+    provenance.add_argument("--limit", type=int, default=100, help="Maximum records (default: 100)")
+    provenance.set_defaults(handler=provenance_command)
+
+    migrate = subparsers.add_parser(
+        "migrate", help="Move existing outputs into a changed segment layout"
+    )
+    migrate.add_argument(
+        "--output-dir", required=True, help="Output directory paths are relative to"
+    )
+    migrate.add_argument("--old", help="widget_data of the current layout (JSON file or string)")
+    migrate.add_argument("--new", help="widget_data of the new layout (JSON file or string)")
+    migrate.add_argument(
+        "--source",
+        help="Folder to scan for files missing from the provenance log (relative to the output dir)",
+    )
+    migrate.add_argument("--execute", action="store_true", help="Move the files (default: dry run)")
+    migrate.add_argument("--resume", metavar="JOB_ID", help="Execute or resume a planned job")
+    migrate.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="Parallel renames (default: 8)"
+    )
+    migrate.add_argument("--presets", help="Preset library for widget_data that references a preset")
+    migrate.set_defaults(handler=migrate_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,674 @@
+"""
+FlowPath Core
+Path and filename resolution without ComfyUI - the output directory is injected
+"""
+
+import os
+import re
+import hashlib
+import threading
+from datetime import datetime
+
+from .counter_index import (
+    COUNTER_MODE_MAX,
+    COUNTER_MODE_MONOTONIC,
+    DEFAULT_COUNTER_MODE,
+    counter_index,
+    normalize_counter_mode,
+)
+from .counter_reservation import RESERVATIONS_ENABLED, reserve_counter
+from .counter_store import get_counter_store
+from .execution_context import get_execution_context
+from .metrics import StageTimer
+from .path_plan import get_path_plan
+from .prompt_analyzer import analyze_prompt
+from .provenance import get_provenance_log
+from .sanitize import fit_path_length, is_inside, sanitize_component, sanitize_filename
+from .sharding import shard_index
+from .templates import compile_template, format_date
+
+# Sharded counters are read from two folders and bumped in a third. One lock
+# per stripe of base folders, so a slow folder only holds up its own stripe.
+SHARD_LOCK_STRIPES = 16
+_shard_locks = [threading.Lock() for _ in range(SHARD_LOCK_STRIPES)]
+
+
+class PathResolver:
+    """
+    Resolves FlowPath widget_data (segments + config) into a folder path and
+    filename relative to one output directory.
+
+    Plans, templates, prompt analyses and counter state are cached per
+    process and shared by all resolvers.
+    """
+
+    def __init__(self, output_dir, presets=None):
+        """
+        Args:
+            output_dir: Directory paths are relative to (ComfyUI's output dir)
+            presets: PresetStore for widget_data that references a preset
+                     by id instead of carrying its segments (optional)
+        """
+        self.output_dir = output_dir
+        self.presets = presets
+
+        # Opt-in persistent counters (FLOWPATH_COUNTER_STORE=1), always on
+        # for the strictly-monotonic-persisted counter mode
+        self.attach_counter_store(force=DEFAULT_COUNTER_MODE == COUNTER_MODE_MONOTONIC)
+
+        # Opt-in provenance log of every built path (FLOWPATH_PROVENANCE=1)
+        self.provenance = get_provenance_log(output_dir)
+
+    def build_path(self, widget_data="{}", prompt=None, unique_id=None):
+        """
+        Build path and filename from widget data (segments + config)
+
+        Args:
+            widget_data: JSON string from frontend widget
+            prompt: Workflow prompt data (for dynamic seed detection)
+            unique_id: FlowPath node id (to find the sampler feeding its branch)
+
+        Returns:
+            tuple: (path_string, filename_string)
+        """
+        return self.resolve(widget_data, prompt, unique_id, reserve=True)
+
+    def preview_path(self, widget_data="{}", prompt=None, unique_id=None):
+        """
+        Resolve path and filename exactly like build_path, but without
+        consuming a {counter} value. Used by the live preview endpoint.
+
+        Returns:
+            tuple: (path_string, filename_string)
+        """
+        return self.resolve(widget_data, prompt, unique_id, reserve=False)
+
+    def resolve(self, widget_data, prompt, unique_id, reserve):
+        """Shared implementation of build_path and preview_path"""
+        timer = StageTimer("build" if reserve else "preview")
+        files_scanned = counter_index.scan_stats["files_scanned"]
+
+        # Parsed and precompiled once per distinct widget_data
+        plan = get_path_plan(widget_data, sanitize_component, self.presets)
+        timer.mark("parse")
+        if plan is None:
+            # Invalid JSON, return empty path and filename
+            timer.finish()
+            return ("", "")
+
+        # Per-run copy so the cached plan config is never modified
+        config = dict(plan.config)
+
+        # One timestamp for the whole call so date segments and templates agree
+        now = self.start_run(prompt, timer) if reserve else datetime.now()
+
+        # DYNAMIC SEED DETECTION: Override seed from config with current workflow seed
+        self.apply_detected_seed(plan, config, prompt, unique_id)
+        timer.mark("seed")
+
+        final_path = plan.build_folder(config, now)
+        timer.mark("segments")
+
+        next_counter = None
+        if plan.filename_template is not None:
+            # Process FlowPath template variables (Image Saver % vars pass through)
+            final_filename = plan.render_filename(config, now)
+            timer.mark("template")
+
+            # Shorten the folder now instead of letting the save node fail later
+            final_path = fit_path_length(final_path, final_filename, self.output_dir)
+
+            # Handle {counter} specially - needs to scan folder for existing files
+            uses_counter = "{counter}" in final_filename.lower()
+            mode = counter_mode(config)
+            if plan.shard is not None:
+                # Bucket subfolder; the counter continues across buckets
+                pattern = final_filename if uses_counter else None
+                folders, next_counter = self.shard_folders(
+                    plan, final_path, pattern, now, reserve=reserve, mode=mode
+                )
+                final_path = folders[0]
+            elif uses_counter:
+                # Calculate next counter (cached index, rescans only when needed)
+                next_counter = self.next_counter(
+                    final_path, final_filename, reserve=reserve, mode=mode
+                )
+
+            if uses_counter:
+                # Get padding setting (default 4 digits = 0001)
+                counter_padding = config.get("counter_padding", 4)
+
+                # Format with zero-padding and insert
+                final_filename = insert_counter(
+                    final_filename, next_counter, counter_padding
+                )
+
+            # Sanitize but preserve % variables for Image Saver
+            final_filename = sanitize_filename(final_filename)
+        else:
+            final_filename = ""
+            final_path = fit_path_length(final_path, "", self.output_dir)
+            if plan.shard is not None:
+                folders, _ = self.shard_folders(plan, final_path, None, now, reserve=reserve)
+                final_path = folders[0]
+        timer.mark("counter")
+
+        if reserve and self.provenance is not None:
+            self.record_provenance(
+                plan, config, final_path, final_filename, next_counter, prompt, unique_id
+            )
+
+        files_scanned = counter_index.scan_stats["files_scanned"] - files_scanned
+        timer.finish(f"path={final_path!r} files_scanned={files_scanned}")
+        return (final_path, final_filename)
+
+    def output_location(self, widget_data="{}", prompt=None, unique_id=None):
+        """
+        Folder the node's files are saved in, and the filename prefix that
+        identifies them there (SI mode only - Save Image appends its own
+        counter to the prefix). Doesn't consume a {counter} value.
+
+        Returns:
+            tuple: (folder relative to the output dir, prefix or None)
+        """
+        path, _ = self.preview_path(widget_data, prompt, unique_id)
+        plan = get_path_plan(widget_data, sanitize_component, self.presets)
+        if plan is not None and plan.path_is_prefix:
+            folder, prefix = os.path.split(path)
+            return folder, prefix
+        return path, None
+
+    def build_paths(self, widget_data="{}", count=1, seeds=None, prompt=None, unique_id=None):
+        """
+        Build a list of paths and filenames (one per batch item or seed).
+        All {counter} values are reserved with one scan per folder.
+
+        Args:
+            widget_data: JSON string from frontend widget
+            count: Number of items when no seeds are given
+            seeds: Optional list of seeds, one item per seed
+            prompt: Workflow prompt data (for dynamic seed detection)
+            unique_id: FlowPath node id
+
+        Returns:
+            tuple: (list of path strings, list of filename strings)
+        """
+        seeds = [str(seed) for seed in seeds] if seeds else None
+        count = len(seeds) if seeds else max(1, count)
+        timer = StageTimer("batch")
+        files_scanned = counter_index.scan_stats["files_scanned"]
+
+        plan = get_path_plan(widget_data, sanitize_component, self.presets)
+        timer.mark("parse")
+        if plan is None:
+            # Invalid JSON, return empty paths and filenames
+            timer.finish()
+            return ([""] * count, [""] * count)
+
+        base_config = dict(plan.config)
+        now = self.start_run(prompt, timer)
+        if seeds is None:
+            self.apply_detected_seed(plan, base_config, prompt, unique_id)
+        timer.mark("seed")
+
+        # Resolve every item first (seed sweeps may target different folders)
+        items = []
+        configs = []
+        for index in range(count):
+            config = base_config
+            if seeds is not None:
+                config = dict(base_config)
+                config["seed"] = seeds[index]
+            configs.append(config)
+            final_path = plan.build_folder(config, now)
+            final_filename = (
+                plan.render_filename(config, now)
+                if plan.filename_template is not None
+                else None
+            )
+            final_path = fit_path_length(final_path, final_filename or "", self.output_dir)
+            items.append((final_path, final_filename))
+        # Folder and filename templates of all items
+        timer.mark("segments")
+
+        # Reserve consecutive counters per (folder, pattern) with one scan each
+        counter_padding = base_config.get("counter_padding", 4)
+        mode = counter_mode(base_config)
+        groups = {}
+        for index, (final_path, final_filename) in enumerate(items):
+            if plan.shard is not None or (
+                final_filename and "{counter}" in final_filename.lower()
+            ):
+                groups.setdefault((final_path, final_filename), []).append(index)
+
+        counters = {}
+        folders = {}
+        for (final_path, final_filename), indices in groups.items():
+            if plan.shard is not None:
+                # Items of one group may land in different buckets
+                pattern = None
+                if final_filename and "{counter}" in final_filename.lower():
+                    pattern = final_filename
+                group_folders, first_counter = self.shard_folders(
+                    plan, final_path, pattern, now, count=len(indices), mode=mode
+                )
+                for index, folder in zip(indices, group_folders):
+                    folders[index] = folder
+                if first_counter is None:
+                    continue
+            else:
+                first_counter = self.next_counter(
+                    final_path, final_filename, count=len(indices), mode=mode
+                )
+            for offset, index in enumerate(indices):
+                counters[index] = first_counter + offset
+
+        paths = []
+        filenames = []
+        for index, (final_path, final_filename) in enumerate(items):
+            paths.append(folders.get(index, final_path))
+            if final_filename is None:
+                filenames.append("")
+                continue
+            if index in counters:
+                final_filename = insert_counter(
+                    final_filename, counters[index], counter_padding
+                )
+            # Sanitize but preserve % variables for Image Saver
+            filenames.append(sanitize_filename(final_filename))
+        timer.mark("counter")
+
+        if self.provenance is not None:
+            for index in range(count):
+                self.record_provenance(
+                    plan, configs[index], paths[index], filenames[index],
+                    counters.get(index), prompt, unique_id,
+                )
+
+        files_scanned = counter_index.scan_stats["files_scanned"] - files_scanned
+        timer.finish(f"items={count} files_scanned={files_scanned}")
+        return (paths, filenames)
+
+    def start_run(self, prompt, timer=None):
+        """
+        Join the execution context of a prompt.
+
+        The first FlowPath node of a run scans the counter folders of all
+        FlowPath nodes in the prompt concurrently; every node of the run
+        shares the context's timestamp.
+
+        Args:
+            prompt: Workflow prompt data
+            timer: StageTimer to record the prefetch on
+
+        Returns:
+            datetime: Timestamp snapshot for this run
+        """
+        context = get_execution_context(prompt)
+        if context is None:
+            return datetime.now()
+        context.prefetch(self.output_dir, lambda: self.counter_targets(context))
+        if timer is not None:
+            timer.mark("prefetch")
+        return context.now
+
+    def counter_targets(self, context):
+        """
+        Counter folders and patterns of all FlowPath nodes in a prompt.
+
+        Args:
+            context: ExecutionContext of the prompt
+
+        Returns:
+            set: (full_folder, filename_pattern, counter mode) tuples
+        """
+        targets = set()
+        for node_id, widget_data in context.flowpath_nodes():
+            plan = get_path_plan(widget_data, sanitize_component, self.presets)
+            # Sharded plans pick their folder from the shard index
+            if plan is None or not plan.uses_counter or plan.shard is not None:
+                continue
+            config = dict(plan.config)
+            self.apply_detected_seed(plan, config, context.prompt, node_id)
+            folder = plan.build_folder(config, context.now)
+            filename = plan.render_filename(config, context.now)
+            folder = fit_path_length(folder, filename, self.output_dir)
+            targets.add((self.full_folder(folder), filename, counter_mode(config)))
+        return targets
+
+    def fingerprint(self, widget_data, prompt, unique_id=None):
+        """
+        Stable hash of everything the resolved path depends on.
+
+        Covers the path plan, the detected seed, the date at the configured
+        format's granularity and, only when {counter} is used, the counter
+        index state. Shard segments add the active bucket and its counter.
+        Workflows without a counter or shard get full cache reuse.
+
+        Args:
+            widget_data: JSON string from frontend widget
+            prompt: Workflow prompt data
+            unique_id: FlowPath node id
+
+        Returns:
+            str or float: Fingerprint, or NaN if it can't be determined
+        """
+        plan = get_path_plan(widget_data, sanitize_component, self.presets)
+        if plan is None:
+            return "invalid"
+
+        config = dict(plan.config)
+        parts = [plan.key]
+
+        if plan.uses_seed:
+            if not prompt:
+                # Seed lives on another node and isn't visible here
+                return float("nan")
+            self.apply_detected_seed(plan, config, prompt, unique_id)
+            parts.append(str(config.get("seed", "")))
+
+        now = datetime.now()
+        if plan.uses_date:
+            parts.append(format_date(now, config))
+            parts.append(now.strftime("%Y-%m-%d"))
+
+        if plan.shard is not None:
+            # Active bucket (hour buckets change without a date segment) and
+            # the counter that continues across buckets
+            folder = plan.build_folder(config, now)
+            pattern = None
+            if plan.uses_counter:
+                pattern = plan.render_filename(config, now)
+            folders, next_counter = self.shard_folders(
+                plan, folder, pattern, now, reserve=False, mode=counter_mode(config)
+            )
+            parts.append(folders[0])
+            parts.append(str(next_counter))
+        elif plan.uses_counter:
+            folder = plan.build_folder(config, now)
+            filename = plan.render_filename(config, now)
+            next_counter = counter_index.next_counter(
+                self.full_folder(folder), filename, reserve=False, mode=counter_mode(config)
+            )
+            parts.append(str(next_counter))
+
+        return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def full_folder(self, folder_path):
+        """Absolute folder for a path relative to the output dir"""
+        return os.path.join(self.output_dir, folder_path) if folder_path else self.output_dir
+
+    def next_counter(self, folder_path, filename_pattern, count=1, reserve=True, mode=None):
+        """
+        Find the next available counter number for the output folder.
+        Uses the shared counter index, so the folder is only scanned when needed.
+
+        Args:
+            folder_path: The folder to scan (relative to the output dir)
+            filename_pattern: Filename with {counter} placeholder
+            count: Number of consecutive counters to reserve (batches)
+            reserve: False to peek without consuming a counter (previews)
+            mode: Counter mode (default: FLOWPATH_COUNTER_MODE)
+
+        Returns:
+            int: Next available counter number (first of the range)
+        """
+        # Build full path to the output folder
+        full_folder = self.full_folder(folder_path)
+
+        if mode == COUNTER_MODE_MONOTONIC and counter_index.store is None:
+            # The high-water mark has to survive restarts
+            self.attach_counter_store(force=True)
+
+        # Cached per (folder, pattern) - only rescans when the folder changed
+        next_counter = counter_index.next_counter(
+            full_folder, filename_pattern, reserve=reserve, count=count, mode=mode
+        )
+
+        # Shared output volumes: claim the counter so other instances skip it
+        if reserve and RESERVATIONS_ENABLED:
+            reserved = reserve_counter(
+                full_folder, filename_pattern, next_counter, count=count
+            )
+            if reserved != next_counter:
+                counter_index.bump(full_folder, filename_pattern, reserved + count - 1, count)
+            next_counter = reserved
+
+        return next_counter
+
+    def shard_folders(self, plan, path, pattern, now, count=1, reserve=True, mode=None):
+        """
+        Add the bucket subfolder of a shard segment and get the counters.
+
+        Buckets are only used once the base folder holds plan.shard.threshold
+        files. Counters stay monotonic across buckets: the next value follows
+        the files saved before sharding and the newest bucket, so only that
+        bucket is ever scanned.
+
+        Args:
+            plan: PathPlan with a shard spec
+            path: Resolved path (relative to the output dir)
+            pattern: Filename with {counter}, or None if no counter is used
+            now: datetime snapshot for this run (hour buckets)
+            count: Number of paths (batches)
+            reserve: False to peek without consuming counters (previews)
+            mode: Counter mode (gaps are never filled across buckets)
+
+        Returns:
+            tuple: (list of count paths, first counter or None)
+        """
+        spec = plan.shard
+        if mode != COUNTER_MODE_MONOTONIC:
+            mode = COUNTER_MODE_MAX
+        # SI mode: the last part is the Save Image filename prefix, not a folder
+        prefix = None
+        base_path = path
+        if plan.path_is_prefix:
+            base_path, prefix = os.path.split(path)
+
+        def with_bucket(bucket):
+            parts = [p for p in (base_path, bucket, prefix) if p]
+            return os.path.join(*parts)
+
+        full_base = self.full_folder(base_path)
+
+        # Revalidate the base folder before taking the lock; inside it, the
+        # cached state (with paths handed out meanwhile) decides
+        shard_index.state(full_base, spec.threshold)
+        with _shard_locks[hash(os.path.normcase(full_base)) % SHARD_LOCK_STRIPES]:
+            active, latest_bucket = shard_index.state(full_base, spec.threshold, refresh=False)
+            if not active:
+                first = None
+                if pattern is not None:
+                    first = self.next_counter(
+                        base_path, pattern, count=count, reserve=reserve, mode=mode
+                    )
+                if reserve:
+                    shard_index.note_issued(full_base, None, count)
+                return [path] * count, first
+
+            first = None
+            if pattern is not None:
+                first = counter_index.next_counter(full_base, pattern, reserve=False, mode=mode)
+                if latest_bucket is not None:
+                    first = max(
+                        first,
+                        counter_index.next_counter(
+                            os.path.join(full_base, latest_bucket), pattern, reserve=False,
+                            mode=mode,
+                        ),
+                    )
+                if reserve and RESERVATIONS_ENABLED:
+                    first = reserve_counter(full_base, pattern, first, count=count)
+
+            paths = []
+            for offset in range(count):
+                counter = None if first is None else first + offset
+                bucket = spec.bucket_for(counter, now)
+                paths.append(with_bucket(bucket))
+                if not reserve:
+                    continue
+                if counter is not None:
+                    full_bucket = os.path.join(full_base, bucket)
+                    # Creates the index entry for a new bucket without scanning
+                    counter_index.next_counter(full_bucket, pattern, reserve=False, mode=mode)
+                    counter_index.bump(full_bucket, pattern, counter)
+                shard_index.note_issued(full_base, bucket)
+
+        return paths, first
+
+    def record_provenance(self, plan, config, path, filename, counter, prompt, unique_id):
+        """
+        Add a built path and its generation metadata to the provenance log.
+
+        Args:
+            plan: PathPlan the path was built from
+            config: Config the path was built with (detected seed applied)
+            path: Final path
+            filename: Final filename ("" without a filename template)
+            counter: {counter} value or None
+            prompt: Workflow prompt data
+            unique_id: FlowPath node id
+        """
+        seed = config.get("seed")
+        if not plan.uses_seed:
+            # Not applied to the config, but still worth recording
+            seed = detect_seed(prompt, unique_id) if prompt else None
+            if seed is None:
+                seed = config.get("seed")
+
+        # What the prompt actually loaded; the widget config (typed or
+        # detected in the browser) only fills in what the prompt lacks
+        context = get_execution_context(prompt)
+        used = {}
+        if context is not None and context.analysis is not None:
+            try:
+                used = context.analysis.metadata_for(unique_id)
+            except Exception:
+                pass  # Detection failed, record the config values
+
+        self.provenance.record(
+            path,
+            filename,
+            plan.path_is_prefix,
+            counter=counter,
+            seed=seed if seed != "" else None,
+            model=used.get("model") or config.get("model_name"),
+            loras=used.get("loras") or config.get("lora_name"),
+            resolution=used.get("resolution") or config.get("resolution"),
+            node_id=unique_id,
+        )
+
+    def attach_counter_store(self, force=False):
+        """Attach the persistent counter store to the shared counter index"""
+        store = get_counter_store(self.output_dir, force=force)
+        if store is not None:
+            counter_index.store = store
+
+    def counter_gaps(self, widget_data="{}", prompt=None, unique_id=None, limit=100):
+        """
+        Free {counter} values below the highest one in a node's folder
+        (numbers of deleted files, reused in fill-first-gap mode).
+
+        Returns:
+            dict or None: path, highest, used, missing and gaps, or None if
+            the node doesn't use {counter} or its widget_data is invalid
+
+        Raises:
+            ValueError: If the folder resolves outside the output directory
+        """
+        plan = get_path_plan(widget_data, sanitize_component, self.presets)
+        if plan is None or not plan.uses_counter or plan.shard is not None:
+            return None
+        config = dict(plan.config)
+        self.apply_detected_seed(plan, config, prompt, unique_id)
+        now = datetime.now()
+        folder = plan.build_folder(config, now)
+        filename = plan.render_filename(config, now)
+        folder = fit_path_length(folder, filename, self.output_dir)
+        full_folder = self.full_folder(folder)
+        if not is_inside(full_folder, self.output_dir):
+            # Never list file numbers of folders outside the output dir
+            raise ValueError(f"Folder is outside the output directory: {folder}")
+        result = counter_index.gaps(full_folder, filename, limit)
+        if result is not None:
+            result["path"] = folder
+        return result
+
+    def apply_detected_seed(self, plan, config, prompt, unique_id=None):
+        """Override config["seed"] with the workflow seed if the plan uses it"""
+        if not plan.uses_seed:
+            return
+        try:
+            dynamic_seed = detect_seed(prompt, unique_id)
+            if dynamic_seed is not None:
+                config["seed"] = str(dynamic_seed)
+        except Exception:
+            pass  # Seed detection failed, use config seed if available
+
+
+def detect_seed(prompt, node_id=None):
+    """
+    Detect seed from workflow prompt (dynamic detection at execution time)
+
+    Follows links from the nodes consuming the FlowPath node's outputs
+    back to the sampler feeding them. Falls back to the workflow-wide
+    seed (Seed Generator > noise generator > sampler) if that fails.
+
+    Args:
+        prompt: Workflow prompt dictionary
+        node_id: FlowPath node id (optional)
+
+    Returns:
+        int or None: Detected seed value
+    """
+    try:
+        # Memoized per prompt, shared by all FlowPath nodes in the run
+        analysis = analyze_prompt(prompt)
+        if analysis is not None:
+            return analysis.seed_for(node_id)
+    except Exception:
+        pass
+
+    return None
+
+
+def counter_mode(config):
+    """Counter mode of a node (config counter_mode, else FLOWPATH_COUNTER_MODE)"""
+    return normalize_counter_mode(config.get("counter_mode")) or DEFAULT_COUNTER_MODE
+
+
+def insert_counter(filename, counter, padding):
+    """Replace {counter} and {COUNTER} with the zero-padded counter value"""
+    counter_str = str(counter).zfill(padding)
+    return re.sub(r"\{counter\}", counter_str, filename, flags=re.IGNORECASE)
+
+
+def replace_template_vars(template, config, now=None):
+    """
+    Replace template variables in a string with actual values.
+
+    Supported variables:
+    - {label}, {output}
+    - {filetype}, {file_type}
+    - {category}, {name}, {content_rating}, {rating}
+    - {project}, {series}, {resolution}, {res}
+    - {model}, {lora}, {seed}
+    - {date}, {year}, {month}, {day}
+    - {sfw}, {nsfw}
+
+    Templates are compiled once and cached; only the variables the
+    template references are resolved.
+
+    Args:
+        template: String containing template variables like {model}
+        config: Configuration dictionary with values
+        now: datetime snapshot shared by one build_path call (default: now)
+
+    Returns:
+        str: Template with variables replaced
+    """
+    if not template or not isinstance(template, str):
+        return template
+
+    return compile_template(template).render(config, now)
@@ -0,0 +1,508 @@
+"""
+FlowPath Counter Index
+In-memory cache of the used {counter} values per (folder, filename pattern)
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from .counter_bitmap import CounterBitmap
+from .metrics import SCAN_FILES
+
+# Counter modes:
+# max+1: one past the highest counter in the folder (default)
+# fill-first-gap: lowest free counter, reusing numbers of deleted files
+# strictly-monotonic-persisted: never reuse a number, even after the files
+#   with the highest counters are deleted or ComfyUI restarts (kept in the
+#   counter store)
+COUNTER_MODE_MAX = "max+1"
+COUNTER_MODE_FILL = "fill-first-gap"
+COUNTER_MODE_MONOTONIC = "strictly-monotonic-persisted"
+
+_COUNTER_MODE_ALIASES = {
+    "max": COUNTER_MODE_MAX,
+    "fill": COUNTER_MODE_FILL,
+    "monotonic": COUNTER_MODE_MONOTONIC,
+}
+
+
+def normalize_counter_mode(mode):
+    """
+    Canonical counter mode name.
+
+    Args:
+        mode: Mode name or short alias (max, fill, monotonic), or None
+
+    Returns:
+        str or None: Mode, or None if mode is empty or unknown
+    """
+    if not isinstance(mode, str):
+        return None
+    mode = mode.strip().lower()
+    mode = _COUNTER_MODE_ALIASES.get(mode, mode)
+    if mode in (COUNTER_MODE_MAX, COUNTER_MODE_FILL, COUNTER_MODE_MONOTONIC):
+        return mode
+    return None
+
+
+# Default for nodes without a counter_mode config value
+DEFAULT_COUNTER_MODE = (
+    normalize_counter_mode(os.environ.get("FLOWPATH_COUNTER_MODE")) or COUNTER_MODE_MAX
+)
+
+# Maximum number of (folder, pattern) entries kept in memory.
+# Least recently used folders are evicted first.
+COUNTER_INDEX_MAX_ENTRIES = 256
+
+# How long (seconds) issued counters survive a rescan of their folder. The
+# save node may not have written the file for a counter yet when the folder
+# changes (e.g. the first image of a batch), so rescans keep recently issued
+# counters. Older counters whose file never appeared are forgotten.
+COUNTER_INDEX_TRUST_SECONDS = 30.0
+
+# Issued counters per entry whose file hasn't been seen yet (newest kept).
+# A folder change is explained by these files appearing.
+COUNTER_INDEX_UNVERIFIED_LIMIT = 64
+
+
+@lru_cache(maxsize=256)
+def compile_counter_pattern(filename_pattern):
+    """
+    Compile a filename pattern containing {counter} into a regex.
+
+    Args:
+        filename_pattern: Filename with {counter} placeholder
+
+    Returns:
+        re.Pattern or None: Compiled pattern with the counter as group 1,
+        or None if the pattern has no {counter} placeholder
+    """
+    if "{counter}" not in filename_pattern.lower():
+        return None
+
+    # Create regex pattern: escape special chars, then replace {counter} with digit capture
+    regex_pattern = re.escape(filename_pattern)
+    # Handle both {counter} and {COUNTER} - use string replace to avoid backreference issues
+    regex_pattern = regex_pattern.replace(r"\{counter\}", r"(\d+)")
+    regex_pattern = regex_pattern.replace(r"\{COUNTER\}", r"(\d+)")
+    # Replace Image Saver %variables with wildcards (they get processed by Image Saver)
+    # %seed, %time, %date, %model, %width, %height, %counter, etc.
+    # Note: % is NOT escaped by re.escape, so match literal %
+    # Use [^/\\]* to match any characters except path separators (allows empty or any value)
+    regex_pattern = re.sub(r"%\w+", lambda m: r"[^/\\]*", regex_pattern)
+    # Match optional Image Saver suffix (_00, _01, etc.) and any extension
+    regex_pattern = regex_pattern + r"(_\d+)?\.[a-zA-Z0-9]+"
+    regex_pattern = "^" + regex_pattern + "$"
+
+    return re.compile(regex_pattern, re.IGNORECASE)
+
+
+def scan_highest_counter(full_folder, regex, used=None):
+    """
+    Scan a folder once and return the highest counter matched by regex.
+
+    Args:
+        full_folder: Absolute folder path
+        regex: Compiled pattern from compile_counter_pattern()
+        used: CounterBitmap to add every matched counter to (optional)
+
+    Returns:
+        tuple: (highest_counter, entries_scanned, sample) - sample is the
+        name of a file with the highest counter, or None if none matched
+    """
+    highest = 0
+    scanned = 0
+    sample = None
+    with os.scandir(full_folder) as entries:
+        for entry in entries:
+            scanned += 1
+            match = regex.match(entry.name)
+            if match:
+                try:
+                    num = int(match.group(1))
+                    if num > highest:
+                        highest = num
+                        sample = entry.name
+                    if used is not None:
+                        used.add(num)
+                except (ValueError, IndexError):
+                    pass
+    return highest, scanned, sample
+
+
+def counter_filename(regex, sample, counter):
+    """
+    Name a file for counter would have, following a matched sample name
+    (same padding, %variable values, suffix and extension).
+
+    Args:
+        regex: Compiled pattern from compile_counter_pattern()
+        sample: Existing filename matched by regex
+        counter: Counter value
+
+    Returns:
+        str or None: Filename, or None if sample doesn't match
+    """
+    match = regex.match(sample)
+    if match is None:
+        return None
+    start, end = match.span(1)
+    return sample[:start] + str(counter).zfill(end - start) + sample[end:]
+
+
+class _IndexEntry:
+    """Cached counter state for one (folder, pattern) pair"""
+
+    __slots__ = (
+        "highest", "mtime_ns", "scanned_at", "used", "pending", "reserved_at", "sample",
+        "unverified",
+    )
+
+    def __init__(self, highest, mtime_ns, scanned_at, used=None, sample=None):
+        self.highest = highest
+        self.mtime_ns = mtime_ns
+        self.scanned_at = scanned_at
+        # CounterBitmap of every used counter (fill-first-gap mode only)
+        self.used = used
+        # (first, count) ranges issued since reserved_at, kept across rescans
+        # until trust_seconds have passed
+        self.pending = []
+        self.reserved_at = None
+        # Name of a file with the highest counter seen by the last scan
+        self.sample = sample
+        # Issued counters whose file hasn't been seen yet
+        self.unverified = set()
+
+    def reserve(self, first, count, now, trust_seconds):
+        """Record issued counters (lock held)"""
+        if self.reserved_at is None or now - self.reserved_at >= trust_seconds:
+            self.pending = []
+        self.pending.append((first, count))
+        self.reserved_at = now
+
+        last = first + count - 1
+        self.unverified.update(
+            range(max(first, last - COUNTER_INDEX_UNVERIFIED_LIMIT + 1), last + 1)
+        )
+        if len(self.unverified) > COUNTER_INDEX_UNVERIFIED_LIMIT:
+            self.unverified = set(sorted(self.unverified)[-COUNTER_INDEX_UNVERIFIED_LIMIT:])
+
+
+class CounterIndex:
+    """
+    Per-(folder, filename pattern) index of the highest used counter.
+
+    The folder is scanned once, then revalidated with a single stat() call:
+    - Folder mtime unchanged: the cached value is current
+    - Folder mtime changed: delta check. The change is explained if the file
+      of a counter this index issued now exists and the next counter's file
+      doesn't, checked with a few stat() calls on names derived from a file
+      seen by the last scan. The save after each run is the common case.
+    - Otherwise (or in fill-first-gap mode, which needs every deleted
+      number): the folder is rescanned. Counters issued within the last
+      trust_seconds are kept across the rescan, since their files may not
+      be written yet.
+
+    Issued counters are bumped into the index so the next lookup is O(1).
+    A counter is consumed when it is issued, so a run that never saves its
+    file (cancelled or failed) leaves that number unused. Entries used in
+    fill-first-gap mode also keep a bitmap of every used counter, built by
+    the same scan.
+    """
+
+    def __init__(
+        self,
+        max_entries=COUNTER_INDEX_MAX_ENTRIES,
+        trust_seconds=COUNTER_INDEX_TRUST_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.trust_seconds = trust_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Optional persistent copy (counter_store.CounterStore)
+        self.store = None
+        # Totals for the metrics endpoint
+        self.scan_stats = {
+            "lookups": 0, "scans": 0, "files_scanned": 0, "store_hits": 0, "delta_checks": 0,
+        }
+
+    def next_counter(self, full_folder, filename_pattern, reserve=True, count=1, mode=None):
+        """
+        Get the next available counter for a folder and filename pattern.
+
+        Args:
+            full_folder: Absolute folder path
+            filename_pattern: Filename with {counter} placeholder
+            reserve: Bump the index so the next call returns a higher value.
+                     Use False for previews that must not consume a counter.
+            count: Number of consecutive counters to reserve (batches)
+            mode: Counter mode (default: DEFAULT_COUNTER_MODE)
+
+        Returns:
+            int: Next available counter number (first of the range)
+        """
+        regex = compile_counter_pattern(filename_pattern)
+        if regex is None:
+            return 1
+        mode = mode or DEFAULT_COUNTER_MODE
+        needs_bitmap = mode == COUNTER_MODE_FILL
+
+        key = (os.path.normcase(os.path.abspath(full_folder)), filename_pattern)
+
+        # Outside the lock, so a slow folder doesn't hold up lookups of others
+        try:
+            mtime_ns = os.stat(full_folder).st_mtime_ns
+        except OSError:
+            # Folder doesn't exist (yet) - counters start at 1, but issued
+            # values are still tracked until the save node creates it
+            mtime_ns = None
+
+        with self._lock:
+            now = time.monotonic()
+            stale = self._entries.get(key)
+            self.scan_stats["lookups"] += 1
+
+            # Issued counters the rescan must not hand out again
+            carried = []
+            issued = 0
+            delta = None
+            if stale is not None:
+                if stale.mtime_ns == mtime_ns:
+                    if stale.used is not None or not needs_bitmap:
+                        self._entries.move_to_end(key)
+                        return self._issue(key, stale, reserve, count, mode, now)
+                    # First fill-first-gap lookup of a current entry: rescan for
+                    # the bitmap, keeping everything the entry issued
+                    carried = stale.pending
+                    issued = stale.highest
+                elif mtime_ns is not None:
+                    if stale.sample is not None and stale.unverified and not needs_bitmap:
+                        delta = (stale.mtime_ns, sorted(stale.unverified), stale.highest + 1)
+                    if stale.reserved_at is not None:
+                        if now - stale.reserved_at < self.trust_seconds:
+                            # Files of recently issued counters may not be written yet
+                            carried = stale.pending
+                            issued = max(first + n - 1 for first, n in carried)
+            store = self.store
+
+        if delta is not None:
+            known_mtime, unverified, next_value = delta
+            found = self._delta_check(full_folder, regex, stale.sample, unverified, next_value)
+            if found:
+                with self._lock:
+                    if self._entries.get(key) is stale and stale.mtime_ns == known_mtime:
+                        self.scan_stats["delta_checks"] += 1
+                        stale.mtime_ns = mtime_ns
+                        stale.unverified.difference_update(found)
+                        self._entries.move_to_end(key)
+                        self._persist(key, stale)
+                        return self._issue(key, stale, reserve, count, mode, now)
+
+        # Scan without holding the lock so different folders can be scanned
+        # concurrently (execution context prefetch)
+        highest = 0
+        scanned = None
+        stored = None
+        sample = None
+        used = CounterBitmap() if needs_bitmap else None
+        if stale is None and store is not None and mtime_ns is not None and not needs_bitmap:
+            # Value persisted before a restart
+            stored = self._stored_state(store, key, regex, full_folder, mtime_ns)
+        if stored is not None:
+            highest, sample = stored
+        elif mtime_ns is not None:
+            try:
+                highest, scanned, sample = scan_highest_counter(full_folder, regex, used)
+            except OSError:
+                return 1
+        if used is not None:
+            for first, n in carried:
+                used.add_range(first, n)
+        highest = max(highest, issued)
+        if mode == COUNTER_MODE_MONOTONIC and store is not None:
+            # Numbers of deleted files are never handed out again
+            highest = max(highest, store.high_water(key[0], filename_pattern))
+
+        with self._lock:
+            if stored is not None:
+                self.scan_stats["store_hits"] += 1
+            if scanned is not None:
+                self.scan_stats["scans"] += 1
+                self.scan_stats["files_scanned"] += scanned
+                SCAN_FILES.observe(scanned)
+
+            entry = self._entries.get(key)
+            if entry is not None and entry is not stale:
+                # Another thread scanned this folder meanwhile and may already
+                # have issued counters from it
+                if used is not None:
+                    if entry.used is not None:
+                        used.update(entry.used)
+                    else:
+                        used.add_range(highest + 1, max(0, entry.highest - highest))
+                    entry.used = used
+                entry.highest = max(entry.highest, highest)
+                self._entries.move_to_end(key)
+            else:
+                entry = _IndexEntry(highest, mtime_ns, now, used, sample)
+                if carried:
+                    entry.pending = list(carried)
+                    entry.reserved_at = stale.reserved_at
+                if stale is not None:
+                    # Counters above the scan are still waiting for their file
+                    entry.unverified = {n for n in stale.unverified if n > highest}
+                self._entries[key] = entry
+                self._evict()
+                if scanned is not None:
+                    self._persist(key, entry)
+            return self._issue(key, entry, reserve, count, mode, now)
+
+    def _issue(self, key, entry, reserve, count, mode, now):
+        """Next counter of an entry, bumping it unless peeking (lock held)"""
+        if mode == COUNTER_MODE_FILL:
+            next_value = entry.used.first_free(count)
+        else:
+            next_value = entry.highest + 1
+        if reserve:
+            if entry.used is not None:
+                entry.used.add_range(next_value, count)
+            entry.highest = max(entry.highest, next_value + count - 1)
+            entry.reserve(next_value, count, now, self.trust_seconds)
+            self._persist(key, entry)
+        return next_value
+
+    @staticmethod
+    def _delta_check(full_folder, regex, sample, counters, next_value):
+        """
+        Explain a folder change by the files of counters this index issued.
+
+        Args:
+            full_folder: Absolute folder path
+            regex: Compiled pattern from compile_counter_pattern()
+            sample: Filename seen by the last scan
+            counters: Issued counters whose file hasn't been seen yet
+            next_value: Counter the index would issue next
+
+        Returns:
+            set or None: Counters whose file now exists, or None if the change
+            can't be explained (the folder has to be rescanned)
+        """
+        found = set()
+        for counter in counters:
+            name = counter_filename(regex, sample, counter)
+            if name is not None and os.path.lexists(os.path.join(full_folder, name)):
+                found.add(counter)
+        if not found:
+            return None
+        # Someone else saved the number we'd hand out next
+        name = counter_filename(regex, sample, next_value)
+        if name is None or os.path.lexists(os.path.join(full_folder, name)):
+            return None
+        return found
+
+    def gaps(self, full_folder, filename_pattern, limit=100):
+        """
+        Free counters below the highest used one (numbers of deleted files).
+
+        Args:
+            full_folder: Absolute folder path
+            filename_pattern: Filename with {counter} placeholder
+            limit: Maximum number of gaps listed
+
+        Returns:
+            dict: highest, used (count), missing (count) and gaps (lowest
+            first), or None if the pattern has no {counter}
+        """
+        if compile_counter_pattern(filename_pattern) is None:
+            return None
+        # Builds or revalidates the entry's bitmap without consuming a counter
+        self.next_counter(full_folder, filename_pattern, reserve=False, mode=COUNTER_MODE_FILL)
+        key = (os.path.normcase(os.path.abspath(full_folder)), filename_pattern)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.used is None:
+                return {"highest": 0, "used": 0, "missing": 0, "gaps": []}
+            return {
+                "highest": entry.used.highest,
+                "used": len(entry.used),
+                "missing": entry.used.missing_count(),
+                "gaps": entry.used.missing(limit),
+            }
+
+    def _persist(self, key, entry):
+        """Queue an entry for the persistent store, if one is attached (lock held)"""
+        if self.store is not None:
+            self.store.record(key[0], key[1], entry.highest, entry.mtime_ns, entry.sample)
+
+    @staticmethod
+    def _stored_state(store, key, regex, full_folder, mtime_ns):
+        """
+        Persisted (highest, sample) of a folder, if still valid: the folder is
+        unchanged, or no file exists for the counter after the stored one
+        (the last save of a session changes the mtime after the row is written)
+
+        Returns:
+            tuple or None: (highest, sample), or None if the folder must be scanned
+        """
+        row = store.lookup(key[0], key[1])
+        if row is None:
+            return None
+        highest, stored_mtime, sample = row
+        if stored_mtime == mtime_ns:
+            return highest, sample
+        if sample is None:
+            return None
+        name = counter_filename(regex, sample, highest + 1)
+        if name is None or os.path.lexists(os.path.join(full_folder, name)):
+            return None
+        return highest, sample
+
+    def bump(self, full_folder, filename_pattern, value, count=1):
+        """
+        Record that counter values are in use (e.g. issued elsewhere).
+
+        Args:
+            full_folder: Absolute folder path
+            filename_pattern: Filename with {counter} placeholder
+            value: Highest counter value now in use
+            count: Number of consecutive values ending at value
+        """
+        key = (os.path.normcase(os.path.abspath(full_folder)), filename_pattern)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry.used is not None:
+                entry.used.add_range(value - count + 1, count)
+            entry.reserve(value - count + 1, count, time.monotonic(), self.trust_seconds)
+            if value > entry.highest:
+                entry.highest = value
+                self._persist(key, entry)
+
+    def invalidate(self, full_folder=None):
+        """
+        Drop cached entries, forcing a rescan on next lookup.
+
+        Args:
+            full_folder: Only drop entries for this folder (default: all)
+        """
+        with self._lock:
+            if full_folder is None:
+                self._entries.clear()
+                return
+            folder_key = os.path.normcase(os.path.abspath(full_folder))
+            for key in [k for k in self._entries if k[0] == folder_key]:
+                del self._entries[key]
+
+    def _evict(self):
+        """Evict least recently used entries beyond max_entries"""
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Shared process-wide index
+counter_index = CounterIndex()
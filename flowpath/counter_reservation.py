@@ -0,0 +1,214 @@
+"""
+FlowPath Counter Reservations
+Cross-process {counter} reservations for ComfyUI instances sharing an output folder
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: set FLOWPATH_COUNTER_RESERVATIONS=1 on every ComfyUI instance
+# that writes into the same output volume
+RESERVATIONS_ENABLED = os.environ.get("FLOWPATH_COUNTER_RESERVATIONS", "0") == "1"
+
+# Journal file kept in each target folder (also used as the lock file)
+JOURNAL_FILENAME = ".flowpath_counter.json"
+
+# Reservations older than this are dropped. Must cover the time between
+# FlowPath running and the save node writing the file (i.e. a full render).
+RESERVATION_TTL_SECONDS = float(
+    os.environ.get("FLOWPATH_COUNTER_RESERVATION_TTL", "600")
+)
+
+# Give up on the lock after this long and fall back to the local counter
+LOCK_TIMEOUT_SECONDS = 5.0
+LOCK_RETRY_INTERVAL = 0.01
+
+# Reservations slower than this are logged as warnings
+SLOW_RESERVATION_SECONDS = 0.25
+
+_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# File locks are per process, so threads also need an in-process lock
+_thread_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+reservation_stats = {
+    "count": 0,
+    "total_seconds": 0.0,
+    "max_seconds": 0.0,
+    "last_seconds": 0.0,
+    "lock_timeouts": 0,
+    "errors": 0,
+}
+
+
+def _lock_file(fd, timeout):
+    """Acquire an exclusive lock on fd, retrying until timeout. Returns True on success."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if fcntl is not None:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(LOCK_RETRY_INTERVAL)
+
+
+def _unlock_file(fd):
+    """Release the lock taken by _lock_file()"""
+    try:
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+
+
+def _read_journal(fd):
+    """Read the journal contents from an open file descriptor"""
+    os.lseek(fd, 0, os.SEEK_SET)
+    chunks = []
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    raw = b"".join(chunks)
+    if not raw.strip():
+        return {}
+    try:
+        journal = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        logger.warning("Corrupt counter journal, resetting")
+        return {}
+    return journal if isinstance(journal, dict) else {}
+
+
+def _write_journal(fd, journal):
+    """
+    Rewrite the journal in place.
+    Updating the file in place (instead of replace/rename) leaves the folder
+    mtime untouched, so the in-process counter index stays valid.
+    """
+    data = json.dumps(journal, separators=(",", ":")).encode("utf-8")
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.write(fd, data)
+    os.ftruncate(fd, len(data))
+
+
+def _record_latency(elapsed):
+    """Update reservation latency stats and log slow reservations"""
+    with _stats_lock:
+        reservation_stats["count"] += 1
+        reservation_stats["total_seconds"] += elapsed
+        reservation_stats["last_seconds"] = elapsed
+        if elapsed > reservation_stats["max_seconds"]:
+            reservation_stats["max_seconds"] = elapsed
+
+    if elapsed > SLOW_RESERVATION_SECONDS:
+        logger.warning("Slow counter reservation: %.1f ms", elapsed * 1000)
+    else:
+        logger.debug("Counter reservation took %.2f ms", elapsed * 1000)
+
+
+def _count_failure(key):
+    with _stats_lock:
+        reservation_stats[key] += 1
+
+
+def reserve_counter(full_folder, filename_pattern, local_next, ttl=None, count=1):
+    """
+    Reserve a counter value that no other FlowPath process will hand out.
+
+    The journal in the target folder holds the live reservations per filename
+    pattern. The reserved value is the higher of local_next (from the local
+    counter index) and one past the highest live reservation, so workers never
+    need to rescan the folder to agree on a counter.
+
+    Args:
+        full_folder: Absolute folder path
+        filename_pattern: Filename with {counter} placeholder
+        local_next: Next counter according to this process's counter index
+        ttl: Seconds until the reservation expires (default RESERVATION_TTL_SECONDS)
+        count: Number of consecutive counters to reserve (batches)
+
+    Returns:
+        int: First reserved counter (local_next if the journal can't be used)
+    """
+    ttl = RESERVATION_TTL_SECONDS if ttl is None else ttl
+    started = time.perf_counter()
+
+    with _thread_lock:
+        try:
+            os.makedirs(full_folder, exist_ok=True)
+            fd = os.open(
+                os.path.join(full_folder, JOURNAL_FILENAME), os.O_RDWR | os.O_CREAT
+            )
+        except OSError:
+            logger.exception("Cannot open counter journal in %s", full_folder)
+            _count_failure("errors")
+            return local_next
+
+        try:
+            if not _lock_file(fd, LOCK_TIMEOUT_SECONDS):
+                logger.warning("Timed out waiting for counter lock in %s", full_folder)
+                _count_failure("lock_timeouts")
+                return local_next
+
+            try:
+                journal = _read_journal(fd)
+                patterns = journal.get("patterns")
+                if not isinstance(patterns, dict):
+                    patterns = {}
+
+                # Drop expired reservations for every pattern in this folder
+                now = time.time()
+                for key in list(patterns):
+                    live = [
+                        r
+                        for r in patterns[key]
+                        if isinstance(r, list) and len(r) >= 2 and r[1] > now
+                    ]
+                    if live:
+                        patterns[key] = live
+                    else:
+                        del patterns[key]
+
+                live = patterns.get(filename_pattern, [])
+                highest_reserved = max((r[0] for r in live), default=0)
+                counter = max(local_next, highest_reserved + 1)
+
+                # Each entry records the highest counter of its range
+                live.append([counter + count - 1, now + ttl, _OWNER])
+                patterns[filename_pattern] = live
+                _write_journal(fd, {"version": 1, "patterns": patterns})
+            finally:
+                _unlock_file(fd)
+        except OSError:
+            logger.exception("Counter reservation failed in %s", full_folder)
+            _count_failure("errors")
+            return local_next
+        finally:
+            os.close(fd)
+
+    _record_latency(time.perf_counter() - started)
+    return counter
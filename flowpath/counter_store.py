@@ -0,0 +1,248 @@
+"""
+FlowPath Counter Store
+Persistent copy of the counter index, so restarts don't rescan every folder
+"""
+
+import os
+import atexit
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: set FLOWPATH_COUNTER_STORE=1 to keep counters across restarts
+COUNTER_STORE_ENABLED = os.environ.get("FLOWPATH_COUNTER_STORE", "0") == "1"
+
+# Database kept in the output directory
+STORE_FILENAME = ".flowpath_counters.sqlite3"
+
+# Seconds between write-behind flushes
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("FLOWPATH_COUNTER_STORE_FLUSH", "2"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    folder TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    highest INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    issued INTEGER NOT NULL DEFAULT 0,
+    sample TEXT,
+    PRIMARY KEY (folder, pattern)
+)
+"""
+
+
+class CounterStore:
+    """
+    SQLite store of the highest counter per (folder, filename pattern).
+
+    Each row keeps the folder mtime it was written with and the name of a
+    file with the highest counter. The save node usually writes the last
+    issued file after the row, so the counter index doesn't require the
+    mtime to match: it checks that no file exists for the next counter.
+
+    Each row also keeps the highest counter ever issued, which survives
+    deleted files and restarts (strictly-monotonic-persisted counter mode).
+
+    Writes are buffered and flushed by a background thread (and at exit),
+    so issuing a counter never waits on the disk.
+    """
+
+    def __init__(self, output_dir, flush_interval=FLUSH_INTERVAL_SECONDS):
+        """
+        Args:
+            output_dir: Output directory; only folders below it are stored
+            flush_interval: Seconds between write-behind flushes
+        """
+        self.root = os.path.normcase(os.path.abspath(output_dir))
+        self.path = os.path.join(output_dir, STORE_FILENAME)
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        try:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass  # e.g. network filesystems without shared memory support
+        self._db.execute(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(counters)")}
+        if "issued" not in columns:
+            # Databases from before the high-water mark
+            self._db.execute(
+                "ALTER TABLE counters ADD COLUMN issued INTEGER NOT NULL DEFAULT 0"
+            )
+            self._db.execute("UPDATE counters SET issued = highest")
+        if "sample" not in columns:
+            self._db.execute("ALTER TABLE counters ADD COLUMN sample TEXT")
+        self._db.commit()
+
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="flowpath-counter-store", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _folder_key(self, folder_key):
+        """Folder relative to the output dir, or None if it lies outside"""
+        if folder_key == self.root:
+            return "."
+        if not folder_key.startswith(self.root.rstrip(os.sep) + os.sep):
+            return None
+        return os.path.relpath(folder_key, self.root)
+
+    def lookup(self, folder_key, pattern):
+        """
+        Stored state of a folder and pattern.
+
+        Args:
+            folder_key: Normalized absolute folder path
+            pattern: Filename pattern with {counter}
+
+        Returns:
+            tuple or None: (highest, mtime_ns, sample), or None if unknown
+        """
+        folder = self._folder_key(folder_key)
+        if folder is None:
+            return None
+
+        with self._lock:
+            pending = self._pending.get((folder, pattern))
+        if pending is not None:
+            return pending
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT highest, mtime_ns, sample FROM counters "
+                    "WHERE folder = ? AND pattern = ?",
+                    (folder, pattern),
+                ).fetchone()
+        except sqlite3.Error:
+            logger.debug("FlowPath counter store lookup failed", exc_info=True)
+            return None
+        return tuple(row) if row is not None else None
+
+    def high_water(self, folder_key, pattern):
+        """
+        Highest counter ever issued for a folder and pattern, whether or not
+        its file still exists.
+
+        Args:
+            folder_key: Normalized absolute folder path
+            pattern: Filename pattern with {counter}
+
+        Returns:
+            int: High-water mark (0 if unknown)
+        """
+        folder = self._folder_key(folder_key)
+        if folder is None:
+            return 0
+
+        with self._lock:
+            pending = self._pending.get((folder, pattern))
+        highest = pending[0] if pending is not None else 0
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT issued FROM counters WHERE folder = ? AND pattern = ?",
+                    (folder, pattern),
+                ).fetchone()
+        except sqlite3.Error:
+            logger.debug("FlowPath counter store lookup failed", exc_info=True)
+            row = None
+        return max(highest, row[0] if row is not None else 0)
+
+    def record(self, folder_key, pattern, highest, mtime_ns, sample=None):
+        """
+        Queue the current state of an index entry for the next flush.
+
+        Args:
+            folder_key: Normalized absolute folder path
+            pattern: Filename pattern with {counter}
+            highest: Highest counter used or issued
+            mtime_ns: Folder mtime when the entry was last validated
+            sample: Name of a file with the highest counter seen (optional)
+        """
+        if mtime_ns is None:
+            return
+        folder = self._folder_key(folder_key)
+        if folder is None:
+            return
+        with self._lock:
+            self._pending[(folder, pattern)] = (highest, mtime_ns, sample)
+
+    def flush(self):
+        """Write all queued entries in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        rows = [
+            (folder, pattern, highest, mtime_ns, sample)
+            for (folder, pattern), (highest, mtime_ns, sample) in pending.items()
+        ]
+        try:
+            with self._db_lock:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT INTO counters (folder, pattern, highest, mtime_ns, issued, sample) "
+                        "VALUES (?1, ?2, ?3, ?4, ?3, ?5) "
+                        "ON CONFLICT (folder, pattern) DO UPDATE SET "
+                        "highest = excluded.highest, mtime_ns = excluded.mtime_ns, "
+                        "issued = MAX(issued, excluded.issued), "
+                        "sample = COALESCE(excluded.sample, sample)",
+                        rows,
+                    )
+        except sqlite3.Error:
+            logger.warning("FlowPath counter store flush failed", exc_info=True)
+
+    def close(self):
+        """Flush and close the database"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            if self._closed:
+                return
+            self.flush()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_counter_store(output_dir, force=False):
+    """
+    Shared store for an output directory.
+
+    Args:
+        output_dir: Output directory
+        force: Open it even if FLOWPATH_COUNTER_STORE is not set
+               (strictly-monotonic-persisted counters need it)
+
+    Returns:
+        CounterStore or None: None if the store is disabled or can't be opened
+    """
+    if not (COUNTER_STORE_ENABLED or force):
+        return None
+    key = os.path.normcase(os.path.abspath(output_dir))
+    with _stores_lock:
+        if key not in _stores:
+            try:
+                _stores[key] = CounterStore(output_dir)
+            except (OSError, sqlite3.Error):
+                logger.warning("FlowPath counter store unavailable in %s", output_dir, exc_info=True)
+                _stores[key] = None
+        return _stores[key]
@@ -0,0 +1,145 @@
+"""
+FlowPath Execution Context
+Per-prompt state shared by all FlowPath nodes in one run: the analyzed
+prompt, one timestamp, and counter folders scanned up front in parallel
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .counter_index import counter_index
+from .prompt_analyzer import analyze_prompt
+
+logger = logging.getLogger(__name__)
+
+# Node classes whose counter folders are prefetched
+FLOWPATH_NODE_TYPES = frozenset({"FlowPath", "FlowPathBatch"})
+
+# Contexts kept for recent prompts
+CONTEXT_CACHE_SIZE = 8
+
+# Threads scanning distinct counter folders at the start of a run
+PREFETCH_WORKERS = 4
+
+_prefetch_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_prefetch_pool():
+    global _prefetch_pool
+    with _pool_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(
+                max_workers=PREFETCH_WORKERS, thread_name_prefix="flowpath-prefetch"
+            )
+        return _prefetch_pool
+
+
+class ExecutionContext:
+    """
+    State shared by the FlowPath nodes of one prompt.
+
+    Attributes:
+        prompt: Workflow prompt dictionary
+        analysis: PromptAnalysis of the prompt (kept alive for the whole run)
+        now: Timestamp snapshot, so date segments agree across all nodes
+    """
+
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.analysis = analyze_prompt(prompt)
+        self.now = datetime.now()
+        self._prefetched = set()
+        self._lock = threading.Lock()
+
+    def flowpath_nodes(self):
+        """
+        FlowPath nodes in the prompt.
+
+        Returns:
+            list: (node_id, widget_data) pairs
+        """
+        nodes = []
+        for node_id, node_data in self.prompt.items():
+            if not isinstance(node_data, dict):
+                continue
+            if node_data.get("class_type") not in FLOWPATH_NODE_TYPES:
+                continue
+            widget_data = node_data.get("inputs", {}).get("widget_data")
+            if isinstance(widget_data, str):
+                nodes.append((node_id, widget_data))
+        return nodes
+
+    def prefetch(self, output_dir, counter_targets):
+        """
+        Scan the counter folders of every FlowPath node once, concurrently.
+
+        Only the first call per output directory does any work; later nodes
+        in the run find their folders in the counter index.
+
+        Args:
+            output_dir: Output directory the targets belong to
+            counter_targets: Callable returning a set of
+                             (full_folder, filename_pattern, counter mode) tuples
+        """
+        with self._lock:
+            if output_dir in self._prefetched:
+                return
+            self._prefetched.add(output_dir)
+
+            try:
+                targets = counter_targets()
+            except Exception:
+                logger.debug("FlowPath counter prefetch skipped", exc_info=True)
+                return
+            if len(targets) < 2:
+                # Nothing to overlap - the node scans its folder itself
+                return
+
+            futures = [
+                _get_prefetch_pool().submit(
+                    counter_index.next_counter, folder, pattern, reserve=False, mode=mode
+                )
+                for folder, pattern, mode in targets
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    logger.debug("FlowPath counter prefetch failed", exc_info=True)
+
+
+_context_cache = OrderedDict()
+_context_lock = threading.Lock()
+
+
+def get_execution_context(prompt):
+    """
+    Execution context for a prompt, memoized by prompt identity.
+
+    Args:
+        prompt: Workflow prompt dictionary
+
+    Returns:
+        ExecutionContext or None: None for an empty prompt
+    """
+    if not prompt or not isinstance(prompt, dict):
+        return None
+
+    key = id(prompt)
+    with _context_lock:
+        cached = _context_cache.get(key)
+        # Identity check guards against id() reuse after garbage collection
+        if cached is not None and cached.prompt is prompt:
+            _context_cache.move_to_end(key)
+            return cached
+
+        context = ExecutionContext(prompt)
+        _context_cache[key] = context
+        while len(_context_cache) > CONTEXT_CACHE_SIZE:
+            _context_cache.popitem(last=False)
+
+    return context
@@ -0,0 +1,221 @@
+"""
+FlowPath Metrics
+Per-stage timings for path resolution and route latency, exported as
+Prometheus text format histograms
+"""
+
+import os
+import time
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Log resolutions (and route calls) slower than this many milliseconds.
+# 0 disables slow-call logging.
+SLOW_CALL_MS = float(os.environ.get("FLOWPATH_SLOW_CALL_MS", "0"))
+
+# Upper bounds in seconds - resolutions are usually microseconds, cold
+# counter scans of huge folders can take seconds
+STAGE_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0,
+)
+ROUTE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCAN_FILE_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Histogram:
+    """Cumulative histogram with labels, rendered in Prometheus text format"""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Record one value for the given label values (in label_names order)"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(labels + [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "flowpath_stage_seconds",
+    "Time spent in each path resolution stage",
+    STAGE_BUCKETS,
+    ("op", "stage"),
+)
+CALL_SECONDS = Histogram(
+    "flowpath_call_seconds",
+    "Total time of one path resolution",
+    STAGE_BUCKETS,
+    ("op",),
+)
+ROUTE_SECONDS = Histogram(
+    "flowpath_route_seconds",
+    "FlowPath HTTP route latency",
+    ROUTE_BUCKETS,
+    ("route", "status"),
+)
+SCAN_FILES = Histogram(
+    "flowpath_counter_scan_files",
+    "Directory entries read per counter folder scan",
+    SCAN_FILE_BUCKETS,
+)
+
+HISTOGRAMS = [STAGE_SECONDS, CALL_SECONDS, SCAN_FILES, ROUTE_SECONDS]
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one call.
+
+        timer = StageTimer("build")
+        ...parse...
+        timer.mark("parse")
+        ...
+        timer.finish()
+    """
+
+    __slots__ = ("op", "started", "last", "stages")
+
+    def __init__(self, op):
+        self.op = op
+        self.started = self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        """Record the time since the previous mark as this stage"""
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+        self.stages.append((stage, elapsed))
+        STAGE_SECONDS.observe(elapsed, self.op, stage)
+
+    def finish(self, context=""):
+        """Record the total and log the breakdown if the call was slow"""
+        total = time.perf_counter() - self.started
+        CALL_SECONDS.observe(total, self.op)
+        if SLOW_CALL_MS and total * 1000 >= SLOW_CALL_MS:
+            breakdown = ", ".join(f"{stage}={elapsed * 1000:.2f}ms" for stage, elapsed in self.stages)
+            logger.warning(
+                "Slow FlowPath %s: %.1f ms (%s)%s",
+                self.op,
+                total * 1000,
+                breakdown,
+                f" {context}" if context else "",
+            )
+        return total
+
+
+def observe_route(route, status, elapsed):
+    """Record one HTTP route call"""
+    ROUTE_SECONDS.observe(elapsed, route, str(status))
+    if SLOW_CALL_MS and elapsed * 1000 >= SLOW_CALL_MS:
+        logger.warning("Slow FlowPath route %s: %.1f ms (status %s)", route, elapsed * 1000, status)
+
+
+def _render_counter(name, help_text, value):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {_format_value(value)}"]
+
+
+def render_prometheus():
+    """
+    All FlowPath metrics in Prometheus text exposition format (version 0.0.4).
+
+    Includes the stage/route histograms plus the counter index and counter
+    reservation totals.
+    """
+    # Imported here so the histogram module stays import-light
+    from .counter_index import counter_index
+    from .counter_reservation import reservation_stats
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    scan_stats = counter_index.scan_stats
+    lines += _render_counter(
+        "flowpath_counter_scans_total", "Counter folder scans", scan_stats["scans"]
+    )
+    lines += _render_counter(
+        "flowpath_counter_files_scanned_total",
+        "Directory entries read by counter folder scans",
+        scan_stats["files_scanned"],
+    )
+    lines += _render_counter(
+        "flowpath_counter_lookups_total", "Counter lookups", scan_stats["lookups"]
+    )
+    lines += _render_counter(
+        "flowpath_counter_store_hits_total",
+        "Counter lookups answered by the persistent store instead of a scan",
+        scan_stats["store_hits"],
+    )
+    lines += _render_counter(
+        "flowpath_counter_delta_checks_total",
+        "Changed counter folders revalidated without a scan",
+        scan_stats["delta_checks"],
+    )
+
+    lines += _render_counter(
+        "flowpath_reservations_total", "Shared counter reservations", reservation_stats["count"]
+    )
+    lines += _render_counter(
+        "flowpath_reservation_seconds_total",
+        "Time spent on shared counter reservations",
+        reservation_stats["total_seconds"],
+    )
+    lines += _render_counter(
+        "flowpath_reservation_lock_timeouts_total",
+        "Counter reservations that timed out waiting for the lock",
+        reservation_stats["lock_timeouts"],
+    )
+    lines += _render_counter(
+        "flowpath_reservation_errors_total",
+        "Counter reservations that failed",
+        reservation_stats["errors"],
+    )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,781 @@
+"""
+FlowPath Migration
+Moves existing outputs into a changed segment layout as a resumable job
+"""
+
+import os
+import json
+import time
+import uuid
+import errno
+import ctypes
+import shutil
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .path_plan import PathPlan, expand_preset_ref, get_path_plan, widget_data_key
+from .provenance import get_provenance_log
+from .sanitize import fit_path_length, is_inside, sanitize_component
+
+logger = logging.getLogger(__name__)
+
+# Job folders (plan, checkpoint, state) live here inside the output directory
+JOBS_DIRNAME = ".flowpath_migrations"
+
+DEFAULT_WORKERS = 8
+MAX_WORKERS = 32
+
+# Completed moves are checkpointed at least this often
+CHECKPOINT_INTERVAL_SECONDS = 1.0
+
+# Moves listed in progress() for a dry run
+SAMPLE_MOVES = 20
+
+# Errors kept for progress()
+MAX_ERRORS = 20
+
+# os.link failures that mean "no hard links here" rather than a real error
+_NO_LINK_ERRNOS = frozenset(
+    code
+    for code in (
+        errno.EXDEV,
+        errno.EPERM,
+        getattr(errno, "ENOTSUP", None),
+        getattr(errno, "EOPNOTSUPP", None),
+        getattr(errno, "ENOSYS", None),
+    )
+    if code is not None
+)
+
+
+class MigrationError(ValueError):
+    """Invalid migration request (bad layouts or unknown job)"""
+
+
+def _rel(path):
+    """Relative path with forward slashes"""
+    return path.replace("\\", "/").strip("/")
+
+
+def _move_no_overwrite(src, dst):
+    """
+    Move a file without ever replacing an existing destination.
+
+    os.rename would silently overwrite a file saved at dst after any
+    exists() check, so the file is hard-linked to dst (which fails if dst
+    exists) and then unlinked. On the same device without hard links
+    (exFAT, many SMB and FUSE mounts) it is renamed with a no-replace
+    rename instead. Only moves to another device are copied, into a
+    destination opened with O_EXCL.
+
+    Raises:
+        FileExistsError: If dst already exists
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno not in _NO_LINK_ERRNOS:
+            raise
+        if e.errno != errno.EXDEV and _same_device(src, dst):
+            try:
+                _rename_no_replace(src, dst)
+                return
+            except OSError as rename_error:
+                # Bind mounts of one filesystem share st_dev but not renames
+                if rename_error.errno != errno.EXDEV:
+                    raise
+        _copy_exclusive(src, dst)
+    os.unlink(src)
+
+
+def _same_device(src, dst):
+    """Whether src and the folder of dst are on the same device"""
+    return os.stat(src).st_dev == os.stat(os.path.dirname(dst) or ".").st_dev
+
+
+# renameat2() flag and "current directory" fd (Linux)
+_RENAME_NOREPLACE = 1
+_AT_FDCWD = -100
+_renameat2 = None
+_renameat2_loaded = False
+
+
+def _load_renameat2():
+    """libc renameat2(), or None where it isn't available (glibc < 2.28, not Linux)"""
+    global _renameat2, _renameat2_loaded
+    if not _renameat2_loaded:
+        _renameat2_loaded = True
+        if os.name == "posix" and os.uname().sysname == "Linux":
+            try:
+                function = ctypes.CDLL(None, use_errno=True).renameat2
+            except (OSError, AttributeError):
+                function = None
+            if function is not None:
+                function.argtypes = (
+                    ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint,
+                )
+                function.restype = ctypes.c_int
+                _renameat2 = function
+    return _renameat2
+
+
+def _rename_no_replace(src, dst):
+    """
+    Rename src to dst, failing if dst exists.
+
+    Uses renameat2(RENAME_NOREPLACE) on Linux and os.rename on Windows
+    (which never replaces). Elsewhere, or where the filesystem rejects the
+    flag, an O_EXCL placeholder claims dst before os.replace moves src
+    over it.
+
+    Raises:
+        FileExistsError: If dst already exists
+    """
+    if os.name == "nt":
+        os.rename(src, dst)
+        return
+
+    renameat2 = _load_renameat2()
+    if renameat2 is not None:
+        result = renameat2(
+            _AT_FDCWD, os.fsencode(src), _AT_FDCWD, os.fsencode(dst), _RENAME_NOREPLACE
+        )
+        if result == 0:
+            return
+        code = ctypes.get_errno()
+        if code not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(code, os.strerror(code), src, None, dst)
+        # Filesystem without RENAME_NOREPLACE support
+
+    fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    os.close(fd)
+    try:
+        os.replace(src, dst)
+    except BaseException:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        raise
+
+
+def _copy_exclusive(src, dst):
+    """Copy src to a dst that must not exist yet (data and timestamps)"""
+    fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with open(src, "rb") as source, os.fdopen(fd, "wb") as target:
+            fd = None
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        shutil.copystat(src, dst)
+    except BaseException:
+        if fd is not None:
+            os.close(fd)
+        # Don't leave a partial copy that blocks a retry
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        raise
+
+
+# Config keys restored from provenance records (config key, record column)
+RECORD_FIELDS = (
+    ("model_name", "model"),
+    ("lora_name", "loras"),
+    ("resolution", "resolution"),
+)
+
+
+class MigrationJob:
+    """
+    Moves the files of one segment layout into another.
+
+    Planning recomputes each file's old and new path with the path plan
+    engine. Files listed in the provenance log are mapped with the seed,
+    model, LoRAs, resolution and time they were built with. Files under
+    `source` that the log doesn't cover are mapped from the layout config
+    and their modification time (date segments). Only files whose
+    recomputed old path is where they actually are get moved.
+
+    The plan is written to the job folder before anything moves, so a dry
+    run can be reviewed. Execution renames files with a bounded worker
+    pool and appends finished moves to a checkpoint, so an interrupted
+    job resumes where it stopped. Moves never replace an existing file:
+    within one filesystem they are a hard link plus unlink, and files are
+    only copied when the target is on another device.
+    """
+
+    def __init__(self, resolver, job_id, old_widget_data, new_widget_data, source=None):
+        """
+        Args:
+            resolver: PathResolver of the output directory
+            job_id: Job id (folder name in the jobs directory)
+            old_widget_data: widget_data of the layout files are in now
+            new_widget_data: widget_data of the layout to move them to
+            source: Folder (relative to the output dir) to scan for files
+                    missing from the provenance log, or None
+        """
+        self.resolver = resolver
+        self.id = job_id
+        self.old_widget_data = old_widget_data
+        self.new_widget_data = new_widget_data
+        self.source = _rel(source) if source else None
+        self.folder = os.path.join(resolver.output_dir, JOBS_DIRNAME, job_id)
+
+        self.status = "created"
+        self.total = 0
+        self.moved = 0
+        self.skipped = 0
+        self.conflicts = 0
+        self.failed = 0
+        self.by_source = {}
+        self.errors = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._record_plans = {}
+
+    def _plans(self):
+        presets = self.resolver.presets
+        old_plan = get_path_plan(self.old_widget_data, sanitize_component, presets)
+        new_plan = get_path_plan(self.new_widget_data, sanitize_component, presets)
+        if old_plan is None or new_plan is None:
+            raise MigrationError("Old and new widget_data must be JSON objects")
+        if old_plan.shard is not None or new_plan.shard is not None:
+            raise MigrationError("Layouts with a shard segment can't be migrated")
+        if old_plan.path_is_prefix != new_plan.path_is_prefix:
+            raise MigrationError("Old and new layout must use the same output mode")
+        return old_plan, new_plan
+
+    def _layout_data(self, widget_data):
+        """Parsed widget_data with a preset reference expanded"""
+        data = json.loads(widget_data)
+        if "segments" not in data and self.resolver.presets is not None:
+            data, _ = expand_preset_ref(data, self.resolver.presets)
+        return data
+
+    def _record_path(self, which, widget_data, record, now, use_record=True):
+        """
+        Path a layout gives for the metadata of a provenance record.
+
+        Static segments (model, LoRA, resolution) are bound when a plan is
+        compiled, so one plan is compiled per distinct recorded combination.
+        With use_record=False the layout's own config values are kept (the
+        record holds what the prompt loaded, which the widget config may
+        spell differently).
+        """
+        if use_record:
+            values = tuple(record.get(column) for _, column in RECORD_FIELDS)
+        else:
+            values = (None,) * len(RECORD_FIELDS)
+        key = (which, values)
+        plan = self._record_plans.get(key)
+        if plan is None:
+            data = self._layout_data(widget_data)
+            config = dict(data.get("config", {}))
+            for (config_key, _), value in zip(RECORD_FIELDS, values):
+                if value is not None:
+                    config[config_key] = value
+            plan = PathPlan(dict(data, config=config), widget_data_key(repr(key)), sanitize_component)
+            self._record_plans[key] = plan
+        config = plan.config
+        if record.get("seed") is not None:
+            config = dict(config, seed=record["seed"])
+        return self._render(plan, config, now, record["filename"])
+
+    def _render(self, plan, config, now, filename):
+        """Path build_path would have issued (relative, forward slashes)"""
+        folder = plan.build_folder(config, now)
+        return _rel(fit_path_length(folder, filename, self.resolver.output_dir))
+
+    def plan(self):
+        """
+        Compute every move and write the plan file.
+
+        Returns:
+            dict: progress() after planning
+
+        Raises:
+            MigrationError: If the layouts can't be migrated, or a rendered
+                            path leaves the output directory
+        """
+        old_plan, new_plan = self._plans()
+        with self._lock:
+            self.total = 0
+            self.conflicts = 0
+            self.by_source = {}
+        self._set_status("planning")
+        path_is_prefix = old_plan.path_is_prefix
+        output_dir = self.resolver.output_dir
+
+        # Old folder -> {prefix: [(created_at, old path, new path)]}
+        folders = {}
+        log = get_provenance_log(output_dir, force=True)
+        if log is not None:
+            for record in log.iter_records():
+                now = datetime.fromtimestamp(record["created_at"])
+                for use_record in (True, False):
+                    old_path = self._record_path(
+                        "old", self.old_widget_data, record, now, use_record
+                    )
+                    if old_path == record["path"]:
+                        break
+                else:
+                    continue  # Built with another layout or other settings
+                new_path = self._record_path(
+                    "new", self.new_widget_data, record, now, use_record
+                )
+                if new_path == old_path or not record["prefix"]:
+                    continue
+                folders.setdefault(record["folder"], {}).setdefault(record["prefix"], []).append(
+                    (record["created_at"], old_path, new_path)
+                )
+
+        moves = []
+        targets = set()
+        claimed = set()
+        # Counted locally and published under the lock once planning is done
+        conflicts = 0
+        by_source = {}
+
+        def add(src, dst, via, old_path, new_path):
+            nonlocal conflicts
+            for path in (src, dst):
+                if not is_inside(os.path.join(output_dir, path), output_dir):
+                    raise MigrationError(f"Layout leaves the output directory: {path}")
+            if dst in targets:
+                conflicts += 1
+                return
+            targets.add(dst)
+            claimed.add(src)
+            moves.append(
+                {"src": src, "dst": dst, "via": via, "old_path": old_path, "new_path": new_path}
+            )
+            by_source[via] = by_source.get(via, 0) + 1
+
+        for folder, prefixes in folders.items():
+            lengths = sorted({len(prefix) for prefix in prefixes}, reverse=True)
+            for name, mtime in self._list_files(os.path.join(output_dir, folder)):
+                stem = os.path.splitext(name)[0]
+                # Longest matching prefix, newest record not built after the file
+                for length in lengths:
+                    candidates = prefixes.get(stem[:length])
+                    if candidates:
+                        break
+                else:
+                    continue
+                built = [c for c in candidates if c[0] <= mtime + 1] or candidates
+                _, old_path, new_path = max(built)
+                src = f"{folder}/{name}" if folder else name
+                add(src, self._target(name, old_path, new_path, path_is_prefix), "provenance",
+                    old_path, new_path)
+
+        if self.source is not None:
+            for src, old_path, new_path in self._scan_source(old_plan, new_plan):
+                if src not in claimed:
+                    name = src.rpartition("/")[2]
+                    add(src, self._target(name, old_path, new_path, path_is_prefix), "pattern",
+                        old_path, new_path)
+
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, "plan.jsonl"), "w", encoding="utf-8") as f:
+            for move in moves:
+                f.write(json.dumps(move) + "\n")
+        # Checkpoints refer to lines of the previous plan
+        try:
+            os.remove(os.path.join(self.folder, "done.log"))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.total = len(moves)
+            self.conflicts = conflicts
+            self.by_source = by_source
+        self._set_status("planned")
+        return self.progress()
+
+    @staticmethod
+    def _target(name, old_path, new_path, path_is_prefix):
+        """Destination of a file in the new layout"""
+        if path_is_prefix:
+            # SI mode: keep Save Image's suffix, swap the filename prefix
+            old_prefix = old_path.rpartition("/")[2]
+            new_folder, _, new_prefix = new_path.rpartition("/")
+            new_name = new_prefix + name[len(old_prefix):]
+            return f"{new_folder}/{new_name}" if new_folder else new_name
+        return f"{new_path}/{name}" if new_path else name
+
+    @staticmethod
+    def _list_files(full_folder):
+        """(name, mtime) of the files in a folder"""
+        try:
+            with os.scandir(full_folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_file():
+                            yield entry.name, entry.stat().st_mtime
+                    except OSError:
+                        continue
+        except OSError:
+            return
+
+    def _scan_source(self, old_plan, new_plan):
+        """
+        Files under source whose folder matches the old layout rendered
+        with the layout config and the file's modification time.
+
+        Yields:
+            tuple: (src, old path, new path)
+        """
+        output_dir = self.resolver.output_dir
+        root = os.path.join(output_dir, self.source) if self.source else output_dir
+        path_is_prefix = old_plan.path_is_prefix
+        # Paths only depend on the time through date formats, so files
+        # saved in the same second share one render
+        rendered = {}
+
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            folder = _rel(os.path.relpath(dirpath, output_dir))
+            if folder == ".":
+                folder = ""
+            for name, mtime in self._list_files(dirpath):
+                second = int(mtime)
+                paths = rendered.get(second)
+                if paths is None:
+                    now = datetime.fromtimestamp(mtime)
+                    paths = (
+                        self._render(old_plan, dict(old_plan.config), now, ""),
+                        self._render(new_plan, dict(new_plan.config), now, ""),
+                    )
+                    rendered[second] = paths
+                old_path, new_path = paths
+                if old_path == new_path:
+                    continue
+                if path_is_prefix:
+                    old_folder, _, prefix = old_path.rpartition("/")
+                    if old_folder != folder or not name.startswith(prefix):
+                        continue
+                elif old_path != folder:
+                    continue
+                yield (f"{folder}/{name}" if folder else name), old_path, new_path
+
+    def run(self, workers=DEFAULT_WORKERS):
+        """
+        Execute the plan (resuming after the last checkpoint).
+
+        Args:
+            workers: Parallel renames
+
+        Returns:
+            dict: progress() after the run
+        """
+        old_plan, _ = self._plans()
+        workers = max(1, min(int(workers), MAX_WORKERS))
+        plan_path = os.path.join(self.folder, "plan.jsonl")
+        done_path = os.path.join(self.folder, "done.log")
+        if not os.path.exists(plan_path):
+            raise MigrationError(f"Migration {self.id} has no plan")
+
+        done = set()
+        try:
+            with open(done_path, "r", encoding="utf-8") as f:
+                done = {int(line) for line in f if line.strip().isdigit()}
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+            self.moved = self.skipped = self.failed = 0
+            self.errors = []
+        self._cancel.clear()
+        self._save_state()
+
+        relocated = set()
+        created = set()
+        created_lock = threading.Lock()
+
+        output_dir = self.resolver.output_dir
+
+        def move(index, entry):
+            src = os.path.join(output_dir, entry["src"])
+            dst = os.path.join(output_dir, entry["dst"])
+            # The plan file could have been edited (or a folder swapped for a symlink)
+            if not (is_inside(src, output_dir) and is_inside(dst, output_dir)):
+                return "outside"
+            if not os.path.exists(src):
+                # Moved before the checkpoint was written
+                return "skipped" if os.path.exists(dst) else "missing"
+            dst_dir = os.path.dirname(dst)
+            with created_lock:
+                known = dst_dir in created
+            if not known:
+                os.makedirs(dst_dir, exist_ok=True)
+                with created_lock:
+                    created.add(dst_dir)
+            try:
+                _move_no_overwrite(src, dst)
+            except FileExistsError:
+                # Saved there since planning (or a leftover) - never replaced
+                return "conflict"
+            return "moved"
+
+        checkpoint = open(done_path, "a", encoding="utf-8")
+        last_checkpoint = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="flowpath-migrate") as pool:
+                pending = {}
+                with open(plan_path, "r", encoding="utf-8") as f:
+                    for index, line in enumerate(f):
+                        if self._cancel.is_set():
+                            break
+                        entry = json.loads(line)
+                        if index in done:
+                            relocated.add((entry["old_path"], entry["new_path"]))
+                            with self._lock:
+                                self.skipped += 1
+                            continue
+                        # Bounded queue: never more than a few moves per worker in flight
+                        while len(pending) >= workers * 4:
+                            self._collect(pending, checkpoint, relocated)
+                        pending[pool.submit(move, index, entry)] = (index, entry)
+                        if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+                            checkpoint.flush()
+                            self._save_state()
+                            last_checkpoint = time.monotonic()
+                while pending:
+                    self._collect(pending, checkpoint, relocated)
+        finally:
+            checkpoint.close()
+
+        self._remove_empty_folders(relocated, old_plan.path_is_prefix)
+
+        # Records are per path, so they only follow once every file has moved
+        log = get_provenance_log(self.resolver.output_dir, force=True)
+        if log is not None and relocated and not self._cancel.is_set():
+            log.relocate(relocated, old_plan.path_is_prefix)
+
+        with self._lock:
+            self.finished_at = time.time()
+            self.status = "cancelled" if self._cancel.is_set() else "done"
+        self._save_state()
+        return self.progress()
+
+    def _remove_empty_folders(self, relocated, path_is_prefix):
+        """Remove old layout folders the migration emptied (and empty parents)"""
+        output_dir = os.path.abspath(self.resolver.output_dir)
+        folders = set()
+        for old_path, _ in relocated:
+            folder = old_path.rpartition("/")[0] if path_is_prefix else old_path
+            if folder:
+                folders.add(os.path.abspath(os.path.join(output_dir, folder)))
+        # Deepest first, so parents are only tried once their children are gone
+        for folder in sorted(folders, key=len, reverse=True):
+            while folder != output_dir and folder.startswith(output_dir + os.sep):
+                try:
+                    os.rmdir(folder)
+                except OSError:
+                    break  # Not empty (or already gone)
+                folder = os.path.dirname(folder)
+
+    def _collect(self, pending, checkpoint, relocated):
+        """Record finished moves and append them to the checkpoint"""
+        finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in finished:
+            index, entry = pending.pop(future)
+            try:
+                outcome = future.result()
+            except OSError as e:
+                outcome = f"{entry['src']}: {e}"
+            if outcome == "conflict":
+                outcome = f"{entry['dst']} already exists"
+            elif outcome == "missing":
+                outcome = f"{entry['src']} is missing"
+            elif outcome == "outside":
+                outcome = f"{entry['src']} -> {entry['dst']} leaves the output directory"
+
+            if outcome in ("moved", "skipped"):
+                checkpoint.write(f"{index}\n")
+                relocated.add((entry["old_path"], entry["new_path"]))
+                with self._lock:
+                    if outcome == "moved":
+                        self.moved += 1
+                    else:
+                        self.skipped += 1
+                continue
+
+            # Failed files stay where they are; a resumed run retries them
+            logger.warning("FlowPath migration %s: %s", self.id, outcome)
+            with self._lock:
+                self.failed += 1
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append(outcome)
+
+    def start(self, execute=False, workers=DEFAULT_WORKERS, replan=True):
+        """
+        Plan and/or execute in a background thread.
+
+        Args:
+            execute: Run the moves after planning (False = dry run)
+            workers: Parallel renames
+            replan: Compute a new plan first (False resumes the stored one)
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise MigrationError(f"Migration {self.id} is already {self.status}")
+
+            def job():
+                try:
+                    if replan:
+                        self.plan()
+                    if execute:
+                        self.run(workers)
+                except Exception as e:
+                    logger.exception("FlowPath migration %s failed", self.id)
+                    with self._lock:
+                        self.status = "failed"
+                        self.errors.append(str(e))
+                    self._save_state()
+
+            self._thread = threading.Thread(target=job, name=f"flowpath-migration-{self.id}", daemon=True)
+            self._thread.start()
+
+    def cancel(self):
+        """Stop after the moves in flight; the job can be resumed"""
+        self._cancel.set()
+
+    def progress(self):
+        """
+        Job state for the progress endpoint.
+
+        Returns:
+            dict: Status, counts, rate and a sample of planned moves
+        """
+        with self._lock:
+            finished = self.moved + self.skipped + self.failed
+            elapsed = None
+            if self.started_at is not None:
+                elapsed = (self.finished_at or time.time()) - self.started_at
+            result = {
+                "job": self.id,
+                "status": self.status,
+                "source": self.source,
+                "total": self.total,
+                "moved": self.moved,
+                "skipped": self.skipped,
+                "conflicts": self.conflicts,
+                "failed": self.failed,
+                "remaining": max(0, self.total - finished),
+                "by_source": dict(self.by_source),
+                "elapsed": elapsed,
+                "rate": self.moved / elapsed if elapsed else None,
+                "errors": list(self.errors),
+            }
+        if result["status"] == "planned":
+            result["sample"] = self._sample()
+        return result
+
+    def _sample(self):
+        try:
+            with open(os.path.join(self.folder, "plan.jsonl"), "r", encoding="utf-8") as f:
+                return [
+                    {key: move[key] for key in ("src", "dst", "via")}
+                    for move, _ in zip(map(json.loads, f), range(SAMPLE_MOVES))
+                ]
+        except (OSError, ValueError):
+            return []
+
+    def _set_status(self, status):
+        with self._lock:
+            self.status = status
+        self._save_state()
+
+    def _save_state(self):
+        """Write job.json (parameters and counts) for resuming after a restart"""
+        with self._lock:
+            state = {
+                "id": self.id,
+                "old_widget_data": self.old_widget_data,
+                "new_widget_data": self.new_widget_data,
+                "source": self.source,
+                "status": self.status,
+                "total": self.total,
+                "conflicts": self.conflicts,
+                "by_source": self.by_source,
+                "created_at": self.created_at,
+            }
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            tmp_path = os.path.join(self.folder, "job.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, os.path.join(self.folder, "job.json"))
+        except OSError:
+            logger.warning("Failed to save FlowPath migration %s", self.id, exc_info=True)
+
+    @classmethod
+    def load(cls, resolver, job_id):
+        """
+        Job from its saved state (after a restart).
+
+        Raises:
+            MigrationError: If the job doesn't exist
+        """
+        if not job_id or not job_id.isalnum():
+            raise MigrationError("Invalid job id")
+        path = os.path.join(resolver.output_dir, JOBS_DIRNAME, job_id, "job.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            raise MigrationError(f"Unknown migration {job_id}")
+        job = cls(
+            resolver, job_id, state["old_widget_data"], state["new_widget_data"], state.get("source")
+        )
+        job.total = state.get("total", 0)
+        job.conflicts = state.get("conflicts", 0)
+        job.by_source = state.get("by_source", {})
+        job.created_at = state.get("created_at", job.created_at)
+        # A job that was running when the process stopped can be resumed
+        status = state.get("status", "created")
+        job.status = "interrupted" if status in ("running", "planning") else status
+        return job
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def create_job(resolver, old_widget_data, new_widget_data, source=None):
+    """New migration job (not started)"""
+    job = MigrationJob(resolver, uuid.uuid4().hex[:12], old_widget_data, new_widget_data, source)
+    # Fail early on layouts that can't be migrated
+    job._plans()
+    with _jobs_lock:
+        _jobs[job.id] = job
+    return job
+
+
+def get_job(resolver, job_id):
+    """
+    Running or saved migration job.
+
+    Raises:
+        MigrationError: If the job doesn't exist
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            job = MigrationJob.load(resolver, job_id)
+            _jobs[job_id] = job
+        return job
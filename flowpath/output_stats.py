@@ -0,0 +1,226 @@
+"""
+FlowPath Output Stats
+Per-folder file counts and sizes for the output tree, kept up to date by a
+background walker that only rescans folders whose mtime changed
+"""
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background refreshes of the output tree
+STATS_REFRESH_INTERVAL = 60.0
+
+# Weight of the latest refresh in the smoothed files-per-hour growth rate
+GROWTH_SMOOTHING = 0.5
+
+SORT_KEYS = {
+    "growth": lambda d: d["files_per_hour"],
+    "files": lambda d: d["total_files"],
+    "bytes": lambda d: d["total_bytes"],
+    "newest": lambda d: d["newest_mtime"],
+    "path": lambda d: d["path"],
+}
+
+
+class _DirStats:
+    """Aggregates for the files directly inside one folder"""
+
+    __slots__ = (
+        "mtime_ns",
+        "file_count",
+        "total_bytes",
+        "newest_mtime",
+        "subdirs",
+        "prev_count",
+        "prev_time",
+        "files_per_hour",
+    )
+
+    def __init__(self):
+        self.mtime_ns = None
+        self.file_count = 0
+        self.total_bytes = 0
+        self.newest_mtime = 0.0
+        self.subdirs = []
+        self.prev_count = None
+        self.prev_time = None
+        self.files_per_hour = 0.0
+
+
+class OutputTreeStats:
+    """
+    Cached per-directory statistics for everything under an output root.
+
+    Each refresh stats every known folder, but only calls os.scandir() on
+    folders whose mtime changed since the last refresh. Folders that vanished
+    are dropped from the cache.
+    """
+
+    def __init__(self, root, refresh_interval=STATS_REFRESH_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.refresh_interval = refresh_interval
+        self.updated_at = None
+        self.last_refresh_seconds = None
+        self.dirs_rescanned = 0
+        self._dirs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def refresh(self):
+        """Walk the output tree once, rescanning only changed folders"""
+        started = time.perf_counter()
+        now = time.time()
+        seen = set()
+        rescanned = 0
+        stack = [self.root]
+
+        while stack:
+            folder = stack.pop()
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(folder)
+
+            with self._lock:
+                stats = self._dirs.get(folder)
+            if stats is None:
+                stats = _DirStats()
+
+            if stats.mtime_ns != mtime_ns:
+                updated = self._scan_folder(folder, mtime_ns)
+                updated.prev_count = stats.prev_count
+                updated.prev_time = stats.prev_time
+                updated.files_per_hour = stats.files_per_hour
+                stats = updated
+                rescanned += 1
+                with self._lock:
+                    self._dirs[folder] = stats
+
+            # Smoothed growth rate since the previous refresh
+            if stats.prev_time is not None and now > stats.prev_time:
+                instant = (
+                    (stats.file_count - stats.prev_count) * 3600.0 / (now - stats.prev_time)
+                )
+                stats.files_per_hour = (
+                    GROWTH_SMOOTHING * instant
+                    + (1 - GROWTH_SMOOTHING) * stats.files_per_hour
+                )
+            stats.prev_count = stats.file_count
+            stats.prev_time = now
+
+            stack.extend(stats.subdirs)
+
+        with self._lock:
+            for folder in [f for f in self._dirs if f not in seen]:
+                del self._dirs[folder]
+            self.updated_at = now
+            self.last_refresh_seconds = time.perf_counter() - started
+            self.dirs_rescanned = rescanned
+
+    def _scan_folder(self, folder, mtime_ns):
+        """Scan the files directly inside one folder"""
+        stats = _DirStats()
+        stats.mtime_ns = mtime_ns
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stats.subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            stats.file_count += 1
+                            stats.total_bytes += st.st_size
+                            if st.st_mtime > stats.newest_mtime:
+                                stats.newest_mtime = st.st_mtime
+                    except OSError:
+                        continue
+        except OSError:
+            logger.debug("Cannot scan %s", folder)
+        return stats
+
+    def snapshot(self, prefix="", sort="growth", limit=100):
+        """
+        Per-folder aggregates from the cache (no filesystem access).
+
+        Args:
+            prefix: Only include folders under this path (relative to root)
+            sort: One of SORT_KEYS (descending, except "path")
+            limit: Maximum number of folders returned
+
+        Returns:
+            list: Dicts with path, files, bytes, total_files, total_bytes,
+                  newest_mtime and files_per_hour
+        """
+        with self._lock:
+            dirs = dict(self._dirs)
+
+        # Recursive totals, children before parents
+        totals = {}
+        for folder in sorted(dirs, key=len, reverse=True):
+            stats = dirs[folder]
+            files, size, newest = stats.file_count, stats.total_bytes, stats.newest_mtime
+            for sub in stats.subdirs:
+                sub_total = totals.get(sub)
+                if sub_total:
+                    files += sub_total[0]
+                    size += sub_total[1]
+                    newest = max(newest, sub_total[2])
+            totals[folder] = (files, size, newest)
+
+        prefix = prefix.strip("/")
+        results = []
+        for folder, stats in dirs.items():
+            relative = os.path.relpath(folder, self.root).replace(os.sep, "/")
+            if relative == ".":
+                relative = ""
+            if prefix and relative != prefix and not relative.startswith(prefix + "/"):
+                continue
+            total_files, total_bytes, newest = totals[folder]
+            results.append(
+                {
+                    "path": relative,
+                    "files": stats.file_count,
+                    "bytes": stats.total_bytes,
+                    "total_files": total_files,
+                    "total_bytes": total_bytes,
+                    "newest_mtime": newest,
+                    "files_per_hour": round(stats.files_per_hour, 2),
+                }
+            )
+
+        key = SORT_KEYS.get(sort, SORT_KEYS["growth"])
+        results.sort(key=key, reverse=sort != "path")
+        return results[:limit]
+
+    def start(self):
+        """Start the background refresh thread (no-op if already running)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="flowpath-stats", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Output stats refresh failed")
+            self._stop.wait(self.refresh_interval)
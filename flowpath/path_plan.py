@@ -0,0 +1,343 @@
+"""
+FlowPath Path Plans
+Parses widget_data once into a reusable plan of prebound segment resolvers
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from .sharding import ShardSpec
+from .templates import compile_template, format_date
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of compiled plans kept in memory
+PATH_PLAN_CACHE_SIZE = 128
+
+_SEPARATORS_RE = re.compile(r"[\\/]")
+
+
+def _raw_value(key, default):
+    """Segment that always adds the config value (dropdown values, sanitized
+    because clients can send anything)"""
+
+    def resolve(segment, config, now, sanitize):
+        value = sanitize(str(config.get(key, default)).strip())
+        return [value] if value else []
+
+    return resolve
+
+
+def _text_value(key):
+    """Segment that adds the sanitized config value if it is not empty"""
+
+    def resolve(segment, config, now, sanitize):
+        value = str(config.get(key, "")).strip()
+        return [sanitize(value)] if value else []
+
+    return resolve
+
+
+def _date_segment(segment, config, now, sanitize):
+    # Invalid date formats fall back to YYYY-MM-DD. Formats like %Y/%m may
+    # nest folders, but never climb out of the output dir or start at the root
+    value = format_date(now, config)
+    return [part for part in _SEPARATORS_RE.split(value) if part not in ("", ".", "..")]
+
+
+def _lora_segment(segment, config, now, sanitize):
+    value = config.get("lora_name", "")
+    parts = []
+
+    # Handle different value types
+    if isinstance(value, list):
+        # Separate folders mode - add each LoRA as a separate path part
+        for lora in value:
+            lora_str = str(lora).strip()
+            if lora_str:
+                parts.append(sanitize(lora_str))
+    elif isinstance(value, str):
+        # Check for pipe-delimited format (separate mode stored as string)
+        if " | " in value:
+            # Split and add each as separate folder
+            for lora in value.split(" | "):
+                lora_str = lora.strip()
+                if lora_str:
+                    parts.append(sanitize(lora_str))
+        else:
+            # Single string value (all other modes)
+            value_str = value.strip()
+            if value_str:
+                parts.append(sanitize(value_str))
+    else:
+        # Fallback: try to convert to string
+        value_str = str(value).strip()
+        if value_str:
+            parts.append(sanitize(value_str))
+
+    return parts
+
+
+def _custom_segment(segment, config, now, sanitize):
+    value = segment.get("value", "").strip()
+    if not value:
+        return []
+    # Support template variables in custom segments
+    processed_value = compile_template(value).render(config, now)
+    if processed_value and processed_value.strip():
+        return [sanitize(processed_value)]
+    return []
+
+
+# Segment type -> resolver(segment, config, now, sanitize) -> list of path parts
+SEGMENT_RESOLVERS = {
+    "label": _text_value("node_label"),
+    "file_type": _raw_value("file_type", "Image"),
+    "project": _text_value("project_name"),
+    "category": _raw_value("category", "Characters"),
+    "name": _text_value("name"),
+    # Always add content rating (SFW or NSFW)
+    "content_rating": _raw_value("content_rating", "SFW"),
+    "date": _date_segment,
+    "series": _text_value("series_name"),
+    "resolution": _text_value("resolution"),
+    "model": _text_value("model_name"),
+    "seed": _text_value("seed"),
+    "lora": _lora_segment,
+    "custom": _custom_segment,
+}
+
+
+class PathPlan:
+    """
+    Compiled form of one widget_data string.
+
+    Segments that only depend on the static config are resolved once at
+    compile time; only seed, date and counter work is left for each run.
+
+    Attributes:
+        key: Hash of the widget_data string
+        config: Parsed config (treat as read-only, copy before changing)
+        filename_template: CompiledTemplate or None
+        uses_seed: True if any segment or template needs the detected seed
+        uses_date: True if any segment or template needs the current time
+        uses_counter: True if the filename contains {counter}
+        shard: ShardSpec if a shard segment is enabled, else None
+        path_is_prefix: True in SI mode, where the last path part is the
+                        Save Image filename prefix rather than a folder
+        preset_ref: (preset id, version) the segments came from, if the
+                    widget_data only referenced a stored preset
+    """
+
+    def __init__(self, data, key, sanitize):
+        self.key = key
+        self.preset_ref = None
+        segments = data.get("segments", [])
+        self.config = data.get("config", {})
+
+        # Each step is either a tuple of static path parts or a
+        # prebound resolver fn(config, now) -> list of path parts
+        self._steps = []
+        self.uses_seed = False
+        self.uses_date = False
+        self.shard = None
+
+        for segment in segments:
+            # Skip disabled segments
+            if not segment.get("enabled", True):
+                continue
+
+            seg_type = segment.get("type", "")
+            if seg_type == "shard":
+                # Bucket folder is always innermost, added after the counter is known
+                self.shard = ShardSpec.from_config(self.config)
+                continue
+
+            resolver = SEGMENT_RESOLVERS.get(seg_type)
+            if resolver is None:
+                continue
+
+            is_dynamic = seg_type in ("seed", "date")
+            if seg_type == "custom":
+                template = compile_template(segment.get("value", "").strip())
+                is_dynamic = "seed" in template.variables or template.uses_date
+                self.uses_seed = self.uses_seed or "seed" in template.variables
+                self.uses_date = self.uses_date or template.uses_date
+            elif seg_type == "seed":
+                self.uses_seed = True
+            elif seg_type == "date":
+                self.uses_date = True
+
+            if is_dynamic:
+                self._steps.append(partial(resolver, segment, sanitize=sanitize))
+            else:
+                static_parts = tuple(resolver(segment, self.config, None, sanitize))
+                if self._steps and isinstance(self._steps[-1], tuple):
+                    self._steps[-1] += static_parts
+                elif static_parts:
+                    self._steps.append(static_parts)
+
+        # Default depends on output mode:
+        # SI mode (saveImage): "ComfyUI" becomes filename prefix
+        # IS mode (imageSaver): empty string (uses output folder directly)
+        output_mode = self.config.get("output_mode", "saveImage")
+        self.default_path = "ComfyUI" if output_mode == "saveImage" else ""
+        self.path_is_prefix = output_mode == "saveImage"
+
+        # Build filename from template (for Image Saver compatibility)
+        # Supports FlowPath vars {name}, {counter} and Image Saver pass-through vars %seed
+        filename_template = self.config.get("filename_template", "")
+        if filename_template:
+            self.filename_template = compile_template(filename_template)
+            self.uses_seed = self.uses_seed or "seed" in self.filename_template.variables
+            self.uses_date = self.uses_date or self.filename_template.uses_date
+            self.uses_counter = self.filename_template.uses_counter
+        else:
+            self.filename_template = None
+            self.uses_counter = False
+
+    def build_folder(self, config, now):
+        """
+        Resolve the folder path for one run.
+
+        Args:
+            config: Config for this run (plan config plus detected seed)
+            now: datetime snapshot for this run
+
+        Returns:
+            str: Folder path joined with the OS separator
+        """
+        path_parts = []
+        for step in self._steps:
+            if isinstance(step, tuple):
+                path_parts.extend(step)
+            else:
+                path_parts.extend(step(config, now))
+
+        # Join all parts with OS-appropriate separator
+        if path_parts:
+            return os.path.join(*path_parts)
+        return self.default_path
+
+    def render_filename(self, config, now):
+        """
+        Render the filename template for one run ({counter} left in place).
+
+        Returns:
+            str: Rendered filename, or "" if no filename template is set
+        """
+        if self.filename_template is None:
+            return ""
+        return self.filename_template.render(config, now)
+
+
+_plan_cache = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def widget_data_key(widget_data):
+    """Hash a widget_data string for plan caching"""
+    return hashlib.blake2b(widget_data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def expand_preset_ref(data, presets):
+    """
+    Fill in segments and config of widget_data that only references a preset.
+
+    widget_data of the form {"preset": {"id": ..., "version": ...}, "config": {...}}
+    takes its segments from the stored preset; its own config values override
+    the preset's. A version that is no longer stored falls back to the
+    current one, with a warning (the preset was edited after the node was
+    configured).
+
+    Args:
+        data: Parsed widget_data without "segments"
+        presets: PresetStore
+
+    Returns:
+        tuple: (expanded data, (preset id, version)) or (data, None) if the
+        reference can't be resolved
+    """
+    ref = data.get("preset")
+    if not isinstance(ref, dict) or not isinstance(ref.get("id"), str):
+        return data, None
+    preset = presets.get(ref["id"], ref.get("version"))
+    if preset is None:
+        preset = presets.get(ref["id"])
+        if preset is None:
+            logger.warning("FlowPath preset %r not found", ref["id"])
+            return data, None
+        logger.warning(
+            "FlowPath preset %r version %r is no longer stored, using version %r",
+            ref["id"], ref.get("version"), preset.get("version"),
+        )
+    config = dict(preset.get("config", {}))
+    own_config = data.get("config")
+    if isinstance(own_config, dict):
+        config.update(own_config)
+    expanded = dict(data, segments=preset.get("segments", []), config=config)
+    return expanded, (ref["id"], preset.get("version"))
+
+
+def _preset_is_current(plan, presets):
+    """Check that a preset-backed plan was compiled from the stored version"""
+    if plan.preset_ref is None or presets is None:
+        return True
+    preset_id, version = plan.preset_ref
+    return presets.get(preset_id, version) is not None
+
+
+def get_path_plan(widget_data, sanitize, presets=None):
+    """
+    Get the compiled plan for a widget_data string (cached by hash).
+
+    Args:
+        widget_data: JSON string from frontend widget
+        sanitize: Folder name sanitizer used for static segments
+        presets: PresetStore for widget_data that references a preset
+                 instead of carrying segments (optional)
+
+    Returns:
+        PathPlan or None: None if widget_data is not a valid JSON object
+    """
+    key = widget_data_key(widget_data)
+
+    with _plan_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None and _preset_is_current(plan, presets):
+            _plan_cache.move_to_end(key)
+            return plan
+
+    try:
+        data = json.loads(widget_data)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    preset_ref = None
+    plan_key = key
+    if "segments" not in data and presets is not None:
+        data, preset_ref = expand_preset_ref(data, presets)
+        if preset_ref is not None:
+            # Fingerprints change when the preset is edited
+            plan_key = widget_data_key(f"{widget_data}\0{preset_ref[0]}\0{preset_ref[1]}")
+
+    plan = PathPlan(data, plan_key, sanitize)
+    plan.preset_ref = preset_ref
+    if preset_ref is None and "segments" not in data and "preset" in data:
+        # Unknown preset - don't cache, it may be saved later
+        return plan
+
+    with _plan_lock:
+        _plan_cache[key] = plan
+        while len(_plan_cache) > PATH_PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+    return plan
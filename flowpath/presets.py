@@ -0,0 +1,207 @@
+"""
+FlowPath Preset Store
+Server-side preset library shared by all FlowPath nodes and browser sessions
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Same limit as the widget's preset name dialog (with some headroom)
+MAX_PRESET_NAME_LENGTH = 100
+
+# Upper bound on the library size (one request can't grow it unboundedly)
+MAX_PRESETS = 1000
+
+
+def validate_preset(name, preset):
+    """
+    Check a preset's structure (mirrors the widget's isValidPresetObject).
+
+    Raises:
+        ValueError: If the name or preset is invalid
+    """
+    if not isinstance(name, str) or not name.strip() or len(name) > MAX_PRESET_NAME_LENGTH:
+        raise ValueError(f"Invalid preset name: {name!r}")
+    if not isinstance(preset, dict):
+        raise ValueError(f"Preset {name!r} must be an object")
+    if not isinstance(preset.get("segments", []), list):
+        raise ValueError(f"Preset {name!r} has invalid segments")
+    if not isinstance(preset.get("config", {}), dict):
+        raise ValueError(f"Preset {name!r} has invalid config")
+
+
+class PresetStore:
+    """
+    Preset library kept in one JSON file.
+
+    Every preset carries a version that increases on each save. Widget data
+    references a preset by id (name) and version instead of embedding the
+    whole library. The serialized library and its ETag are cached, so bulk
+    fetches are served without re-encoding and unchanged libraries cost a
+    304.
+
+    Deleted presets leave a tombstone (name -> deletion time) in the
+    library, so browsers that still have a copy drop it instead of
+    uploading it again.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: JSON file holding the library (created on first save)
+        """
+        self.path = path
+        self._presets = {}
+        self._deleted = {}
+        self._lock = threading.Lock()
+        self._body = None
+        self._etag = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError):
+            logger.warning("Failed to read FlowPath presets from %s", self.path, exc_info=True)
+            data = {}
+
+        presets = data.get("presets", {}) if isinstance(data, dict) else {}
+        for name, preset in presets.items():
+            try:
+                validate_preset(name, preset)
+            except ValueError:
+                logger.warning("Skipping invalid FlowPath preset %r", name)
+                continue
+            preset.setdefault("version", 1)
+            self._presets[name] = preset
+        deleted = data.get("deleted", {}) if isinstance(data, dict) else {}
+        if isinstance(deleted, dict):
+            self._deleted = {
+                name: deleted_at
+                for name, deleted_at in deleted.items()
+                if isinstance(deleted_at, (int, float)) and name not in self._presets
+            }
+        self._body, self._etag = self._encode(self._presets, self._deleted)
+
+    @staticmethod
+    def _encode(presets, deleted):
+        """Serialize a library and derive its ETag"""
+        body = json.dumps(
+            {"presets": presets, "deleted": deleted}, sort_keys=True, separators=(",", ":")
+        ).encode("utf-8")
+        return body, '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+    def _save(self, body):
+        """Write the library atomically (lock held)"""
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, self.path)
+
+    def snapshot(self):
+        """
+        Serialized library for bulk fetches.
+
+        Returns:
+            tuple: (etag, body bytes)
+        """
+        with self._lock:
+            return self._etag, self._body
+
+    def get(self, preset_id, version=None):
+        """
+        Look up one preset.
+
+        Args:
+            preset_id: Preset name
+            version: Required version, or None for the current one
+
+        Returns:
+            dict or None: The preset, or None if unknown or the version differs
+        """
+        with self._lock:
+            preset = self._presets.get(preset_id)
+        if preset is None or (version is not None and preset.get("version") != version):
+            return None
+        return preset
+
+    def apply(self, upsert=None, delete=None, skip_deleted=False):
+        """
+        Save and delete presets in one write.
+
+        Args:
+            upsert: Mapping of name -> preset ({segments, config}) to save
+            delete: Names to remove
+            skip_deleted: Ignore upserts of deleted presets (background sync
+                          of presets a browser kept locally)
+
+        Returns:
+            dict: name -> new version for every saved preset
+
+        Raises:
+            ValueError: If a preset is invalid or the library would grow too large
+        """
+        upsert = upsert or {}
+        delete = delete or []
+        for name, preset in upsert.items():
+            validate_preset(name, preset)
+
+        with self._lock:
+            presets = dict(self._presets)
+            deleted = dict(self._deleted)
+            now = time.time()
+            for name in delete:
+                presets.pop(name, None)
+                deleted[name] = now
+            versions = {}
+            for name, preset in upsert.items():
+                if skip_deleted and name in deleted:
+                    continue
+                deleted.pop(name, None)
+                previous = presets.get(name)
+                version = previous.get("version", 1) + 1 if previous else 1
+                presets[name] = {
+                    "segments": preset.get("segments", []),
+                    "config": preset.get("config", {}),
+                    "version": version,
+                    "updated_at": now,
+                }
+                versions[name] = version
+            if len(presets) > MAX_PRESETS:
+                raise ValueError(f"Too many presets (max {MAX_PRESETS})")
+            if len(deleted) > MAX_PRESETS:
+                # Oldest tombstones go first
+                newest = sorted(deleted.items(), key=lambda item: item[1])[-MAX_PRESETS:]
+                deleted = dict(newest)
+
+            body, etag = self._encode(presets, deleted)
+            # Only switch over once the file is written
+            self._save(body)
+            self._presets, self._deleted = presets, deleted
+            self._body, self._etag = body, etag
+            return versions
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_preset_store(path):
+    """Shared store for a library file"""
+    key = os.path.normcase(os.path.abspath(path))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = PresetStore(path)
+        return _stores[key]
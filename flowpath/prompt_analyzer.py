@@ -0,0 +1,361 @@
+"""
+FlowPath Prompt Analyzer
+Indexes a workflow prompt in one pass and follows links to find the seed,
+model, LoRAs and resolution that feed a specific FlowPath node's output
+"""
+
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+# Seed sources, in priority order (substring match on class_type)
+SEED_GENERATOR_TYPES = ("Seed Generator",)  # ComfyUI-Image-Saver
+# Noise generator nodes (for SamplerCustomAdvanced workflows)
+NOISE_GENERATOR_TYPES = ("RandomNoise", "DisableNoise")
+SAMPLER_TYPES = (
+    "KSampler",
+    "KSamplerAdvanced",
+    "SamplerCustom",
+    "KSampler (Efficient)",
+    "SamplerCustomAdvanced",
+)
+
+# Seed priority -> input name holding the seed
+SEED_INPUTS = {0: "seed", 1: "noise_seed", 2: "seed"}
+
+# Inputs checked when a seed input is linked to another node
+LINKED_SEED_INPUTS = ("seed", "noise_seed", "value", "int", "number")
+
+CHECKPOINT_TYPES = frozenset(
+    {
+        "CheckpointLoaderSimple",
+        "CheckpointLoader",
+        "UNETLoader",
+        "CheckpointLoaderNF4",
+        "Checkpoint Loader with Name (Image Saver)",  # comfy-image-saver custom node
+    }
+)
+MODEL_INPUTS = ("ckpt_name", "unet_name", "model_name")
+
+LORA_TYPES = (
+    "LoraLoader",
+    "LoraLoaderModelOnly",
+    "LoRA Stacker",
+    "Power Lora Loader (rgthree)",
+)
+
+LATENT_TYPES = frozenset({"EmptyLatentImage", "LatentUpscale", "LatentUpscaleBy"})
+
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".bin")
+
+# Analyses kept for recent prompts (several FlowPath nodes share one prompt)
+ANALYSIS_CACHE_SIZE = 8
+
+# Guard against cycles in linked seed inputs
+MAX_LINK_DEPTH = 8
+
+
+@lru_cache(maxsize=1024)
+def seed_priority(class_type):
+    """
+    Classify a node type as a seed source.
+
+    Returns:
+        int or None: 0 = Seed Generator, 1 = noise generator, 2 = sampler
+    """
+    if any(gen_type in class_type for gen_type in SEED_GENERATOR_TYPES):
+        return 0
+    if any(noise_type in class_type for noise_type in NOISE_GENERATOR_TYPES):
+        return 1
+    if any(sampler_type in class_type for sampler_type in SAMPLER_TYPES):
+        return 2
+    return None
+
+
+@lru_cache(maxsize=1024)
+def is_lora_type(class_type):
+    return any(lora_type in class_type for lora_type in LORA_TYPES)
+
+
+def is_link(value):
+    """Prompt inputs linked to another node are [node_id, output_index]"""
+    return (
+        isinstance(value, (list, tuple))
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and isinstance(value[1], int)
+    )
+
+
+def clean_model_name(name):
+    """Strip folders and model file extension (same as the widget's detection)"""
+    name = str(name).replace("\\", "/").rsplit("/", 1)[-1]
+    lower = name.lower()
+    for ext in MODEL_EXTENSIONS:
+        if lower.endswith(ext):
+            return name[: -len(ext)]
+    return name
+
+
+class PromptAnalysis:
+    """
+    One-pass index of a workflow prompt.
+
+    The single loop over the prompt indexes node classes, link consumers and
+    seed candidates, and extracts the model, LoRAs and resolution of every
+    loader and latent node. Branch lookups (seed_for, metadata_for) only
+    follow links through that index and are cached per FlowPath node.
+
+    Attributes:
+        by_class: class_type -> list of node ids
+        consumers: node id -> list of node ids that take one of its outputs
+        seed: Workflow-wide seed (same priority rules as before link-following)
+        model: First checkpoint/UNET name in the workflow, or None
+        loras: Every LoRA in the workflow, in prompt order
+        resolution: First "WxH" latent size in the workflow, or None
+    """
+
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.by_class = {}
+        self.consumers = {}
+        self.seed = None
+        self.model = None
+        self.loras = []
+        self.resolution = None
+        # node id -> (model, loras, resolution) of loader and latent nodes
+        self._node_metadata = {}
+        self._seed_cache = {}
+        self._metadata_cache = {}
+
+        seed_candidates = []
+        seen_loras = set()
+
+        for node_id, node_data in prompt.items():
+            if not isinstance(node_data, dict):
+                continue
+            class_type = node_data.get("class_type", "")
+            inputs = node_data.get("inputs", {})
+            self.by_class.setdefault(class_type, []).append(node_id)
+
+            for value in inputs.values():
+                if is_link(value):
+                    self.consumers.setdefault(value[0], []).append(node_id)
+
+            priority = seed_priority(class_type)
+            if priority is not None and inputs.get(SEED_INPUTS[priority]) is not None:
+                seed_candidates.append((priority, node_id))
+
+            if (
+                class_type in CHECKPOINT_TYPES
+                or class_type in LATENT_TYPES
+                or is_lora_type(class_type)
+            ):
+                self._index_metadata(node_id, class_type, inputs, seen_loras)
+
+        if seed_candidates:
+            # Sort by priority (0 = highest), then by node_id (earliest first)
+            seed_candidates.sort()
+            priority, node_id = seed_candidates[0]
+            self.seed = self._seed_of(node_id, priority)
+
+    # --- Per-node extraction -------------------------------------------------
+
+    def _index_metadata(self, node_id, class_type, inputs, seen_loras):
+        """Record a loader/latent node's values for its branch and the workflow"""
+        model = self._model_of(class_type, inputs)
+        resolution = self._resolution_of(class_type, inputs)
+        loras = self._loras_of(class_type, inputs)
+        if model is None and resolution is None and not loras:
+            return
+        self._node_metadata[node_id] = (model, loras, resolution)
+        if self.model is None:
+            self.model = model
+        if self.resolution is None:
+            self.resolution = resolution
+        for lora in loras:
+            if lora not in seen_loras:
+                seen_loras.add(lora)
+                self.loras.append(lora)
+
+    def _resolve(self, value, depth=0):
+        """Follow a linked input to the value on the source node"""
+        if not is_link(value):
+            return value
+        if depth >= MAX_LINK_DEPTH:
+            return None
+        source = self.prompt.get(value[0])
+        if not isinstance(source, dict):
+            return None
+        source_inputs = source.get("inputs", {})
+        for name in LINKED_SEED_INPUTS:
+            if source_inputs.get(name) is not None:
+                return self._resolve(source_inputs[name], depth + 1)
+        return None
+
+    def _seed_of(self, node_id, priority):
+        seed = self._resolve(self.prompt[node_id].get("inputs", {}).get(SEED_INPUTS[priority]))
+        if isinstance(seed, (list, tuple)):
+            seed = seed[0] if seed else None
+        try:
+            seed = int(seed)
+        except (ValueError, TypeError):
+            pass
+        return seed
+
+    @staticmethod
+    def _model_of(class_type, inputs):
+        if class_type not in CHECKPOINT_TYPES:
+            return None
+        for name in MODEL_INPUTS:
+            value = inputs.get(name)
+            if isinstance(value, str) and value:
+                return clean_model_name(value)
+        return None
+
+    @staticmethod
+    def _resolution_of(class_type, inputs):
+        if class_type not in LATENT_TYPES:
+            return None
+        width, height = inputs.get("width"), inputs.get("height")
+        if isinstance(width, int) and isinstance(height, int):
+            return f"{width}x{height}"
+        return None
+
+    @staticmethod
+    def _loras_of(class_type, inputs):
+        if not is_lora_type(class_type):
+            return []
+        loras = []
+        for name, value in inputs.items():
+            if "lora" not in name.lower():
+                continue
+            # Power Lora Loader stores {"on": bool, "lora": name, ...}
+            if isinstance(value, dict):
+                if not value.get("on", True):
+                    continue
+                value = value.get("lora")
+            if isinstance(value, str) and value and value != "None":
+                loras.append(clean_model_name(value))
+        return loras
+
+    # --- Branch-aware lookups ------------------------------------------------
+
+    def _upstream(self, node_id):
+        """
+        Nodes feeding the consumers of a FlowPath node's outputs, nearest
+        first (breadth-first from every consumer, so the nearest sampler
+        wins in multi-sampler graphs).
+
+        Yields:
+            tuple: (class_type, inputs, node id)
+        """
+        consumers = self.consumers.get(node_id, ())
+        queue = deque(consumers)
+        visited = {node_id}
+        visited.update(consumers)
+
+        while queue:
+            current = queue.popleft()
+            node_data = self.prompt.get(current)
+            if not isinstance(node_data, dict):
+                continue
+            inputs = node_data.get("inputs", {})
+            yield node_data.get("class_type", ""), inputs, current
+
+            for value in inputs.values():
+                if is_link(value) and value[0] not in visited:
+                    visited.add(value[0])
+                    queue.append(value[0])
+
+    def seed_for(self, node_id=None):
+        """
+        Seed for a FlowPath node: the seed feeding its branch if known,
+        otherwise the workflow-wide seed.
+        """
+        if node_id is None:
+            return self.seed
+        node_id = str(node_id)
+        if node_id not in self._seed_cache:
+            seed = None
+            # Stops at the nearest seed source
+            for class_type, inputs, current in self._upstream(node_id):
+                priority = seed_priority(class_type)
+                if priority is not None and inputs.get(SEED_INPUTS[priority]) is not None:
+                    seed = self._seed_of(current, priority)
+                    break
+            self._seed_cache[node_id] = seed
+        seed = self._seed_cache[node_id]
+        return self.seed if seed is None else seed
+
+    def metadata_for(self, node_id=None):
+        """
+        Model, LoRAs and resolution that feed a FlowPath node. Values its
+        branch doesn't have come from the whole workflow.
+
+        Args:
+            node_id: FlowPath node id (UNIQUE_ID), or None for the workflow
+
+        Returns:
+            dict: {"model", "loras", "resolution"} (model/resolution may be None)
+        """
+        workflow = {"model": self.model, "loras": self.loras, "resolution": self.resolution}
+        if node_id is None:
+            return workflow
+
+        node_id = str(node_id)
+        if node_id not in self._metadata_cache:
+            branch = {"model": None, "loras": [], "resolution": None}
+            seen_loras = set()
+            for _, _, current in self._upstream(node_id):
+                metadata = self._node_metadata.get(current)
+                if metadata is None:
+                    continue
+                model, loras, resolution = metadata
+                if branch["model"] is None:
+                    branch["model"] = model
+                if branch["resolution"] is None:
+                    branch["resolution"] = resolution
+                for lora in loras:
+                    if lora not in seen_loras:
+                        seen_loras.add(lora)
+                        branch["loras"].append(lora)
+            self._metadata_cache[node_id] = {
+                key: branch[key] or workflow[key] for key in branch
+            }
+        return self._metadata_cache[node_id]
+
+
+_analysis_cache = OrderedDict()
+_analysis_lock = threading.Lock()
+
+
+def analyze_prompt(prompt):
+    """
+    Analyze a prompt, memoized by prompt identity.
+
+    Args:
+        prompt: Workflow prompt dictionary
+
+    Returns:
+        PromptAnalysis or None: None for an empty prompt
+    """
+    if not prompt or not isinstance(prompt, dict):
+        return None
+
+    key = id(prompt)
+    with _analysis_lock:
+        cached = _analysis_cache.get(key)
+        # Identity check guards against id() reuse after garbage collection
+        if cached is not None and cached.prompt is prompt:
+            _analysis_cache.move_to_end(key)
+            return cached
+
+    analysis = PromptAnalysis(prompt)
+
+    with _analysis_lock:
+        _analysis_cache[key] = analysis
+        while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+    return analysis
@@ -0,0 +1,342 @@
+"""
+FlowPath Provenance Log
+Indexed record of every issued path and the seed/model/LoRAs behind it
+"""
+
+import os
+import time
+import atexit
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: set FLOWPATH_PROVENANCE=1 to record every path FlowPath hands out
+PROVENANCE_ENABLED = os.environ.get("FLOWPATH_PROVENANCE", "0") == "1"
+
+# Database kept in the output directory
+PROVENANCE_FILENAME = ".flowpath_provenance.sqlite3"
+
+# Oldest records are dropped beyond this many rows
+MAX_RECORDS = int(os.environ.get("FLOWPATH_PROVENANCE_MAX_RECORDS", "5000000"))
+
+# Seconds between write-behind flushes
+FLUSH_INTERVAL_SECONDS = 2.0
+
+MAX_QUERY_LIMIT = 1000
+
+COLUMNS = (
+    "created_at",
+    "path",
+    "filename",
+    "folder",
+    "prefix",
+    "counter",
+    "seed",
+    "model",
+    "loras",
+    "resolution",
+    "node_id",
+)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        path TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        folder TEXT NOT NULL,
+        prefix TEXT NOT NULL,
+        counter INTEGER,
+        seed TEXT,
+        model TEXT,
+        loras TEXT,
+        resolution TEXT,
+        node_id TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS records_folder ON records (folder, created_at)",
+    "CREATE INDEX IF NOT EXISTS records_seed ON records (seed, created_at)",
+    "CREATE INDEX IF NOT EXISTS records_model ON records (model, created_at)",
+    "CREATE INDEX IF NOT EXISTS records_created ON records (created_at)",
+)
+
+
+def _normalize(path):
+    return path.replace("\\", "/").strip("/")
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ProvenanceLog:
+    """
+    SQLite log mapping issued paths to their generation metadata.
+
+    Records are buffered and written by a background thread, so build_path
+    never waits on the disk. Queries flush the buffer first.
+
+    Each record keeps the folder files are saved in and the prefix their
+    names start with (the filename in IS mode, the Save Image filename
+    prefix in SI mode). A saved file is traced back to the newest record
+    for its folder whose prefix it starts with.
+    """
+
+    def __init__(self, output_dir, flush_interval=FLUSH_INTERVAL_SECONDS, max_records=MAX_RECORDS):
+        """
+        Args:
+            output_dir: Output directory the logged paths are relative to
+            flush_interval: Seconds between write-behind flushes
+            max_records: Oldest records are pruned beyond this count
+        """
+        self.path = os.path.join(output_dir, PROVENANCE_FILENAME)
+        self.flush_interval = flush_interval
+        self.max_records = max_records
+        self._pending = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flushes = 0
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        try:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass  # e.g. network filesystems without shared memory support
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="flowpath-provenance", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, path, filename, path_is_prefix, counter=None, seed=None,
+               model=None, loras=None, resolution=None, node_id=None):
+        """
+        Queue one issued path.
+
+        Args:
+            path: Issued path (relative to the output dir)
+            filename: Issued filename ("" if the node has no filename template)
+            path_is_prefix: True in SI mode (last path part is the filename prefix)
+            counter: {counter} value, if used
+            seed, model, resolution: Generation metadata
+            loras: LoRA name(s) as in the widget config (list or " | " string)
+            node_id: FlowPath node id
+        """
+        path = _normalize(path)
+        if path_is_prefix:
+            folder, _, prefix = path.rpartition("/")
+        else:
+            folder, prefix = path, filename
+        if isinstance(loras, (list, tuple)):
+            # Same form as the widget's separate-folders mode, so the
+            # recorded value renders the same lora segment again
+            loras = " | ".join(str(lora) for lora in loras)
+        row = (
+            time.time(),
+            path,
+            filename,
+            folder,
+            prefix or "",
+            counter,
+            None if seed is None else str(seed),
+            model or None,
+            loras or None,
+            resolution or None,
+            None if node_id is None else str(node_id),
+        )
+        with self._lock:
+            self._pending.append(row)
+
+    def flush(self):
+        """Write queued records in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            with self._db_lock:
+                with self._db:
+                    self._db.executemany(
+                        f"INSERT INTO records ({', '.join(COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                        pending,
+                    )
+                self._flushes += 1
+                if self._flushes % 100 == 0:
+                    self._prune()
+        except sqlite3.Error:
+            logger.warning("FlowPath provenance flush failed", exc_info=True)
+
+    def _prune(self):
+        """Drop the oldest records beyond max_records (db lock held)"""
+        with self._db:
+            self._db.execute(
+                "DELETE FROM records WHERE id <= (SELECT MAX(id) FROM records) - ?",
+                (self.max_records,),
+            )
+
+    def query(self, path=None, file=None, seed=None, model=None, lora=None, limit=100):
+        """
+        Find records, newest first. All given filters must match.
+
+        Args:
+            path: Folder relative to the output dir (includes subfolders)
+            file: Saved file relative to the output dir - returns the record
+                  it was issued from
+            seed: Exact seed
+            model: Exact model name
+            lora: LoRA name contained in the record's LoRAs
+            limit: Maximum number of records
+
+        Returns:
+            list: Record dicts
+        """
+        self.flush()
+        where = []
+        params = []
+
+        if file is not None:
+            folder, _, name = _normalize(file).rpartition("/")
+            stem = name.rsplit(".", 1)[0] if "." in name else name
+            # Saved names are the prefix plus the saver's counter/suffix
+            where.append("folder = ? AND prefix != '' AND substr(?, 1, length(prefix)) = prefix")
+            params += [folder, stem]
+            try:
+                # The file can't predate the path it was saved under
+                mtime = os.path.getmtime(os.path.join(os.path.dirname(self.path), file))
+                where.append("created_at <= ?")
+                params.append(mtime + 1)
+            except OSError:
+                pass
+            limit = 1
+        if path is not None:
+            folder = _normalize(path)
+            if folder:
+                # The folder and everything below it ("/" sorts just before "0")
+                where.append("folder >= ? AND folder < ? AND (folder = ? OR folder >= ?)")
+                params += [folder, folder + "0", folder, folder + "/"]
+        if seed is not None:
+            where.append("seed = ?")
+            params.append(str(seed))
+        if model is not None:
+            where.append("model = ?")
+            params.append(model)
+        if lora is not None:
+            where.append("loras LIKE ? ESCAPE '\\'")
+            params.append("%" + _escape_like(lora) + "%")
+
+        sql = "SELECT * FROM records"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # For files the longest matching prefix wins ("img_0001" over "img_")
+        order = "length(prefix) DESC, " if file is not None else ""
+        sql += f" ORDER BY {order}created_at DESC, id DESC LIMIT ?"
+        params.append(max(1, min(int(limit), MAX_QUERY_LIMIT)))
+
+        with self._db_lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [{key: row[key] for key in row.keys() if key != "id"} for row in rows]
+
+    def iter_records(self, batch_size=5000):
+        """
+        Yield every record, oldest first, in batches (for bulk jobs).
+
+        Yields:
+            dict: Record with its row id
+        """
+        self.flush()
+        last_id = 0
+        while True:
+            with self._db_lock:
+                rows = self._db.execute(
+                    "SELECT * FROM records WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last_id = rows[-1]["id"]
+
+    def relocate(self, moves, path_is_prefix):
+        """
+        Point records at the paths their files were moved to.
+
+        Args:
+            moves: Iterable of (old path, new path)
+            path_is_prefix: True in SI mode (the prefix changes with the path)
+        """
+        self.flush()
+        rows = []
+        for old_path, new_path in moves:
+            old_path, new_path = _normalize(old_path), _normalize(new_path)
+            if path_is_prefix:
+                folder, _, prefix = new_path.rpartition("/")
+                rows.append((new_path, folder, prefix, old_path))
+            else:
+                rows.append((new_path, new_path, old_path))
+        if path_is_prefix:
+            sql = "UPDATE records SET path = ?, folder = ?, prefix = ? WHERE path = ?"
+        else:
+            sql = "UPDATE records SET path = ?, folder = ? WHERE path = ?"
+        with self._db_lock:
+            with self._db:
+                self._db.executemany(sql, rows)
+
+    def close(self):
+        """Flush and close the database"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            if self._closed:
+                return
+            self.flush()
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_provenance_log(output_dir, force=False):
+    """
+    Shared log for an output directory.
+
+    Args:
+        output_dir: Output directory
+        force: Open an existing log even if FLOWPATH_PROVENANCE is not set
+               (lookups of what was recorded earlier)
+
+    Returns:
+        ProvenanceLog or None: None if disabled or the database can't be opened
+    """
+    if not PROVENANCE_ENABLED:
+        if not (force and os.path.exists(os.path.join(output_dir, PROVENANCE_FILENAME))):
+            return None
+    key = os.path.normcase(os.path.abspath(output_dir))
+    with _logs_lock:
+        if key not in _logs:
+            try:
+                _logs[key] = ProvenanceLog(output_dir)
+            except (OSError, sqlite3.Error):
+                logger.warning("FlowPath provenance log unavailable in %s", output_dir, exc_info=True)
+                _logs[key] = None
+        return _logs[key]
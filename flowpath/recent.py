@@ -0,0 +1,205 @@
+"""
+FlowPath Recent Outputs
+Bounded per-folder index of the newest files, revalidated by folder mtime
+"""
+
+import os
+import time
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Newest files kept per folder (the most a /flowpath/recent request can return)
+RECENT_INDEX_FILES = 200
+
+# Folders kept in the index, least recently used evicted first
+RECENT_INDEX_FOLDERS = 64
+
+# A changing folder is rescanned at most this often; polls in between get
+# the previous result (new files show up within this delay)
+RECENT_REFRESH_SECONDS = 2.0
+
+# Names remembered per indexed file, so a refresh only stat()s new files.
+# Folders with more matching files than max_files times this are refreshed
+# by stat()ing every file instead (memory stays bounded per folder).
+RECENT_INDEX_NAMES_PER_FILE = 20
+
+
+class _RecentEntry:
+    """Newest files of one (folder, prefix)"""
+
+    __slots__ = ("mtime_ns", "refreshed_at", "files", "names")
+
+    def __init__(self, mtime_ns, refreshed_at, files, names):
+        self.mtime_ns = mtime_ns
+        self.refreshed_at = refreshed_at
+        self.files = files
+        # Name -> inode of every matching file seen by the last scan, or None
+        # if the folder had too many
+        self.names = names
+
+
+def files_version(files):
+    """Version of a file list, from its names, sizes and mtimes (an ETag)"""
+    digest = hashlib.blake2b(digest_size=8)
+    for file in files:
+        digest.update(f"{file['name']}\0{file['size']}\0{file['mtime']!r}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RecentIndex:
+    """
+    Newest files per folder, for polling UIs.
+
+    Each folder is scanned once into a bounded list of its newest files
+    (heap of size RECENT_INDEX_FILES, so memory doesn't grow with the
+    folder). Later lookups cost one stat() while the folder is unchanged.
+    Changed folders are refreshed at most once per refresh interval: the
+    listing is streamed into the bounded heap again, but only new or
+    replaced files (new name or inode) and the indexed newest files are
+    stat()ed. Names are remembered for up to max_files *
+    RECENT_INDEX_NAMES_PER_FILE files per folder; larger folders stat()
+    every file on refresh. A full rescan is only needed when one of the
+    indexed files was deleted. Older files rewritten in place are not
+    noticed until the next full scan.
+    """
+
+    def __init__(
+        self,
+        max_files=RECENT_INDEX_FILES,
+        max_folders=RECENT_INDEX_FOLDERS,
+        refresh_seconds=RECENT_REFRESH_SECONDS,
+    ):
+        self.max_files = max_files
+        self.max_folders = max_folders
+        self.refresh_seconds = refresh_seconds
+        self.max_names = max_files * RECENT_INDEX_NAMES_PER_FILE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def recent(self, full_folder, limit=20, prefix=None):
+        """
+        Newest files in a folder.
+
+        Args:
+            full_folder: Absolute folder path
+            limit: Number of files (at most max_files)
+            prefix: Only files whose name starts with this (SI mode filename prefix)
+
+        Returns:
+            tuple: (files, version) - files are dicts with name, size and
+            mtime (newest first); version is derived from the returned
+            files, so it only changes when they do (usable as an ETag)
+
+        Raises:
+            OSError: If the folder can't be read
+        """
+        key = (os.path.normcase(os.path.abspath(full_folder)), prefix or "")
+        mtime_ns = os.stat(full_folder).st_mtime_ns
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry.mtime_ns == mtime_ns or now - entry.refreshed_at < self.refresh_seconds
+            ):
+                self._entries.move_to_end(key)
+                files = entry.files[:limit]
+                return files, files_version(files)
+
+        files, names = self._scan(full_folder, prefix, entry)
+
+        with self._lock:
+            self._entries[key] = _RecentEntry(mtime_ns, now, files, names)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_folders:
+                self._entries.popitem(last=False)
+        files = files[:limit]
+        return files, files_version(files)
+
+    def invalidate(self, full_folder=None):
+        """Drop cached folders (all, or one folder)"""
+        with self._lock:
+            if full_folder is None:
+                self._entries.clear()
+                return
+            folder_key = os.path.normcase(os.path.abspath(full_folder))
+            for key in [k for k in self._entries if k[0] == folder_key]:
+                del self._entries[key]
+
+    def _scan(self, full_folder, prefix, previous=None):
+        """
+        Newest max_files files of a folder, newest first.
+
+        With a previous entry that kept its names, only files that are new
+        or replaced since then and the previously newest files are stat()ed.
+        The listing is streamed; nothing but the heap and the remembered
+        names is kept.
+
+        Returns:
+            tuple: (files, {name: inode} or None)
+        """
+        known = previous.names if previous is not None else None
+        indexed = set()
+        if known is not None:
+            indexed = {file["name"] for file in previous.files}
+        seen_indexed = 0
+        newest = []  # min-heap of (mtime_ns, name, size)
+        names = {}
+
+        with os.scandir(full_folder) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or (prefix and not name.startswith(prefix)):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                inode = _inode(entry)
+                if names is not None:
+                    if len(names) < self.max_names:
+                        names[name] = inode
+                    else:
+                        names = None
+
+                if name in indexed:
+                    seen_indexed += 1
+                elif known is not None and name in known and known[name] == inode:
+                    # Older than the indexed files and unchanged - can't make the list
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                item = (stat.st_mtime_ns, name, stat.st_size)
+                if len(newest) < self.max_files:
+                    heapq.heappush(newest, item)
+                elif item > newest[0]:
+                    heapq.heapreplace(newest, item)
+
+        if seen_indexed < len(indexed):
+            # An indexed file was deleted, so older files may move up
+            return self._scan(full_folder, prefix)
+
+        newest.sort(reverse=True)
+        files = [
+            {"name": name, "size": size, "mtime": mtime_ns / 1e9}
+            for mtime_ns, name, size in newest
+        ]
+        return files, names
+
+
+def _inode(entry):
+    try:
+        return entry.inode()
+    except OSError:
+        return None
+
+
+# Shared process-wide index
+recent_index = RecentIndex()
@@ -0,0 +1,215 @@
+"""
+FlowPath Sanitizer
+Single-pass, memoized cleanup of folder and file name segments with
+platform profiles and path length limits
+"""
+
+import os
+import re
+import sys
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Characters save nodes append to a filename or prefix (e.g. "_00001_.png")
+FILENAME_SUFFIX_RESERVE = 16
+
+# Components are never shortened below this when fitting the total path length
+MIN_COMPONENT_LENGTH = 8
+
+# Runs of spaces or underscores collapse to a single character
+_COLLAPSE_RE = re.compile(r" {2,}|_{2,}")
+
+_WINDOWS_RESERVED = frozenset(
+    ["CON", "PRN", "AUX", "NUL"]
+    + [f"COM{i}" for i in range(1, 10)]
+    + [f"LPT{i}" for i in range(1, 10)]
+)
+
+
+class SanitizeProfile:
+    """
+    Naming rules for one target filesystem.
+
+    Attributes:
+        name: Profile name
+        table: str.translate table mapping illegal characters to "_"
+        strip_chars: Characters stripped from both ends
+        reserved_names: Names that get a "_" suffix (case-insensitive)
+        max_component: Maximum length of one path component
+        measure_bytes: Measure lengths in UTF-8 bytes instead of characters
+    """
+
+    def __init__(
+        self,
+        name,
+        illegal_chars,
+        strip_chars,
+        reserved_names,
+        max_component,
+        measure_bytes,
+    ):
+        self.name = name
+        self.table = str.maketrans({char: "_" for char in illegal_chars})
+        self.strip_chars = strip_chars
+        self.reserved_names = reserved_names
+        self.max_component = max_component
+        self.measure_bytes = measure_bytes
+
+    def measure(self, text):
+        return len(text.encode("utf-8")) if self.measure_bytes else len(text)
+
+    def truncate(self, text, limit):
+        """Shorten text to at most limit (without splitting UTF-8 characters)"""
+        if self.measure(text) <= limit:
+            return text
+        if not self.measure_bytes:
+            return text[:limit]
+        return text.encode("utf-8")[:limit].decode("utf-8", "ignore")
+
+
+PROFILES = {
+    # Safe on every OS - the historical FlowPath behaviour
+    # Illegal characters for Windows: < > : " / \ | ? * (and control characters)
+    "windows": SanitizeProfile(
+        "windows",
+        illegal_chars='<>:"/\\|?*' + "".join(chr(i) for i in range(32)),
+        # Remove leading/trailing spaces and dots (Windows doesn't like these)
+        strip_chars=" .",
+        reserved_names=_WINDOWS_RESERVED,
+        max_component=255,
+        measure_bytes=False,
+    ),
+    # Linux/macOS only: keeps characters like : and ? that POSIX allows
+    "posix": SanitizeProfile(
+        "posix",
+        illegal_chars="/\\\0",
+        strip_chars=" .",
+        reserved_names=frozenset(),
+        max_component=255,
+        measure_bytes=True,
+    ),
+}
+
+DEFAULT_PROFILE = os.environ.get("FLOWPATH_SANITIZE_PROFILE", "windows").lower()
+if DEFAULT_PROFILE not in PROFILES:
+    logger.warning("Unknown FLOWPATH_SANITIZE_PROFILE %r, using windows", DEFAULT_PROFILE)
+    DEFAULT_PROFILE = "windows"
+
+# Total path limit of the OS FlowPath runs on (override with FLOWPATH_MAX_PATH)
+MAX_PATH_LENGTH = int(
+    os.environ.get("FLOWPATH_MAX_PATH", "260" if sys.platform == "win32" else "4096")
+)
+
+
+@lru_cache(maxsize=4096)
+def sanitize_component(name, profile=None, reserve=0):
+    """
+    Clean one folder or file name (memoized).
+
+    - Illegal characters become "_" (one translate() call)
+    - Leading/trailing spaces and dots are removed
+    - Runs of spaces/underscores collapse to one (one regex pass)
+    - Reserved device names get a "_" suffix
+    - Length is capped at the profile's component limit minus reserve
+
+    Image Saver % variables are preserved.
+
+    Args:
+        name: Raw name string
+        profile: Profile name (default: DEFAULT_PROFILE)
+        reserve: Length to keep free for suffixes added later
+
+    Returns:
+        str: Sanitized name
+    """
+    rules = PROFILES[profile or DEFAULT_PROFILE]
+
+    sanitized = name.translate(rules.table).strip(rules.strip_chars)
+    sanitized = _COLLAPSE_RE.sub(lambda m: m.group(0)[0], sanitized)
+
+    if sanitized.upper() in rules.reserved_names:
+        sanitized += "_"
+
+    limit = rules.max_component - reserve
+    if rules.measure(sanitized) > limit:
+        sanitized = rules.truncate(sanitized, limit).rstrip(rules.strip_chars)
+
+    return sanitized
+
+
+def sanitize_filename(name, profile=None):
+    """Clean a filename, leaving room for the suffix and extension save nodes add"""
+    return sanitize_component(name, profile, FILENAME_SUFFIX_RESERVE)
+
+
+def is_inside(path, base_dir):
+    """
+    Check that a path stays inside base_dir once symlinks and ".." are resolved.
+
+    Args:
+        path: Absolute path (or relative to the working directory)
+        base_dir: Directory the path must not leave
+
+    Returns:
+        bool: True for base_dir itself or anything below it
+    """
+    try:
+        real_path = os.path.normcase(os.path.realpath(path))
+        real_base = os.path.normcase(os.path.realpath(base_dir))
+    except (OSError, ValueError):
+        return False
+    return real_path == real_base or real_path.startswith(real_base.rstrip(os.sep) + os.sep)
+
+
+def fit_path_length(folder, filename, base_dir, profile=None, max_path=None):
+    """
+    Shorten folder components so base_dir/folder/filename fits the OS path limit.
+
+    The longest components are shortened first, never below
+    MIN_COMPONENT_LENGTH. Catching this here avoids the save node failing
+    late on very long LoRA stacks or custom segments.
+
+    Args:
+        folder: Relative folder path (as built by FlowPath)
+        filename: Filename (may still contain {counter})
+        base_dir: Output directory the folder is relative to
+        profile: Profile name (default: DEFAULT_PROFILE)
+        max_path: Total length limit (default: MAX_PATH_LENGTH)
+
+    Returns:
+        str: Folder path that fits, or the original folder if it already fits
+    """
+    if not folder:
+        return folder
+    rules = PROFILES[profile or DEFAULT_PROFILE]
+    max_path = MAX_PATH_LENGTH if max_path is None else max_path
+
+    budget = (
+        max_path
+        - rules.measure(base_dir)
+        - 1
+        - rules.measure(filename)
+        - FILENAME_SUFFIX_RESERVE
+    )
+    parts = re.split(r"[\\/]", folder)
+    lengths = [rules.measure(part) for part in parts]
+    total = sum(lengths) + len(parts) - 1
+    if total <= budget:
+        return folder
+
+    while total > budget:
+        longest = max(range(len(parts)), key=lengths.__getitem__)
+        if lengths[longest] <= MIN_COMPONENT_LENGTH:
+            break
+        target = max(MIN_COMPONENT_LENGTH, lengths[longest] - (total - budget))
+        parts[longest] = rules.truncate(parts[longest], target).rstrip(rules.strip_chars)
+        new_length = rules.measure(parts[longest])
+        total -= lengths[longest] - new_length
+        lengths[longest] = new_length
+
+    logger.warning(
+        "FlowPath path too long for this OS, shortened to fit: %s", os.path.join(*parts)
+    )
+    return os.path.join(*parts)
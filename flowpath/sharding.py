@@ -0,0 +1,299 @@
+"""
+FlowPath Sharding
+Bucket subfolders for output folders that grow past a file-count threshold
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .counter_index import COUNTER_INDEX_MAX_ENTRIES
+
+# Defaults (also the widget's initial values for a new Shard segment)
+DEFAULT_SHARD_MODE = "counter"
+DEFAULT_SHARD_SIZE = 1000
+DEFAULT_SHARD_THRESHOLD = 10000
+
+# Hour buckets sort chronologically by name
+HOUR_BUCKET_FORMAT = "%Y-%m-%d_%H"
+_HOUR_BUCKET_RE = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}$")
+
+# Counter range buckets: "00000-00999", "01000-01999", ...
+_COUNTER_BUCKET_RE = re.compile(r"^(\d+)-(\d+)$")
+COUNTER_BUCKET_DIGITS = 5
+
+
+def _config_int(config, key, default):
+    try:
+        value = int(config.get(key, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class ShardSpec:
+    """
+    Sharding settings from a "shard" segment.
+
+    Attributes:
+        mode: "counter" (counter range buckets) or "hour" (one bucket per hour)
+        size: Counters per bucket in counter mode
+        threshold: Files in the folder before buckets are used
+    """
+
+    __slots__ = ("mode", "size", "threshold")
+
+    def __init__(
+        self,
+        mode=DEFAULT_SHARD_MODE,
+        size=DEFAULT_SHARD_SIZE,
+        threshold=DEFAULT_SHARD_THRESHOLD,
+    ):
+        self.mode = mode
+        self.size = size
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config):
+        """Read shard_mode / shard_size / shard_threshold from the node config"""
+        mode = str(config.get("shard_mode", DEFAULT_SHARD_MODE)).lower()
+        return cls(
+            mode="hour" if mode.startswith("hour") else "counter",
+            size=_config_int(config, "shard_size", DEFAULT_SHARD_SIZE),
+            threshold=_config_int(config, "shard_threshold", DEFAULT_SHARD_THRESHOLD),
+        )
+
+    def bucket_for(self, counter, now):
+        """
+        Bucket folder name for a counter value (counter mode) or time (hour mode).
+        Counter mode without a counter falls back to hour buckets.
+        """
+        if self.mode == "counter" and counter is not None:
+            start = (counter // self.size) * self.size
+            end = start + self.size - 1
+            return f"{start:0{COUNTER_BUCKET_DIGITS}d}-{end:0{COUNTER_BUCKET_DIGITS}d}"
+        return now.strftime(HOUR_BUCKET_FORMAT)
+
+
+def bucket_sort_key(name):
+    """Order buckets oldest to newest (counter ranges numerically, hours by name)"""
+    match = _COUNTER_BUCKET_RE.match(name)
+    if match:
+        return (0, int(match.group(1)), "")
+    return (1, 0, name)
+
+
+def is_bucket_name(name):
+    return bool(_COUNTER_BUCKET_RE.match(name) or _HOUR_BUCKET_RE.match(name))
+
+
+class _ShardEntry:
+    """Cached state of one sharded base folder"""
+
+    __slots__ = ("mtime_ns", "file_count", "latest_bucket", "new_buckets", "files_issued")
+
+    def __init__(self, mtime_ns, file_count, latest_bucket):
+        self.mtime_ns = mtime_ns
+        self.file_count = file_count
+        self.latest_bucket = latest_bucket
+        # Buckets handed out since the folder was last validated
+        self.new_buckets = set()
+        # Paths in the base folder itself were handed out since then
+        self.files_issued = False
+
+
+def next_counter_bucket(name):
+    """Counter range bucket after name, or None for hour buckets"""
+    match = _COUNTER_BUCKET_RE.match(name)
+    if not match:
+        return None
+    start, end = int(match.group(1)), int(match.group(2))
+    size = end - start + 1
+    return f"{end + 1:0{COUNTER_BUCKET_DIGITS}d}-{end + size:0{COUNTER_BUCKET_DIGITS}d}"
+
+
+class ShardIndex:
+    """
+    Per-base-folder cache of the file count and the newest bucket.
+
+    Revalidated with one stat() call like the counter index. Once buckets
+    are in use, files are written into buckets, so the base folder only
+    changes when a new bucket is created. Such a change is confirmed by
+    checking that a bucket we handed out exists and the next counter range
+    bucket doesn't; any other change rescans the folder. stat() and scans
+    run without holding the lock.
+    """
+
+    def __init__(self, max_entries=COUNTER_INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def state(self, full_folder, threshold, refresh=True):
+        """
+        Check whether a base folder uses buckets.
+
+        Args:
+            full_folder: Absolute base folder path
+            threshold: Files in the folder before buckets are used
+            refresh: False to use the cached state without touching the disk
+                     (paths handed out meanwhile are included). The folder
+                     is only read if it isn't cached.
+
+        Returns:
+            tuple: (active, latest_bucket) - latest_bucket is None if no
+            bucket exists yet
+        """
+        key = os.path.normcase(os.path.abspath(full_folder))
+        if not refresh:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return self._state(entry, threshold)
+        self._refresh(key, full_folder)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Evicted meanwhile - nothing is known about the folder
+                return False, None
+            return self._state(entry, threshold)
+
+    @staticmethod
+    def _state(entry, threshold):
+        active = entry.latest_bucket is not None or entry.file_count >= threshold
+        return active, entry.latest_bucket
+
+    def note_issued(self, full_folder, bucket=None, count=1):
+        """
+        Record paths handed out so the next lookup doesn't need a rescan.
+
+        Args:
+            full_folder: Absolute base folder path
+            bucket: Bucket the files go to (None: the base folder itself)
+            count: Number of files
+        """
+        key = os.path.normcase(os.path.abspath(full_folder))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if bucket is None:
+                entry.file_count += count
+                entry.files_issued = True
+                return
+            if entry.latest_bucket is None or bucket_sort_key(bucket) > bucket_sort_key(
+                entry.latest_bucket
+            ):
+                entry.latest_bucket = bucket
+                entry.new_buckets.add(bucket)
+
+    def invalidate(self, full_folder=None):
+        """Drop cached entries (all, or one base folder)"""
+        with self._lock:
+            if full_folder is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.normcase(os.path.abspath(full_folder)), None)
+
+    def _refresh(self, key, full_folder):
+        """Revalidate a folder's entry, rescanning it if needed"""
+        try:
+            mtime_ns = os.stat(full_folder).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+
+        delta = None
+        with self._lock:
+            stale = self._entries.get(key)
+            if stale is not None:
+                if stale.mtime_ns == mtime_ns:
+                    self._entries.move_to_end(key)
+                    return
+                if mtime_ns is not None and stale.new_buckets and not stale.files_issued:
+                    delta = (stale.mtime_ns, set(stale.new_buckets), stale.latest_bucket)
+
+        if delta is not None:
+            known_mtime, new_buckets, latest_bucket = delta
+            found = self._delta_check(full_folder, new_buckets, latest_bucket)
+            if found:
+                with self._lock:
+                    if self._entries.get(key) is stale and stale.mtime_ns == known_mtime:
+                        stale.mtime_ns = mtime_ns
+                        stale.new_buckets.difference_update(found)
+                        self._entries.move_to_end(key)
+                        return
+
+        file_count = 0
+        latest_bucket = None
+        if mtime_ns is not None:
+            file_count, latest_bucket = self._scan(full_folder)
+
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current is not stale:
+                # Another thread refreshed the folder meanwhile
+                return
+            entry = _ShardEntry(mtime_ns, file_count, latest_bucket)
+            if stale is not None:
+                # Buckets handed out but not created yet (read now, so paths
+                # handed out during the scan are kept)
+                for bucket in sorted(stale.new_buckets, key=bucket_sort_key):
+                    if latest_bucket is None or bucket_sort_key(bucket) > bucket_sort_key(
+                        latest_bucket
+                    ):
+                        entry.new_buckets.add(bucket)
+                        entry.latest_bucket = bucket
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _delta_check(full_folder, new_buckets, latest_bucket):
+        """
+        Explain a base folder change by buckets we handed out.
+
+        Returns:
+            set or None: Buckets that now exist, or None if the change can't
+            be explained (the folder has to be rescanned)
+        """
+        found = {
+            bucket for bucket in new_buckets if os.path.isdir(os.path.join(full_folder, bucket))
+        }
+        if not found:
+            return None
+        following = next_counter_bucket(latest_bucket)
+        if following is not None and os.path.lexists(os.path.join(full_folder, following)):
+            # Someone else started the next counter range
+            return None
+        return found
+
+    @staticmethod
+    def _scan(full_folder):
+        """Count files and find the newest bucket in a base folder"""
+        file_count = 0
+        latest_bucket = None
+        try:
+            with os.scandir(full_folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            if is_bucket_name(entry.name) and (
+                                latest_bucket is None
+                                or bucket_sort_key(entry.name) > bucket_sort_key(latest_bucket)
+                            ):
+                                latest_bucket = entry.name
+                        else:
+                            file_count += 1
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return file_count, latest_bucket
+
+
+# Shared process-wide index
+shard_index = ShardIndex()
@@ -0,0 +1,139 @@
+"""
+FlowPath Templates
+Compiles {variable} templates once and renders them in a single pass
+"""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+
+DEFAULT_DATE_FORMAT = "%Y-%m-%d"
+
+# Matches {name} tokens; only known variables in all-lowercase or
+# all-uppercase form are substituted, everything else is kept literally
+# (e.g. {counter}, which is resolved later, and Image Saver %vars)
+_TOKEN_RE = re.compile(r"\{([A-Za-z_]+)\}")
+
+
+def format_date(now, config):
+    """
+    Format a timestamp with the configured date format.
+
+    Args:
+        now: datetime snapshot
+        config: Configuration dictionary (uses date_format)
+
+    Returns:
+        str: Formatted date, falling back to YYYY-MM-DD on invalid formats
+    """
+    try:
+        return now.strftime(config.get("date_format", DEFAULT_DATE_FORMAT))
+    except Exception:
+        return now.strftime(DEFAULT_DATE_FORMAT)
+
+
+# Variable resolvers: name -> fn(config, now)
+TEMPLATE_VARIABLES = {
+    "label": lambda c, n: c.get("node_label", ""),
+    "output": lambda c, n: c.get("node_label", ""),  # Alias for label
+    "filetype": lambda c, n: c.get("file_type", "Image"),
+    "file_type": lambda c, n: c.get("file_type", "Image"),
+    "category": lambda c, n: c.get("category", "Characters"),
+    "name": lambda c, n: c.get("name", ""),
+    "content_rating": lambda c, n: c.get("content_rating", "SFW"),
+    "rating": lambda c, n: c.get("content_rating", "SFW"),
+    "sfw": lambda c, n: "SFW" if c.get("content_rating") == "SFW" else "",
+    "nsfw": lambda c, n: "NSFW" if c.get("content_rating") == "NSFW" else "",
+    "project": lambda c, n: c.get("project_name", ""),
+    "series": lambda c, n: c.get("series_name", ""),
+    "resolution": lambda c, n: c.get("resolution", ""),
+    "res": lambda c, n: c.get("resolution", ""),
+    "model": lambda c, n: c.get("model_name", ""),
+    "lora": lambda c, n: c.get("lora_name", ""),
+    "seed": lambda c, n: c.get("seed", ""),
+    "date": lambda c, n: format_date(n, c),
+    "year": lambda c, n: n.strftime("%Y"),
+    "month": lambda c, n: n.strftime("%m"),
+    "day": lambda c, n: n.strftime("%d"),
+}
+
+# Variables whose value depends on the current time
+DATE_VARIABLES = frozenset({"date", "year", "month", "day"})
+
+
+class CompiledTemplate:
+    """
+    A template split into literal text and variable references.
+
+    Attributes:
+        template: Original template string
+        parts: List of (is_variable, text) tuples
+        variables: Set of variable names referenced by the template
+        uses_counter: True if the template contains {counter}
+    """
+
+    __slots__ = ("template", "parts", "variables", "uses_counter")
+
+    def __init__(self, template):
+        self.template = template
+        self.parts = []
+        self.variables = set()
+        self.uses_counter = "{counter}" in template.lower()
+
+        pos = 0
+        for match in _TOKEN_RE.finditer(template):
+            name = match.group(1)
+            key = name.lower()
+            if key in TEMPLATE_VARIABLES and (name == key or name == key.upper()):
+                if match.start() > pos:
+                    self.parts.append((False, template[pos : match.start()]))
+                self.parts.append((True, key))
+                self.variables.add(key)
+                pos = match.end()
+        if pos < len(template):
+            self.parts.append((False, template[pos:]))
+
+    @property
+    def uses_date(self):
+        return not DATE_VARIABLES.isdisjoint(self.variables)
+
+    def render(self, config, now=None):
+        """
+        Substitute variables in a single pass.
+
+        Args:
+            config: Configuration dictionary with values
+            now: datetime snapshot (only needed if the template uses a date variable)
+
+        Returns:
+            str: Rendered template
+        """
+        if not self.variables:
+            return self.template
+        if now is None and self.uses_date:
+            now = datetime.now()
+
+        values = {}
+        out = []
+        for is_variable, text in self.parts:
+            if is_variable:
+                if text not in values:
+                    values[text] = str(TEMPLATE_VARIABLES[text](config, now))
+                out.append(values[text])
+            else:
+                out.append(text)
+        return "".join(out)
+
+
+@lru_cache(maxsize=512)
+def compile_template(template):
+    """
+    Compile a template string (cached by template string).
+
+    Args:
+        template: String containing template variables like {model}
+
+    Returns:
+        CompiledTemplate: Reusable compiled template
+    """
+    return CompiledTemplate(template)
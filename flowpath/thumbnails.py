@@ -0,0 +1,180 @@
+"""
+FlowPath Thumbnails
+Downscaled previews of output images, cached on disk by source file state
+"""
+
+import io
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Pillow ships with ComfyUI, but the core package doesn't require it
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_AVAILABLE = Image is not None
+
+THUMBNAIL_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif"})
+
+# Requested sizes are snapped to these, so clients can't fill the cache
+# with one file per pixel size
+THUMBNAIL_SIZES = (128, 256, 512)
+DEFAULT_THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 80
+
+# Least recently used thumbnails are deleted beyond this much disk space
+THUMBNAIL_CACHE_BYTES = int(os.environ.get("FLOWPATH_THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024
+
+
+def snap_thumbnail_size(size):
+    """Smallest cached size that covers the requested one (largest if none does)"""
+    for bucket in THUMBNAIL_SIZES:
+        if size <= bucket:
+            return bucket
+    return THUMBNAIL_SIZES[-1]
+
+
+def thumbnail_etag(stat, size):
+    """
+    ETag of a thumbnail, derived from the source file's state alone.
+    Lets conditional requests be answered without opening the cache.
+    """
+    raw = f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}:{size}"
+    return '"' + hashlib.sha1(raw.encode("ascii")).hexdigest()[:20] + '"'
+
+
+class ThumbnailCache:
+    """
+    JPEG thumbnails kept in a cache directory.
+
+    Cache files are named after the ETag, so a changed source file gets a
+    new thumbnail and stale ones are never served. The directory is kept
+    under max_bytes by deleting the least recently served thumbnails.
+    """
+
+    def __init__(self, cache_dir, max_bytes=THUMBNAIL_CACHE_BYTES):
+        """
+        Args:
+            cache_dir: Directory for cached thumbnails (created on demand)
+            max_bytes: Disk space the cached thumbnails may use
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Cache file name -> size in bytes, least recently used first
+        self._entries = None
+        self._total = 0
+
+    def _load_entries(self):
+        """Index files left by earlier runs, oldest first (lock held)"""
+        self._entries = OrderedDict()
+        self._total = 0
+        found = []
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".jpg"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        except OSError:
+            return
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total += size
+
+    def _touch(self, name):
+        """Mark a cache file as just served"""
+        with self._lock:
+            if self._entries is None:
+                self._load_entries()
+            if name in self._entries:
+                self._entries.move_to_end(name)
+
+    def _add(self, name, size):
+        """Index a new cache file and evict the least recently used ones"""
+        evicted = []
+        with self._lock:
+            if self._entries is None:
+                self._load_entries()
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.cache_dir, old_name))
+            except OSError:
+                pass
+
+    def get(self, full_path, size, stat=None):
+        """
+        Thumbnail bytes for an image, generating and caching it on a miss.
+
+        Args:
+            full_path: Absolute image path
+            size: Longest side in pixels (one of THUMBNAIL_SIZES)
+            stat: os.stat() result of full_path if already known
+
+        Returns:
+            tuple: (jpeg bytes, etag)
+
+        Raises:
+            RuntimeError: If Pillow is not installed
+            OSError: If the image can't be read or decoded
+        """
+        if Image is None:
+            raise RuntimeError("Thumbnails need Pillow (pip install pillow)")
+        if stat is None:
+            stat = os.stat(full_path)
+        etag = thumbnail_etag(stat, size)
+        name = etag.strip('"') + ".jpg"
+        cache_path = os.path.join(self.cache_dir, name)
+
+        try:
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            self._touch(name)
+            return data, etag
+        except OSError:
+            pass
+
+        data = self._render(full_path, size)
+        try:
+            with self._lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, cache_path)
+            self._add(name, len(data))
+        except OSError:
+            # Serving still works, the next request renders again
+            logger.debug("Failed to cache FlowPath thumbnail", exc_info=True)
+        return data, etag
+
+    @staticmethod
+    def _render(full_path, size):
+        try:
+            with Image.open(full_path) as image:
+                # Decode at reduced size where the format supports it (JPEG)
+                image.draft("RGB", (size, size))
+                image.thumbnail((size, size))
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                buffer = io.BytesIO()
+                image.save(buffer, "JPEG", quality=THUMBNAIL_QUALITY)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise OSError(f"Can't create thumbnail for {full_path}: {e}") from e
+        return buffer.getvalue()
@@ -2,6 +2,6 @@
 FlowPath Nodes
 """
 
-from .flowpath import FlowPath
+from .flowpath import FlowPath, FlowPathBatch
 
-__all__ = ["FlowPath"]
+__all__ = ["FlowPath", "FlowPathBatch"]
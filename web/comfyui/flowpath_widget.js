@@ -27,6 +27,170 @@ function isValidPresetObject(obj) {
   return true;
 }
 
+// Server-side preset library, shared by all FlowPath nodes on the page.
+// Revalidated with If-None-Match, so unchanged libraries cost a 304.
+const presetLibrary = {
+  etag: null,
+  presets: {},   // name -> { segments, config, version, updated_at }
+  deleted: {},   // name -> deletion time (tombstones)
+  loaded: false,
+  pending: null
+};
+
+// Names this browser has seen in (or uploaded to) the server library.
+// Local presets outside this set were created since the last sync.
+const SYNCED_PRESETS_KEY = "flowpath_synced_presets";
+
+function loadSyncedPresetNames() {
+  try {
+    const stored = JSON.parse(localStorage.getItem(SYNCED_PRESETS_KEY) || "[]");
+    return new Set(Array.isArray(stored) ? stored.filter(n => typeof n === 'string') : []);
+  } catch (e) {
+    return new Set();
+  }
+}
+
+function markPresetsSynced(names) {
+  const synced = loadSyncedPresetNames();
+  const size = synced.size;
+  names.forEach(name => synced.add(name));
+  if (synced.size === size) return;
+  try {
+    localStorage.setItem(SYNCED_PRESETS_KEY, JSON.stringify([...synced]));
+  } catch (e) {
+    console.warn("[FlowPath] Failed to save preset sync state to localStorage:", e);
+  }
+}
+
+/**
+ * Fetch (or revalidate) the server preset library
+ * @returns {Promise<Object>} - name -> preset, empty if the server is unreachable
+ */
+function fetchPresetLibrary() {
+  if (presetLibrary.pending) return presetLibrary.pending;
+  presetLibrary.pending = (async () => {
+    try {
+      const headers = presetLibrary.etag ? { 'If-None-Match': presetLibrary.etag } : {};
+      const response = await fetch('/flowpath/presets', { headers });
+      if (response.status === 304) return presetLibrary.presets;
+      if (!response.ok) return presetLibrary.presets;
+      const data = await response.json();
+      const validated = {};
+      for (const [name, preset] of Object.entries(data.presets || {})) {
+        if (isValidPresetObject(preset)) validated[name] = preset;
+      }
+      presetLibrary.presets = validated;
+      presetLibrary.deleted = (data.deleted && typeof data.deleted === 'object') ? data.deleted : {};
+      presetLibrary.etag = response.headers.get('ETag');
+      presetLibrary.loaded = true;
+    } catch (e) {
+      // Backend not available - localStorage presets still work
+    } finally {
+      presetLibrary.pending = null;
+    }
+    return presetLibrary.presets;
+  })();
+  return presetLibrary.pending;
+}
+
+/**
+ * Save and/or delete presets in the server library
+ * @param {Object} upsert - name -> { segments, config }
+ * @param {Array<string>} deleted - Names to remove
+ * @param {boolean} sync - Background upload of local presets: the server
+ *   ignores presets that were deleted meanwhile
+ * @returns {Promise<Object|null>} - name -> new version, or null on failure
+ */
+async function savePresetsToServer(upsert = {}, deleted = [], sync = false) {
+  try {
+    const response = await fetch('/flowpath/presets', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ upsert, delete: deleted, sync })
+    });
+    if (!response.ok) {
+      console.warn("[FlowPath] Failed to save presets on the server:", response.status);
+      return null;
+    }
+    const { versions } = await response.json();
+    const now = Date.now() / 1000;
+    deleted.forEach(name => {
+      delete presetLibrary.presets[name];
+      presetLibrary.deleted[name] = now;
+    });
+    for (const [name, version] of Object.entries(versions || {})) {
+      presetLibrary.presets[name] = { ...JSON.parse(JSON.stringify(upsert[name])), version };
+      delete presetLibrary.deleted[name];
+    }
+    markPresetsSynced(Object.keys(versions || {}));
+    presetLibrary.etag = response.headers.get('ETag');
+    return versions;
+  } catch (e) {
+    console.warn("[FlowPath] Failed to save presets on the server:", e);
+    return null;
+  }
+}
+
+// Server previews requested within this window go out as one request, with
+// one prompt snapshot (app.graphToPrompt serializes the whole graph)
+const SERVER_PREVIEW_BATCH_MS = 20;
+// Nodes per request (the server's MAX_PREVIEW_NODES)
+const SERVER_PREVIEW_MAX_NODES = 64;
+const serverPreviewBatch = { nodes: new Map(), timer: null };
+
+/**
+ * Queue a node for the next batched /flowpath/preview request
+ * @param {string} nodeId - FlowPath node id
+ * @param {string} widgetData - The node's widget_data
+ * @returns {Promise<Object|null>} - { path, filename } or { error }, null if unavailable
+ */
+function requestServerPreview(nodeId, widgetData) {
+  return new Promise((resolve) => {
+    const queued = serverPreviewBatch.nodes.get(nodeId);
+    if (queued) queued.resolve(null);  // superseded within the same pass
+    serverPreviewBatch.nodes.set(nodeId, { widgetData, resolve });
+    if (!serverPreviewBatch.timer) {
+      serverPreviewBatch.timer = setTimeout(flushServerPreviews, SERVER_PREVIEW_BATCH_MS);
+    }
+  });
+}
+
+async function flushServerPreviews() {
+  const batch = serverPreviewBatch.nodes;
+  serverPreviewBatch.nodes = new Map();
+  serverPreviewBatch.timer = null;
+
+  let results = {};
+  try {
+    // Include the current prompt so the server can detect the seed like it does at run time
+    let prompt = null;
+    try {
+      prompt = (await app.graphToPrompt())?.output || null;
+    } catch (e) {
+      prompt = null;
+    }
+    const nodes = [...batch].map(([nodeId, { widgetData }]) => ({ node_id: nodeId, widget_data: widgetData }));
+    for (let start = 0; start < nodes.length; start += SERVER_PREVIEW_MAX_NODES) {
+      const response = await fetch('/flowpath/preview', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ prompt, nodes: nodes.slice(start, start + SERVER_PREVIEW_MAX_NODES) })
+      });
+      if (response.ok) Object.assign(results, (await response.json()).results || {});
+    }
+  } catch (e) {
+    // Backend not available
+  }
+  for (const [nodeId, { resolve }] of batch) resolve(results[nodeId] || null);
+}
+
+// Node classes that use the FlowPath widget (FlowPathBatch shares the UI)
+const FLOWPATH_NODE_CLASSES = ["FlowPath", "FlowPathBatch"];
+
+function isFlowPathNode(node) {
+  return FLOWPATH_NODE_CLASSES.includes(node?.comfyClass);
+}
+
 // Helper function to chain callbacks
 function chainCallback(object, property, callback) {
   if (object[property]) {
@@ -883,7 +1047,7 @@ function openThemeEditor(existingThemeKey = null) {
         delete customThemes[existingThemeKey];
         saveCustomThemes();
         globalSettings.theme = 'umbrael';
-        app.graph._nodes.filter(n => n.comfyClass === "FlowPath").forEach(n => n.genSortRender?.());
+        app.graph._nodes.filter(n => isFlowPathNode(n)).forEach(n => n.genSortRender?.());
         showToast('Theme deleted', 'success');
         overlay.remove();
       }
@@ -938,7 +1102,7 @@ function openThemeEditor(existingThemeKey = null) {
     saveCustomThemes();
     globalSettings.theme = themeKey;
     app.ui.settings.setSettingValue("🌊 FlowPath.Theme", themeKey);
-    app.graph._nodes.filter(n => n.comfyClass === "FlowPath").forEach(n => n.genSortRender?.());
+    app.graph._nodes.filter(n => isFlowPathNode(n)).forEach(n => n.genSortRender?.());
     overlay.remove();
   };
 
@@ -1319,6 +1483,158 @@ function getAllNodesIncludingSubgraphs(graph) {
   return allNodes;
 }
 
+/**
+ * Shared index of the workflow graph used by all auto-detectors.
+ * Built in a single traversal (nodes grouped by class, plus link adjacency)
+ * and reused by every FlowPath node until the graph changes.
+ */
+class GraphIndex {
+  constructor(graph) {
+    this.graph = graph;
+    this.nodes = getAllNodesIncludingSubgraphs(graph);
+    this.order = new Map();      // node -> position in traversal order
+    this.classes = new Map();    // "type|comfyClass" -> { type, comfyClass, nodes }
+    this.inputLinks = new Map(); // node -> Map(input name -> { node, slot })
+    this.outputLinks = new Map(); // node -> Array of { node, input }
+    this.graphs = new Set([graph]);
+    this.selections = new Map(); // memoized select() results
+
+    this.nodes.forEach((node, i) => {
+      this.order.set(node, i);
+      if (node.graph) this.graphs.add(node.graph);
+
+      const type = node.type || "";
+      const comfyClass = node.comfyClass || "";
+      const key = `${type}|${comfyClass}`;
+      let group = this.classes.get(key);
+      if (!group) {
+        group = { type, comfyClass, nodes: [] };
+        this.classes.set(key, group);
+      }
+      group.nodes.push(node);
+    });
+
+    for (const node of this.nodes) {
+      this._indexInputs(node);
+    }
+  }
+
+  _indexInputs(node) {
+    if (!Array.isArray(node.inputs)) return;
+    const owner = node.graph || this.graph;
+    const links = owner?.links;
+    if (!links) return;
+
+    for (const input of node.inputs) {
+      if (!input || input.link === null || input.link === undefined) continue;
+      const link = links instanceof Map ? links.get(input.link) : links[input.link];
+      if (!link) continue;
+      const origin = owner.getNodeById?.(link.origin_id);
+      if (!origin) continue;
+
+      if (!this.inputLinks.has(node)) this.inputLinks.set(node, new Map());
+      this.inputLinks.get(node).set(input.name, { node: origin, slot: link.origin_slot });
+      if (!this.outputLinks.has(origin)) this.outputLinks.set(origin, []);
+      this.outputLinks.get(origin).push({ node, input: input.name });
+    }
+  }
+
+  /**
+   * Nodes whose class matches a predicate, in traversal order.
+   * The predicate runs once per distinct class and results are memoized by key.
+   * @param {string} key - Cache key identifying the predicate
+   * @param {Function} predicate - (type, comfyClass) => boolean
+   * @returns {Array}
+   */
+  select(key, predicate) {
+    let selected = this.selections.get(key);
+    if (!selected) {
+      selected = [];
+      for (const group of this.classes.values()) {
+        if (predicate(group.type, group.comfyClass)) selected.push(...group.nodes);
+      }
+      selected.sort((a, b) => this.order.get(a) - this.order.get(b));
+      this.selections.set(key, selected);
+    }
+    return selected;
+  }
+
+  /**
+   * Nodes whose type or comfyClass is one of the given class names
+   * @param {Array<string>} classNames
+   * @returns {Array}
+   */
+  nodesOfClass(classNames) {
+    return this.select(`class:${classNames.join("\u0000")}`, (type, comfyClass) =>
+      classNames.includes(type) || classNames.includes(comfyClass)
+    );
+  }
+
+  /**
+   * Node feeding a named input, or null if the input isn't linked
+   */
+  upstream(node, inputName) {
+    return this.inputLinks.get(node)?.get(inputName)?.node || null;
+  }
+
+  /**
+   * Nodes (and input names) using any output of a node
+   */
+  downstream(node) {
+    return this.outputLinks.get(node) || [];
+  }
+}
+
+let graphIndexCache = null;
+const watchedGraphs = new WeakSet();
+
+/**
+ * Drop the shared graph index (called on graph change events)
+ */
+function invalidateGraphIndex() {
+  graphIndexCache = null;
+}
+
+/**
+ * Shared graph index for a graph, built on first use after a change
+ * @param {Object} graph - The LiteGraph graph object
+ * @returns {GraphIndex}
+ */
+function getGraphIndex(graph) {
+  if (graphIndexCache && graphIndexCache.graph === graph) {
+    return graphIndexCache;
+  }
+
+  const index = new GraphIndex(graph);
+  // Invalidate on structural changes in the root graph and every subgraph
+  for (const g of index.graphs) {
+    if (!g || watchedGraphs.has(g)) continue;
+    watchedGraphs.add(g);
+    chainCallback(g, "onNodeAdded", invalidateGraphIndex);
+    chainCallback(g, "onNodeRemoved", invalidateGraphIndex);
+    chainCallback(g, "onConnectionChange", invalidateGraphIndex);
+  }
+  graphIndexCache = index;
+  return index;
+}
+
+/**
+ * Value of a widget, following the link if the widget was converted to an input
+ */
+function getLinkedWidgetValue(index, node, name) {
+  const source = index.upstream(node, name);
+  if (source) {
+    const sourceWidget = source.widgets?.find(w => w.name === name) ||
+      source.widgets?.find(w => /seed|value/i.test(w.name)) ||
+      source.widgets?.[0];
+    if (sourceWidget && sourceWidget.value !== undefined && sourceWidget.value !== null) {
+      return sourceWidget.value;
+    }
+  }
+  const widget = node.widgets?.find(w => w.name === name);
+  return widget ? widget.value : undefined;
+}
+
 function detectModelFromWorkflow(graph) {
   
   if (!graph || !graph._nodes) {
@@ -1337,28 +1653,25 @@ function detectModelFromWorkflow(graph) {
 
   const foundModels = [];
   
-  // Get all nodes including those inside subgraphs/group nodes
-  const allNodes = getAllNodesIncludingSubgraphs(graph);
-
-  // Search for all checkpoint nodes
-  for (const node of allNodes) {
-    if (checkpointNodeTypes.includes(node.type) || checkpointNodeTypes.includes(node.comfyClass)) {
-      // Find the widget that contains the model name
-      const ckptWidget = node.widgets?.find(w => 
-        w.name === "ckpt_name" || w.name === "unet_name" || w.name === "model_name"
-      );
+  // Checkpoint nodes from the shared graph index (includes subgraphs/group nodes)
+  const checkpointNodes = getGraphIndex(graph).nodesOfClass(checkpointNodeTypes);
+
+  for (const node of checkpointNodes) {
+    // Find the widget that contains the model name
+    const ckptWidget = node.widgets?.find(w => 
+      w.name === "ckpt_name" || w.name === "unet_name" || w.name === "model_name"
+    );
+    
+    if (ckptWidget && ckptWidget.value) {
+      let modelName = ckptWidget.value;
       
-      if (ckptWidget && ckptWidget.value) {
-        let modelName = ckptWidget.value;
-        
-        // Clean up the model name
-        // Remove file extension
-        modelName = modelName.replace(/\.(safetensors|ckpt|pt|bin)$/i, "");
-        // Remove path separators
-        modelName = modelName.split(/[\/\\]/).pop();
-        
-        foundModels.push(modelName);
-      }
+      // Clean up the model name
+      // Remove file extension
+      modelName = modelName.replace(/\.(safetensors|ckpt|pt|bin)$/i, "");
+      // Remove path separators
+      modelName = modelName.split(/[\/\\]/).pop();
+      
+      foundModels.push(modelName);
     }
   }
 
@@ -1397,40 +1710,52 @@ function detectSeedFromWorkflow(graph) {
     "DisableNoise"
   ];
   
-  // Get all nodes including those inside subgraphs/group nodes
-  const allNodes = getAllNodesIncludingSubgraphs(graph);
+  const index = getGraphIndex(graph);
+  const matchesAny = (types) => (type, comfyClass) => {
+    const nodeType = type || comfyClass || '';
+    return types.some(t => nodeType.includes(t) || t.includes(nodeType));
+  };
 
   // First, check for noise generator nodes (higher priority for SamplerCustomAdvanced workflows)
-  for (const node of allNodes) {
-    const nodeType = node.type || node.comfyClass || '';
-    if (noiseGeneratorTypes.some(type => nodeType.includes(type) || type.includes(nodeType))) {
-      // Find the widget that contains the noise_seed
-      const seedWidget = node.widgets?.find(w => w.name === "noise_seed");
-      
-      if (seedWidget && seedWidget.value !== undefined && seedWidget.value !== null) {
-        const seed = String(seedWidget.value);
-        return seed;
-      }
+  for (const node of index.select("seed:noise", matchesAny(noiseGeneratorTypes))) {
+    // noise_seed widget, or the node feeding it when converted to an input
+    const value = getLinkedWidgetValue(index, node, "noise_seed");
+    if (value !== undefined && value !== null) {
+      return String(value);
     }
   }
 
   // Search for sampler nodes (fallback)
-  for (const node of allNodes) {
-    const nodeType = node.type || node.comfyClass || '';
-    if (samplerNodeTypes.some(type => nodeType.includes(type) || type.includes(nodeType))) {
-      // Find the widget that contains the seed
-      const seedWidget = node.widgets?.find(w => w.name === "seed");
-      
-      if (seedWidget && seedWidget.value !== undefined && seedWidget.value !== null) {
-        const seed = String(seedWidget.value);
-        return seed;
-      }
+  for (const node of index.select("seed:sampler", matchesAny(samplerNodeTypes))) {
+    const value = getLinkedWidgetValue(index, node, "seed");
+    if (value !== undefined && value !== null) {
+      return String(value);
     }
   }
 
   return null;
 }
 
+// Standard LoRA Loader nodes
+const LORA_LOADER_TYPES = [
+  "LoraLoader",
+  "LoraLoaderModelOnly",
+  "LoRA Stacker",
+  "Power Lora Loader (rgthree)"
+];
+
+// Text/prompt nodes that may embed <lora:name:weight> syntax
+const LORA_TEXT_NODE_TYPES = [
+  "ImpactWildcardEncode",
+  "CLIPTextEncode",
+  "BNK_CLIPTextEncodeAdvanced",
+  "CLIPTextEncodeSDXL",
+  "CLIPTextEncodeSDXLRefiner",
+  "String Literal",
+  "Text Multiline",
+  "ShowText"
+];
+
 function detectLorasFromWorkflow(graph) {
   
   if (!graph || !graph._nodes) {
@@ -1447,11 +1772,21 @@ function detectLorasFromWorkflow(graph) {
   // LoRA Manager pattern: <lora:name:strength> or <lora:name:strength:clip>
   const LORA_PATTERN = /<lora:([^:>]+):([-\d\.]+)(?::([-\d\.]+))?>/g;
   
-  // Get all nodes including those inside subgraphs/group nodes
-  const allNodes = getAllNodesIncludingSubgraphs(graph);
+  // Candidate nodes from the shared graph index (includes subgraphs/group nodes):
+  // LoRA Manager, standard LoRA loaders and text/prompt nodes
+  const loraNodes = getGraphIndex(graph).select("lora", (type, comfyClass) =>
+    type === "Lora Loader (LoraManager)" ||
+    comfyClass === "Lora Loader (LoraManager)" ||
+    type === "lora" ||
+    (type !== "" && (
+      LORA_LOADER_TYPES.some(t => type.includes(t) || t.includes(type)) ||
+      LORA_TEXT_NODE_TYPES.includes(type) ||
+      type.includes("TextEncode") ||
+      type.includes("Wildcard")
+    ))
+  );
 
-  // Search for all nodes in the workflow
-  for (const node of allNodes) {
+  for (const node of loraNodes) {
     
     // Handle Lora Manager nodes specially
     if (node.type === "Lora Loader (LoraManager)" || 
@@ -1496,14 +1831,7 @@ function detectLorasFromWorkflow(graph) {
     }
     
     // Handle standard LoRA Loader nodes
-    const standardLoraTypes = [
-      "LoraLoader",
-      "LoraLoaderModelOnly",
-      "LoRA Stacker",
-      "Power Lora Loader (rgthree)"
-    ];
-    
-    if (standardLoraTypes.some(type => node.type.includes(type) || type.includes(node.type))) {
+    if (LORA_LOADER_TYPES.some(type => node.type.includes(type) || type.includes(node.type))) {
       
       // Find the widget that contains the LoRA name
       const loraWidget = node.widgets?.find(w => 
@@ -1552,18 +1880,7 @@ function detectLorasFromWorkflow(graph) {
     
     // Handle embedded LoRA syntax in text/prompt nodes
     // Supports: <lora:name:weight> pattern in prompts
-    const textNodeTypes = [
-      "ImpactWildcardEncode",
-      "CLIPTextEncode", 
-      "BNK_CLIPTextEncodeAdvanced",
-      "CLIPTextEncodeSDXL",
-      "CLIPTextEncodeSDXLRefiner",
-      "String Literal",
-      "Text Multiline",
-      "ShowText"
-    ];
-    
-    if (textNodeTypes.some(type => node.type === type || node.type.includes("TextEncode") || node.type.includes("Wildcard"))) {
+    if (LORA_TEXT_NODE_TYPES.some(type => node.type === type || node.type.includes("TextEncode") || node.type.includes("Wildcard"))) {
       
       // Check all widgets for text content
       if (node.widgets) {
@@ -1634,23 +1951,19 @@ function detectResolutionFromWorkflow(graph) {
 
   const foundResolutions = [];
   
-  // Get all nodes including those inside subgraphs/group nodes
-  const allNodes = getAllNodesIncludingSubgraphs(graph);
+  // Latent image nodes from the shared graph index (includes subgraphs/group nodes)
+  const latentNodes = getGraphIndex(graph).nodesOfClass(latentNodeTypes);
 
-  // Search for all latent image nodes
-  for (const node of allNodes) {
-    if (latentNodeTypes.some(type => node.type === type || node.comfyClass === type)) {
-      
-      // Try to find width and height widgets
-      const widthWidget = node.widgets?.find(w => w.name === "width");
-      const heightWidget = node.widgets?.find(w => w.name === "height");
-      
-      if (widthWidget && heightWidget) {
-        const width = widthWidget.value;
-        const height = heightWidget.value;
-        const resolution = `${width}x${height}`;
-        foundResolutions.push({ resolution, nodeType: node.type });
-      }
+  for (const node of latentNodes) {
+    // Try to find width and height widgets
+    const widthWidget = node.widgets?.find(w => w.name === "width");
+    const heightWidget = node.widgets?.find(w => w.name === "height");
+    
+    if (widthWidget && heightWidget) {
+      const width = widthWidget.value;
+      const height = heightWidget.value;
+      const resolution = `${width}x${height}`;
+      foundResolutions.push({ resolution, nodeType: node.type });
     }
   }
 
@@ -1711,7 +2024,7 @@ app.registerExtension({
         globalSettings.theme = value;
         
         // Trigger re-render of all FlowPath nodes
-        const nodes = app.graph._nodes.filter(n => n.comfyClass === "FlowPath");
+        const nodes = app.graph._nodes.filter(n => isFlowPathNode(n));
         nodes.forEach(node => {
           if (node.genSortRender) {
             node.genSortRender();
@@ -1767,7 +2080,7 @@ app.registerExtension({
         globalSettings.loraPathFormat = value;
         
         // Update all nodes
-        const nodes = app.graph._nodes.filter(n => n.comfyClass === "FlowPath");
+        const nodes = app.graph._nodes.filter(n => isFlowPathNode(n));
         nodes.forEach(node => {
           if (node.genSortRender) {
             node.genSortRender();
@@ -1787,7 +2100,7 @@ app.registerExtension({
         globalSettings.stickyPreview = value;
         
         // Update all nodes
-        const nodes = app.graph._nodes.filter(n => n.comfyClass === "FlowPath");
+        const nodes = app.graph._nodes.filter(n => isFlowPathNode(n));
         nodes.forEach(node => {
           if (node.genSortRender) {
             node.genSortRender();
@@ -1807,7 +2120,7 @@ app.registerExtension({
         globalSettings.showEmojis = value;
         
         // Update all nodes
-        const nodes = app.graph._nodes.filter(n => n.comfyClass === "FlowPath");
+        const nodes = app.graph._nodes.filter(n => isFlowPathNode(n));
         nodes.forEach(node => {
           if (node.genSortRender) {
             node.genSortRender();
@@ -1827,7 +2140,7 @@ app.registerExtension({
          globalSettings.hideDefaultPresets = value;
          
          // Update all nodes
-         const nodes = app.graph._nodes.filter(n => n.comfyClass === "FlowPath");
+         const nodes = app.graph._nodes.filter(n => isFlowPathNode(n));
          nodes.forEach(node => {
            if (node.genSortRender) {
              node.genSortRender();
@@ -1868,8 +2181,13 @@ app.registerExtension({
      globalSettings.showLoadingAnimation = savedShowLoadingAnimation;
   },
 
+  // A loaded or switched workflow replaces the graph - rebuild the detection index
+  afterConfigureGraph() {
+    invalidateGraphIndex();
+  },
+
   async beforeRegisterNodeDef(nodeType, nodeData, app) {
-    if (nodeType.comfyClass === "FlowPath") {
+    if (FLOWPATH_NODE_CLASSES.includes(nodeType.comfyClass)) {
       // Add right-click context menu option for theme editor
       chainCallback(nodeType.prototype, "getExtraMenuOptions", function(_, options) {
         const currentThemeKey = globalSettings.theme || 'umbrael';
@@ -1934,8 +2252,12 @@ app.registerExtension({
           model: { icon: "🤖", label: "Model", configKey: "model_name", tooltip: "Checkpoint model used for generation. Auto-detects from workflow" },
           seed: { icon: "🎲", label: "Seed (Auto)", configKey: "seed", tooltip: "Automatically captures the seed value from KSampler at generation time" },
           lora: { icon: "🎨", label: "LoRA", configKey: "lora_name", tooltip: "LoRA models used in generation. Auto-detects from workflow (supports LoRA Manager)" },
+          shard: { icon: "🗃️", label: "Shard (Auto)", configKey: "shard_mode", tooltip: "Adds a bucket subfolder (counter range like 01000-01999, or hour) once the folder holds more files than the threshold. Always the innermost folder" },
           custom: { icon: "✨", label: "Custom", configKey: null, tooltip: "Custom path segment with template variables: {label}, {model}, {category}, {date}, {lora}, {resolution}, {filetype}, etc." }
         };
+
+        // Initial settings for a newly added Shard segment (match flowpath/sharding.py defaults)
+        const SHARD_DEFAULTS = { shard_mode: "Counter Range", shard_size: "1000", shard_threshold: "10000" };
         
         // Helper to get segment icon (respects emoji setting)
         const getSegmentIcon = (type) => {
@@ -1963,7 +2285,15 @@ app.registerExtension({
           console.warn("[FlowPath] Failed to parse widget_data:", e);
         }
 
-        let segments = currentData.segments || defaultSegments;
+        // widget_data that references a server preset carries no segments;
+        // they come from the library (resolved again once it has loaded)
+        let pendingPresetRef = (!currentData.segments && currentData.preset && typeof currentData.preset.id === 'string')
+          ? currentData.preset
+          : null;
+        const refPreset = pendingPresetRef ? presetLibrary.presets[pendingPresetRef.id] : null;
+        let segments = currentData.segments
+          || (refPreset ? JSON.parse(JSON.stringify(refPreset.segments || [])) : null)
+          || defaultSegments;
         
         // Default config - used for new nodes and as fallback for missing fields
         const defaultConfig = {
@@ -2115,7 +2445,65 @@ app.registerExtension({
         const globalPresets = loadGlobalPresets();
         
         // Merge: default presets < global presets < workflow presets (workflow has highest priority)
-        let presets = { ...defaultPresets, ...globalPresets, ...(currentData.presets || {}) };
+        let presets = { ...defaultPresets, ...presetLibrary.presets, ...globalPresets, ...(currentData.presets || {}) };
+
+        // Pull in the server library. Custom presets created locally since the
+        // last sync (localStorage, or embedded in workflows saved by older
+        // versions) are uploaded once. Presets deleted elsewhere (tombstoned
+        // on the server) are dropped here instead of coming back.
+        fetchPresetLibrary().then(async (library) => {
+          if (!presetLibrary.loaded) return;
+          const synced = loadSyncedPresetNames();
+          const localOnly = {};
+          let droppedLocal = false;
+          for (const [name, preset] of Object.entries({ ...globalPresets, ...(currentData.presets || {}) })) {
+            if (defaultPresets.hasOwnProperty(name) || library[name]) continue;
+            if (presetLibrary.deleted[name]) {
+              delete presets[name];
+              if (globalPresets[name]) {
+                delete globalPresets[name];
+                droppedLocal = true;
+              }
+              if (activePresetName === name) activePresetName = null;
+            } else if (!synced.has(name) && isValidPresetObject(preset)) {
+              localOnly[name] = { segments: preset.segments || [], config: preset.config || {} };
+            }
+          }
+          if (droppedLocal) saveGlobalPresets(globalPresets);
+          markPresetsSynced(Object.keys(library));
+          if (Object.keys(localOnly).length > 0) {
+            await savePresetsToServer(localOnly, [], true);
+          }
+
+          let changed = droppedLocal;
+          if (pendingPresetRef) {
+            const current = presetLibrary.presets[pendingPresetRef.id];
+            if (current) {
+              if (current.version !== pendingPresetRef.version) {
+                console.warn(`[FlowPath] Preset "${pendingPresetRef.id}" changed on the server (version ${pendingPresetRef.version} -> ${current.version}); using the current version`);
+              }
+              segments = JSON.parse(JSON.stringify(current.segments || []));
+            } else {
+              console.warn(`[FlowPath] Preset "${pendingPresetRef.id}" referenced by this node is not in the server library`);
+              if (presets[pendingPresetRef.id]) {
+                segments = JSON.parse(JSON.stringify(presets[pendingPresetRef.id].segments || []));
+              }
+            }
+            pendingPresetRef = null;
+            changed = true;
+          }
+          for (const [name, preset] of Object.entries(presetLibrary.presets)) {
+            if (!presets[name] || presets[name].version !== preset.version) {
+              presets[name] = preset;
+              changed = true;
+            }
+          }
+          if (changed || currentData.presets) {
+            // Drops the embedded library from old widget_data and adds the preset reference
+            updateWidgetData();
+            renderUI();
+          }
+        });
         
         // Track currently active/loaded preset for visual highlighting
         let activePresetName = currentData.activePresetName || null;
@@ -2536,17 +2924,36 @@ app.registerExtension({
             }
           });
           
+          // Shard bucket is always the innermost folder and only known at run time
+          if (segments.some(seg => seg.type === "shard" && seg.enabled !== false)) {
+            parts.push("[bucket]");
+          }
+
           // Return just the folder path - filename is now handled separately
           return parts.join(" / ");
         };
 
         const updateWidgetData = () => {
+          // Presets live in the server library - only a reference is stored,
+          // so widget_data and queued prompts don't grow with the library
           const newData = {
             segments: segments,
             config: config,
-            presets: presets,
             activePresetName: activePresetName
           };
+          const serverPreset = activePresetName ? presetLibrary.presets[activePresetName] : null;
+          if (serverPreset) {
+            newData.preset = { id: activePresetName, version: serverPreset.version };
+            // The server expands the reference (and keys its caches on it);
+            // segments are only sent when they differ from the preset
+            if (JSON.stringify(serverPreset.segments || []) === JSON.stringify(segments)) {
+              delete newData.segments;
+            }
+          } else if (pendingPresetRef && activePresetName === pendingPresetRef.id) {
+            // Library not loaded yet - keep the reference instead of the placeholder segments
+            newData.preset = pendingPresetRef;
+            delete newData.segments;
+          }
           const jsonData = JSON.stringify(newData);
           dataWidget.value = jsonData;
           
@@ -2585,7 +2992,7 @@ app.registerExtension({
         const syncPresetsToAllNodes = (newPresetName = null, deletedPresetName = null) => {
           try {
             const allFlowPathNodes = app.graph._nodes.filter(n => 
-              n.comfyClass === "FlowPath" && n.id !== node.id
+              isFlowPathNode(n) && n.id !== node.id
             );
             
             
@@ -2597,27 +3004,9 @@ app.registerExtension({
                   const presetData = newPresetName ? presets[newPresetName] : null;
                   otherNode.flowPathSyncPreset(newPresetName, presetData, deletedPresetName);
                   syncedCount++;
-                } else {
-                  // Fallback: update widget_data directly (for older nodes that haven't refreshed)
-                  const otherDataWidget = otherNode.widgets?.find(w => w.name === "widget_data");
-                  if (!otherDataWidget) return;
-                  
-                  const otherData = JSON.parse(otherDataWidget.value || "{}");
-                  
-                  if (deletedPresetName) {
-                    if (otherData.presets && otherData.presets[deletedPresetName]) {
-                      delete otherData.presets[deletedPresetName];
-                    }
-                  } else if (newPresetName && presets[newPresetName]) {
-                    if (!otherData.presets) otherData.presets = {};
-                    otherData.presets[newPresetName] = JSON.parse(JSON.stringify(presets[newPresetName]));
-                  }
-                  
-                  otherDataWidget.value = JSON.stringify(otherData);
-                  
-                  if (otherNode.genSortRender) {
-                    otherNode.genSortRender();
-                  }
+                } else if (otherNode.genSortRender) {
+                  // Older nodes pick the preset up from the shared library on render
+                  otherNode.genSortRender();
                   syncedCount++;
                 }
               } catch (e) {
@@ -3095,6 +3484,41 @@ app.registerExtension({
         const updateNodeSize = () => {};
         node.genSortUpdateSize = updateNodeSize;
 
+        // Server-side preview: shows the real {counter} value and the execution-time seed.
+        // Requests are debounced while typing and only the newest response is applied.
+        const SERVER_PREVIEW_DEBOUNCE_MS = 300;
+        let serverPreview = null;
+        let serverPreviewSeq = 0;
+        let serverPreviewTimer = null;
+        let serverPreviewEl = null;
+
+        const renderServerPreview = () => {
+          if (!serverPreviewEl) return;
+          if (!serverPreview || serverPreview.error) {
+            serverPreviewEl.style.display = "none";
+            return;
+          }
+          const folder = serverPreview.path ? `output/${serverPreview.path.replace(/\\/g, "/")}` : "output";
+          const showFilename = config.output_mode === "imageSaver" && serverPreview.filename;
+          serverPreviewEl.textContent = `Next: ${showFilename ? `${folder}/${serverPreview.filename}` : folder}`;
+          serverPreviewEl.style.display = "";
+        };
+
+        const fetchServerPreview = async () => {
+          const seq = ++serverPreviewSeq;
+          const result = await requestServerPreview(String(node.id), dataWidget.value);
+          // No result (backend not available - the client-side preview still
+          // works), or a newer request superseded this one
+          if (!result || seq !== serverPreviewSeq) return;
+          serverPreview = result;
+          renderServerPreview();
+        };
+
+        const scheduleServerPreview = () => {
+          clearTimeout(serverPreviewTimer);
+          serverPreviewTimer = setTimeout(fetchServerPreview, SERVER_PREVIEW_DEBOUNCE_MS);
+        };
+
         const renderUI = () => {
           const theme = getTheme();
           
@@ -3354,6 +3778,16 @@ app.registerExtension({
               </div>`;
             }
             
+            // Filled in by renderServerPreview() once the server has resolved the path
+            html += `<div class="flowpath-server-preview" title="Resolved by the server with the real {counter} value and current seed" style="
+              display: none;
+              margin-top: 6px;
+              font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
+              font-size: 10px;
+              color: rgba(255,255,255,0.5);
+              word-break: break-all;
+            "></div>`;
+            
             return html;
           };
 
@@ -3483,7 +3917,7 @@ app.registerExtension({
               item.onclick = () => {
                 globalSettings.theme = key;
                 app.ui.settings.setSettingValue("🌊 FlowPath.Theme", key);
-                app.graph._nodes.filter(n => n.comfyClass === "FlowPath").forEach(n => n.genSortRender?.());
+                app.graph._nodes.filter(n => isFlowPathNode(n)).forEach(n => n.genSortRender?.());
                 dropdown.remove();
               };
               
@@ -3559,7 +3993,7 @@ app.registerExtension({
                   }
                   
                   // Re-render all FlowPath nodes
-                  app.graph._nodes.filter(n => n.comfyClass === "FlowPath").forEach(n => n.genSortRender?.());
+                  app.graph._nodes.filter(n => isFlowPathNode(n)).forEach(n => n.genSortRender?.());
                   
                   // Close dropdown - don't try to reopen as button is recreated
                   dropdown.remove();
@@ -3586,7 +4020,7 @@ app.registerExtension({
                 item.onclick = () => {
                   globalSettings.theme = key;
                   app.ui.settings.setSettingValue("🌊 FlowPath.Theme", key);
-                  app.graph._nodes.filter(n => n.comfyClass === "FlowPath").forEach(n => n.genSortRender?.());
+                  app.graph._nodes.filter(n => isFlowPathNode(n)).forEach(n => n.genSortRender?.());
                   dropdown.remove();
                 };
                 
@@ -4095,6 +4529,9 @@ app.registerExtension({
             preview.innerHTML = buildPreviewHtml();
             attachModeButtonListeners();
             attachPathClickHandler();
+            serverPreviewEl = preview.querySelector('.flowpath-server-preview');
+            renderServerPreview();
+            scheduleServerPreview();
           };
           
           updatePreview();
@@ -4718,6 +5155,11 @@ app.registerExtension({
                 };
                 
                 item.onclick = () => {
+                  if (type === "shard") {
+                    Object.entries(SHARD_DEFAULTS).forEach(([key, value]) => {
+                      if (!config[key]) config[key] = value;
+                    });
+                  }
                   segments.push({ type: type, enabled: true });
                   activePresetName = null;
                   updateWidgetData();
@@ -4971,14 +5413,26 @@ app.registerExtension({
               model: { key: "model_name", label: "Model Name", type: "text", placeholder: "Example: waiIllustriousSDXL_v160" },
               // seed is EXCLUDED - it's always dynamic from KSampler, no manual input needed
               lora: { key: "lora_name", label: "LoRA Name", type: "text", placeholder: "Example: Umbrael_Prime_Illustrious_V1" },
-              date: { key: "date_format", label: "Date Format", type: "text", placeholder: "Example: %Y-%m-%d" }
+              date: { key: "date_format", label: "Date Format", type: "text", placeholder: "Example: %Y-%m-%d" },
+              shard: [
+                { key: "shard_mode", label: "Shard By", type: "select", options: ["Counter Range", "Hour"] },
+                { key: "shard_size", label: "Files per Bucket", type: "select", options: ["100", "500", "1000", "5000", "10000"] },
+                { key: "shard_threshold", label: "Shard After", type: "select", options: ["1000", "5000", "10000", "50000", "100000"] }
+              ]
             };
 
             // Build config inputs in the same order as segments
             const configInputs = [];
             segments.forEach((segment, segIndex) => {
               if (segment.enabled && configInputMap[segment.type]) {
-                configInputs.push(configInputMap[segment.type]);
+                // A segment can have several settings (e.g. shard)
+                configInputs.push(...[].concat(configInputMap[segment.type]));
+              }
+              // Older presets may lack shard settings - show the defaults the server uses
+              if (segment.type === "shard") {
+                Object.entries(SHARD_DEFAULTS).forEach(([key, value]) => {
+                  if (!config[key]) config[key] = value;
+                });
               }
               // Add custom segments to config inputs for editing their template
               if (segment.type === "custom" && segment.enabled) {
@@ -6031,6 +6485,14 @@ app.registerExtension({
                 // Update widget data to reflect changes
                 updateWidgetData();
               }
+
+              // Revalidate the server library (304 when nothing changed)
+              const knownEtag = presetLibrary.etag;
+              fetchPresetLibrary().then((library) => {
+                if (presetLibrary.etag === knownEtag) return;
+                Object.assign(presets, library);
+                renderUI();
+              });
             }
             
             renderUI();
@@ -6426,6 +6888,7 @@ app.registerExtension({
                       delete currentGlobalPresets[deletedName];
                       saveGlobalPresets(currentGlobalPresets);
                     }
+                    savePresetsToServer({}, [deletedName]);
                     
                     updateWidgetData();
                     
@@ -6651,6 +7114,7 @@ app.registerExtension({
                     });
                     
                     saveGlobalPresets(currentGlobalPresets);
+                    savePresetsToServer({}, deletedNames);
                     updateWidgetData();
                     renderUI();
                     updateNodeSize();
@@ -6774,6 +7238,12 @@ app.registerExtension({
                 const currentGlobalPresets = loadGlobalPresets();
                 currentGlobalPresets[name] = presets[name];
                 saveGlobalPresets(currentGlobalPresets);
+
+                // Save to the server library (shared by all browsers and prompts)
+                const versions = await savePresetsToServer({ [name]: presets[name] }, []);
+                if (versions && versions[name]) {
+                  presets[name] = { ...presets[name], version: versions[name] };
+                }
                 
                 // Set as active preset since we just saved it
                 activePresetName = name;